@@ -20,6 +20,8 @@ def create_app(config=None):
         app.config.from_mapping(config)
 
     from . import api
+    from .utils.runner import check_fork_server
+    from .utils.settings import get_env_settings
 
     app.register_blueprint(api.bp)
 
@@ -35,6 +37,19 @@ def create_app(config=None):
         app.logger.info(f"Using DT_LATEST_DRAFT_URL from ENV: {dt_latest_draft_url}")
         app.config["DT_LATEST_DRAFT_URL"] = dt_latest_draft_url
 
+    for name, value in get_env_settings().items():
+        app.logger.info(f"Using {name} from ENV.")
+        app.config[name] = value
+
+    with app.app_context():
+        check_fork_server(app.logger)
+
+    if app.config.get("JOB_RUNNER"):
+        api.start_job_runner(app)
+        app.logger.info("Job runner is enabled.")
+    else:
+        app.logger.info("Job runner is disabled.")
+
     if sentry_dsn := getenv("SENTRY_DSN"):
         sentry_init(
             dsn=sentry_dsn,
@@ -1,43 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from contextlib import ExitStack
+from contextvars import copy_context
+from logging import getLogger
+from mimetypes import guess_type
+from os import makedirs, path
+from threading import Thread
+from time import monotonic
+
 from flask import (
     Blueprint,
     current_app,
+    g,
     jsonify,
     make_response,
     request,
+    Response,
     send_from_directory,
+    stream_with_context,
 )
+from requests.exceptions import RequestException
 
 from at.utils.abnf import extract_abnf, parse_abnf
-from at.utils.authentication import require_api_key
+from at.utils.admission import (
+    admit,
+    finish as finish_admitted,
+    get_stats as get_admission_stats,
+)
+from at.utils.authentication import (
+    get_apikey_stats,
+    require_api_key,
+    require_signature,
+    sign_url,
+)
+from at.utils.bibxml import get_stats as get_bibxml_stats
+from at.utils.cache import (
+    get_cache,
+    get_cache_stats,
+    get_fingerprint,
+    CompressedLRUCache,
+)
+from at.utils.client import get_stats as get_client_stats
 from at.utils.file import (
     check_file,
+    get_document_cache,
     get_file,
     get_name,
     get_name_with_revision,
+    get_path_hash,
     save_file,
     save_file_from_text,
+    workspace,
+    write_chunks,
     DownloadError,
+    DIR_MODE,
+    FileSizeError,
+)
+from at.utils.iddiff import get_id_diff, DocumentError, IddiffError
+from at.utils.jobs import (
+    get_job_store,
+    JobError,
+    JobRunner,
+    DONE,
+    FAILED,
+    QUEUED,
 )
-from at.utils.iddiff import get_id_diff, IddiffError
 from at.utils.logs import update_logs
 from at.utils.net import (
     get_both,
     get_latest,
+    get_metadata_stats,
     get_previous,
     is_valid_url,
     is_url,
     InvalidURL,
+    DatatrackerUnavailable,
     DocumentNotFound,
 )
 from at.utils.processor import (
     clean_svg_ids as clean_svg,
-    get_html,
-    get_pdf,
-    get_text,
-    get_xml,
-    process_file,
+    convert_file,
+    get_rendered,
     ProcessingError,
 )
+from at.utils.ratelimit import get_stats as get_rate_limit_stats
+from at.utils.refcache import get_stats as get_refcache_stats
+from at.utils.retention import (
+    EXPORT_TTL,
+    get_stats as get_retention_stats,
+    mark_exported,
+    mark_in_use,
+    release,
+)
+from at.utils.runner import (
+    client_context,
+    get_client,
+    get_stats as get_process_stats,
+)
+from at.utils.singleflight import coalesce, get_stats as get_single_flight_stats
+from at.utils.storage import (
+    get_storage,
+    iter_chunks,
+    LocalStorage,
+    StorageError,
+)
 from at.utils.text import (
     get_text_id_from_file,
     get_text_id_from_url,
@@ -49,11 +114,237 @@ from at.utils.validation import (
     validate_draft,
 )
 
+ACCEPTED = 202
 BAD_REQUEST = 400
+NOT_FOUND = 404
+REQUEST_ENTITY_TOO_LARGE = 413
+SERVICE_UNAVAILABLE = 503
+RENDER_CACHE_SIZE = 128
+IDDIFF_CACHE_SIZE = 256
+IDDIFF_DEADLINE = 120  # in seconds, for getting both documents
+RENDER_FORMATS = {"xml": [], "html": ["html"], "text": ["text"], "pdf": ["pdf"]}
 
 bp = Blueprint("api", __name__, url_prefix="/api")
 
 
+@bp.before_request
+def admit_request():
+    """Rejects requests that would not be served within the latency SLO"""
+    if retry_after := admit(request.endpoint, request.view_args):
+        current_app.logger.info(
+            "shedding {} request, retry after {}s".format(request.endpoint, retry_after)
+        )
+        return (
+            jsonify(error="Service is busy, please try again later"),
+            SERVICE_UNAVAILABLE,
+            {"Retry-After": str(retry_after)},
+        )
+    g.admitted = monotonic()
+
+
+@bp.teardown_request
+def finish_request(error=None):
+    """Records service time of admitted requests and releases workspaces
+    used by the request"""
+    if (admitted := g.pop("admitted", None)) is not None:
+        finish_admitted(request.endpoint, monotonic() - admitted, request.view_args)
+    for filename in g.pop("workspaces", []):
+        release(filename)
+
+
+@bp.errorhandler(FileSizeError)
+def file_size_error(error):
+    """Returns JSON error for uploads larger than the maximum size"""
+    current_app.logger.info("file size error: {}".format(error))
+    return jsonify(error=str(error)), REQUEST_ENTITY_TOO_LARGE
+
+
+def get_render_cache():
+    """Returns cache of rendered files"""
+    return get_cache(
+        "render", current_app.config.get("RENDER_CACHE_SIZE", RENDER_CACHE_SIZE)
+    )
+
+
+def get_render_cache_key(filename, formats):
+    """Returns render cache key for the saved upload and format(s).
+    Content hash is the one computed while saving the file."""
+    return (
+        get_path_hash(filename),
+        path.basename(filename),
+        formats,
+        get_fingerprint(current_app.config.get("VERSION_INFORMATION")),
+    )
+
+
+def get_iddiff_cache():
+    """Returns cache of diff outputs"""
+    return get_cache(
+        "iddiff",
+        current_app.config.get("IDDIFF_CACHE_SIZE", IDDIFF_CACHE_SIZE),
+        cache_class=CompressedLRUCache,
+    )
+
+
+def get_iddiff_cache_key(old_draft, new_draft, options):
+    """Returns diff cache key for the documents and diff options
+    NOTE: diff output includes file names, not only content"""
+    return get_fingerprint(
+        (
+            get_path_hash(old_draft),
+            get_path_hash(new_draft),
+            path.basename(old_draft),
+            path.basename(new_draft),
+            options,
+            current_app.config.get("VERSION_INFORMATION"),
+        )
+    )
+
+
+def get_export_url(filename):
+    """Returns export URL of a file in the upload directory.
+    URL is signed and expires if EXPORT_URL_SECRET is set. The file is kept
+    for EXPORT_TTL from now."""
+    keep_exported(filename)
+    export_path = "/".join(("/api", "export", filename))
+    url = "".join((current_app.config["SITE_URL"], export_path))
+    if secret := current_app.config.get("EXPORT_URL_SECRET"):
+        return sign_url(url, export_path, secret)
+    return url
+
+
+def keep_exported(filename):
+    """Refresh export marker of the file in the upload directory and in local
+    artifact storage, so that it is kept as long as export URLs are valid"""
+    local_filenames = [path.join(current_app.config["UPLOAD_DIR"], filename)]
+    if isinstance(storage := get_artifact_storage(), LocalStorage):
+        local_filenames.append(storage.get_path(filename))
+
+    for local_filename in local_filenames:
+        if path.isfile(local_filename):
+            mark_exported(local_filename)
+
+
+def save_upload(file):
+    """Saves uploaded file in a new workspace in the upload directory. The
+    workspace is in use until the request has finished.
+    Returns (dir_path, filename)."""
+    dir_path, filename = save_file(file, current_app.config["UPLOAD_DIR"])
+    mark_in_use(filename)
+    g.setdefault("workspaces", []).append(filename)
+    current_app.logger.info("file saved at {}".format(filename))
+
+    return (dir_path, filename)
+
+
+def close_after(executor, stack):
+    """Close exit stack once executor workers have finished"""
+    executor.shutdown(wait=True)
+    stack.close()
+
+
+def get_artifact_storage():
+    """Returns artifact storage of the application"""
+    if "storage" not in current_app.extensions:
+        current_app.extensions["storage"] = get_storage(
+            current_app.config.get("ARTIFACT_STORAGE"),
+            current_app.config["UPLOAD_DIR"],
+        )
+    return current_app.extensions["storage"]
+
+
+def export_file(filename):
+    """Saves file in the upload directory to artifact storage, so that any
+    replica can export it. If artifact storage is not available, the file
+    can be exported from this replica only.
+    Returns export URL of the file."""
+    local_filename = path.join(current_app.config["UPLOAD_DIR"], filename)
+    try:
+        get_artifact_storage().save(filename, local_filename)
+    except StorageError as e:
+        current_app.logger.error("artifact storage error: {}".format(e))
+    return get_export_url(filename)
+
+
+def is_exported(filename):
+    """Returns True if file is available in artifact storage or, if artifact
+    storage is not available, in the upload directory"""
+    try:
+        return get_artifact_storage().exists(filename)
+    except StorageError as e:
+        current_app.logger.error("artifact storage error: {}".format(e))
+        return path.isfile(path.join(current_app.config["UPLOAD_DIR"], filename))
+
+
+def import_file(filename):
+    """Copies file from artifact storage to the upload directory, unless it
+    is already there.
+    Returns path of the file in the upload directory."""
+    local_filename = path.join(current_app.config["UPLOAD_DIR"], filename)
+    if not path.isfile(local_filename):
+        makedirs(path.dirname(local_filename), mode=DIR_MODE, exist_ok=True)
+        write_chunks(iter_chunks(get_artifact_storage().open(filename)), local_filename)
+    return local_filename
+
+
+def get_job_queue():
+    """Returns job store of the application"""
+    if "job_store" not in current_app.extensions:
+        current_app.extensions["job_store"] = get_job_store(
+            current_app.config.get("JOBS_STORE"), current_app.config["UPLOAD_DIR"]
+        )
+    return current_app.extensions["job_store"]
+
+
+def start_job_runner(app):
+    """Start job runner of the application, that also picks up jobs queued
+    before a restart"""
+
+    def run_render_job(params, logger):
+        with app.app_context():
+            return render_job(params, logger=logger)
+
+    with app.app_context():
+        runner = JobRunner(
+            get_job_queue(), handlers={"render": run_render_job}, logger=app.logger
+        )
+    app.extensions["jobs"] = runner
+    runner.start()
+
+
+def get_job_url(job_id):
+    """Returns job status URL"""
+    return "/".join((current_app.config["SITE_URL"], "api", "jobs", job_id))
+
+
+def render_job(params, logger=getLogger()):
+    """Render job handler, runs in the application context.
+    Input is fetched from artifact storage if the job was queued by another
+    replica. Result is saved to artifact storage when the job completes."""
+    try:
+        filename = import_file(params["filename"])
+    except (StorageError, OSError) as e:
+        logger.error("job input error: {}".format(str(e)))
+        raise JobError("Job input is not available")
+
+    try:
+        mark_in_use(filename)
+        with client_context(params.get("client")):
+            xml_file = convert_file(filename, logger=logger)
+            xml_file, rendered, logs = get_rendered(
+                xml_file, formats=RENDER_FORMATS[params["format"]], logger=logger
+            )
+    except ProcessingError as e:
+        raise JobError("processing error: {}".format(e))
+    finally:
+        release(filename)
+
+    rendered_filename = get_file(rendered.get(params["format"], xml_file))
+    export_file(rendered_filename)
+
+    return {"filename": rendered_filename, "logs": logs}
+
+
 @bp.route("/render/<format>", methods=("POST",))
 @require_api_key
 @check_file
@@ -70,53 +361,193 @@ def render(format):
 
     file = request.files["file"]
 
+    if format not in RENDER_FORMATS:
+        logger.info("render format not supported: {}".format(format))
+        return jsonify(error="Render format not supported"), BAD_REQUEST
+
+    if request.args.get("async", False):
+        callback = request.values.get("callback")
+        if callback:
+            try:
+                is_valid_url(
+                    callback, current_app.config.get("ALLOWED_DOMAINS", []), logger
+                )
+            except InvalidURL as e:
+                return jsonify(error=str(e)), BAD_REQUEST
+
+        _, filename = save_file(file, current_app.config["UPLOAD_DIR"])
+        # input is kept until the job has finished, any replica can run it
+        mark_in_use(filename, ttl=current_app.config.get("EXPORT_TTL", EXPORT_TTL))
+        try:
+            get_artifact_storage().save(get_file(filename), filename)
+        except StorageError as e:
+            # job can still run on this replica
+            logger.error("artifact storage error: {}".format(e))
+        job_id = get_job_queue().create(
+            "render",
+            {"filename": get_file(filename), "format": format, "client": get_client()},
+            callback=callback,
+        )
+        logger.info("render job queued: {}".format(job_id))
+
+        return jsonify(id=job_id, status=QUEUED, url=get_job_url(job_id)), ACCEPTED
+
     logs = {"errors": [], "warnings": []}
     rendered_filename = ""
+    url = None
+
+    _, filename = save_upload(file)
+    render_cache = get_render_cache()
+    cache_key = get_render_cache_key(filename, format)
+    if cached := render_cache.get(cache_key):
+        rendered_filename, logs = cached
+        if is_exported(rendered_filename):
+            logger.debug("render cache hit: {}".format(rendered_filename))
+            return jsonify(url=get_export_url(rendered_filename), logs=logs)
+        else:
+            # rendered file is no longer available
+            render_cache.delete(cache_key)
+            logs = {"errors": [], "warnings": []}
+            rendered_filename = ""
 
     try:
-        dir_path, filename = process_file(
-            file=file, upload_dir=current_app.config["UPLOAD_DIR"], logger=logger
+        filename = convert_file(filename, logger=logger)
+        xml_file, rendered, _logs = get_rendered(
+            filename, formats=RENDER_FORMATS[format], logger=logger
         )
-        xml_file, _logs = get_xml(filename, logger=logger)
         logs = update_logs(logs, _logs)
+        rendered_filename = get_file(rendered.get(format, xml_file))
+    except ProcessingError as e:
+        return jsonify(error="processing error: {}".format(e)), BAD_REQUEST
 
-        if format == "xml":
-            rendered_filename = get_file(xml_file)
-        elif format == "html":
-            html_file, _logs = get_html(xml_file, logger=logger)
-            logs = update_logs(logs, _logs)
-            rendered_filename = get_file(html_file)
-        elif format == "text":
-            text_file, _logs = get_text(xml_file, logger=logger)
-            logs = update_logs(logs, _logs)
-            rendered_filename = get_file(text_file)
-        elif format == "pdf":
-            pdf_file, _logs = get_pdf(xml_file, logger=logger)
-            logs = update_logs(logs, _logs)
-            rendered_filename = get_file(pdf_file)
-        else:
+    if len(rendered_filename) > 0:
+        render_cache.set(cache_key, (rendered_filename, logs))
+        url = export_file(rendered_filename)
+
+    return jsonify(url=url, logs=logs)
+
+
+@bp.route("/render", methods=("POST",))
+@require_api_key
+@check_file
+def render_formats():
+    """POST: /render API call
+    Returns rendered formats of the given input file. The input file gets
+    converted once and formats get rendered concurrently.
+    Returns JSON on event of an error."""
+
+    logger = current_app.logger
+
+    if "file" not in request.files:
+        logger.info("no input file")
+        return jsonify(error="No file"), BAD_REQUEST
+
+    file = request.files["file"]
+
+    formats = []
+    for value in request.values.getlist("formats"):
+        formats.extend(format.strip() for format in value.split(",") if format)
+    formats = list(dict.fromkeys(formats)) or list(RENDER_FORMATS.keys())
+
+    for format in formats:
+        if format not in RENDER_FORMATS:
             logger.info("render format not supported: {}".format(format))
             return jsonify(error="Render format not supported"), BAD_REQUEST
+
+    _, filename = save_upload(file)
+    render_cache = get_render_cache()
+    cache_key = get_render_cache_key(filename, tuple(sorted(formats)))
+    if cached := render_cache.get(cache_key):
+        rendered_filenames, logs = cached
+        if all(is_exported(filename) for filename in rendered_filenames.values()):
+            logger.debug("render cache hit: {}".format(rendered_filenames))
+            return jsonify(
+                urls={
+                    format: get_export_url(filename)
+                    for format, filename in rendered_filenames.items()
+                },
+                logs=logs,
+            )
+        else:
+            # rendered files are no longer available
+            render_cache.delete(cache_key)
+
+    try:
+        filename = convert_file(filename, logger=logger)
+        xml_file, rendered, logs = get_rendered(
+            filename,
+            formats=[f for format in formats for f in RENDER_FORMATS[format]],
+            parallel=True,
+            logger=logger,
+        )
     except ProcessingError as e:
         return jsonify(error="processing error: {}".format(e)), BAD_REQUEST
 
-    if len(rendered_filename) > 0:
-        url = "/".join(
-            (current_app.config["SITE_URL"], "api", "export", rendered_filename)
-        )
+    rendered_filenames = {
+        format: get_file(rendered.get(format, xml_file)) for format in formats
+    }
+    render_cache.set(cache_key, (rendered_filenames, logs))
+
+    return jsonify(
+        urls={
+            format: export_file(filename)
+            for format, filename in rendered_filenames.items()
+        },
+        logs=logs,
+    )
 
-    return jsonify(url=url, logs=logs)
+
+def accel_redirect(location, dir, file, as_attachment=False):
+    """Returns response that hands the file over to nginx to serve from the
+    internal location"""
+    response = Response()
+    response.headers["X-Accel-Redirect"] = "".join((location, dir, "/", file))
+    if as_attachment:
+        response.headers["Content-Disposition"] = "attachment; filename={}".format(file)
+    return response
 
 
 @bp.route("/export/<dir>/<file>", methods=("GET",))
-@require_api_key
+@require_signature
 def export(dir, file):
+    """GET: /export/<dir>/<file> API call
+    Returns the exported file from the upload directory or artifact storage.
+    Files in the upload directory are handed over to nginx to serve if
+    EXPORT_ACCEL_REDIRECT is set, files in local artifact storage if
+    EXPORT_ACCEL_REDIRECT_ARTIFACTS is set."""
     as_attachment = request.values.get("download", False)
     dir = dir.replace(".", "")
     dir = dir.replace("/", "")
     file = file.replace("/", "")
     dir_path = "/".join((current_app.config["UPLOAD_DIR"], dir))
-    return send_from_directory(dir_path, get_file(file), as_attachment=as_attachment)
+
+    if path.isfile(path.join(dir_path, file)):
+        if location := current_app.config.get("EXPORT_ACCEL_REDIRECT"):
+            return accel_redirect(location, dir, file, as_attachment)
+        return send_from_directory(dir_path, file, as_attachment=as_attachment)
+
+    # rendered on another replica
+    storage = get_artifact_storage()
+    name = "/".join((dir, file))
+    try:
+        if not storage.exists(name):
+            return jsonify(error="File not found"), NOT_FOUND
+        if isinstance(storage, LocalStorage):
+            if location := current_app.config.get("EXPORT_ACCEL_REDIRECT_ARTIFACTS"):
+                return accel_redirect(location, dir, file, as_attachment)
+            return send_from_directory(
+                "/".join((storage.directory, dir)), file, as_attachment=as_attachment
+            )
+        response = Response(
+            stream_with_context(iter_chunks(storage.open(name))),
+            mimetype=guess_type(file)[0] or "application/octet-stream",
+        )
+    except StorageError as e:
+        current_app.logger.error("artifact storage error: {}".format(e))
+        return jsonify(error="File not found"), NOT_FOUND
+    if as_attachment:
+        response.headers["Content-Disposition"] = "attachment; filename={}".format(file)
+    return response
 
 
 @bp.route("/validate", methods=("POST",))
@@ -134,12 +565,11 @@ def validate():
 
     file = request.files["file"]
 
-    try:
-        log = validate_draft(
-            file=file, upload_dir=current_app.config["UPLOAD_DIR"], logger=logger
-        )
-    except ProcessingError as e:
-        return jsonify(error="processing error: {}".format(e)), BAD_REQUEST
+    with workspace() as upload_dir:
+        try:
+            log = validate_draft(file=file, upload_dir=upload_dir, logger=logger)
+        except ProcessingError as e:
+            return jsonify(error="processing error: {}".format(e)), BAD_REQUEST
 
     return jsonify(log)
 
@@ -147,6 +577,7 @@ def validate():
 @bp.route("/idnits", methods=("GET", "POST"))
 @require_api_key
 @check_file
+@coalesce
 def idnits():
     """GET/POST: /idnits API call
     Returns idnits output"""
@@ -165,44 +596,43 @@ def idnits():
     else:
         submit_check = False
 
-    if request.method == "POST":
-        if "file" not in request.files:
-            logger.info("no input file")
-            return jsonify(error="No file"), BAD_REQUEST
+    with workspace() as upload_dir:
+        if request.method == "POST":
+            if "file" not in request.files:
+                logger.info("no input file")
+                return jsonify(error="No file"), BAD_REQUEST
 
-        file = request.files["file"]
+            file = request.files["file"]
 
-        try:
-            _, filename = get_text_id_from_file(
-                file=file, upload_dir=current_app.config["UPLOAD_DIR"], logger=logger
-            )
-        except TextProcessingError as e:
-            return jsonify(error=str(e)), BAD_REQUEST
-    else:
-        if url == "":
-            logger.info("URL is missing")
-            return jsonify(error="URL is missing"), BAD_REQUEST
-
-        try:
-            if is_valid_url(url, current_app.config["ALLOWED_DOMAINS"], logger):
-                _, filename = get_text_id_from_url(
-                    url, current_app.config["UPLOAD_DIR"], logger=logger
+            try:
+                _, filename = get_text_id_from_file(
+                    file=file, upload_dir=upload_dir, logger=logger
                 )
-        except TextProcessingError as e:
-            return jsonify(error=str(e)), BAD_REQUEST
-        except InvalidURL as e:
-            return jsonify(error=str(e)), BAD_REQUEST
-        except DownloadError as e:
-            return jsonify(error=str(e)), BAD_REQUEST
+            except TextProcessingError as e:
+                return jsonify(error=str(e)), BAD_REQUEST
+        else:
+            if url == "":
+                logger.info("URL is missing")
+                return jsonify(error="URL is missing"), BAD_REQUEST
 
-    output = get_idnits(
-        filename,
-        logger=logger,
-        verbose=verbose,
-        show_text=show_text,
-        year=year,
-        submit_check=submit_check,
-    )
+            try:
+                if is_valid_url(url, current_app.config["ALLOWED_DOMAINS"], logger):
+                    _, filename = get_text_id_from_url(url, upload_dir, logger=logger)
+            except TextProcessingError as e:
+                return jsonify(error=str(e)), BAD_REQUEST
+            except InvalidURL as e:
+                return jsonify(error=str(e)), BAD_REQUEST
+            except DownloadError as e:
+                return jsonify(error=str(e)), BAD_REQUEST
+
+        output = get_idnits(
+            filename,
+            logger=logger,
+            verbose=verbose,
+            show_text=show_text,
+            year=year,
+            submit_check=submit_check,
+        )
 
     response = make_response(output)
     response.headers["Content-Type"] = "text/plain; charset=UTF-8"
@@ -213,6 +643,7 @@ def idnits():
 @bp.route("/iddiff", methods=("POST", "GET"))
 @require_api_key
 @check_file
+@coalesce
 def id_diff():
     """POST: /iddiff API call
     Returns HTML output of ID diff
@@ -308,141 +739,175 @@ def id_diff():
             url_1, url_2 = get_both(
                 doc, current_app.config["DT_LATEST_DRAFT_URL"], logger
             )
+        except DatatrackerUnavailable as e:
+            return jsonify(error=str(e)), SERVICE_UNAVAILABLE
         except DocumentNotFound as e:
             return jsonify(error=str(e)), BAD_REQUEST
 
-    single_draft = False
+    config = current_app.config
+    file_1 = request.files.get("file_1")
+    file_2 = request.files.get("file_2")
 
-    if not doc_1 and not url_1:
-        file_1 = request.files["file_1"]
+    def get_document_1():
+        """Returns (dir_path, filename) of the first document"""
+        if not doc_1 and not url_1:
+            try:
+                return get_text_id_from_file(
+                    file=file_1,
+                    upload_dir=upload_dir,
+                    raw=raw,
+                    logger=logger,
+                )
+            except TextProcessingError as e:
+                raise DocumentError(
+                    "Error converting first draft to text: {}".format(str(e))
+                )
 
+        url = url_1
         try:
-            dir_path_1, filename_1 = get_text_id_from_file(
-                file=file_1,
-                upload_dir=current_app.config["UPLOAD_DIR"],
-                raw=raw,
-                logger=logger,
-            )
+            if doc_1:
+                url = get_latest(doc_1, config["DT_LATEST_DRAFT_URL"], logger)
+            return get_text_id_from_url(url, upload_dir, raw=raw, logger=logger)
+        except (DocumentNotFound, DownloadError) as e:
+            raise DocumentError(str(e))
+        except RequestException as e:
+            raise DocumentError("Error getting first document: {}".format(str(e)))
         except TextProcessingError as e:
-            error = "Error converting first draft to text: {}".format(str(e))
-            return jsonify(error=error), BAD_REQUEST
-    else:
-        if doc_1:
+            raise DocumentError(
+                "Error converting first document to text: {}".format(str(e))
+            )
+
+    def get_document_2(filename_1=None):
+        """Returns (dir_path, filename) of the second document.
+        Without a second document, previous or latest version of the first
+        document (filename_1) is used."""
+        if not doc_2 and not url_2 and file_2 is not None:
             try:
-                url_1 = get_latest(
-                    doc_1, current_app.config["DT_LATEST_DRAFT_URL"], logger
+                return get_text_id_from_file(
+                    file=file_2,
+                    upload_dir=upload_dir,
+                    raw=raw,
+                    logger=logger,
+                )
+            except TextProcessingError as e:
+                raise DocumentError(
+                    "Error converting second draft to text: {}".format(str(e))
                 )
-            except DocumentNotFound as e:
-                return jsonify(error=str(e)), BAD_REQUEST
-        else:
-            try:
-                is_valid_url(url_1, current_app.config["ALLOWED_DOMAINS"], logger)
-            except InvalidURL as e:
-                return jsonify(error=str(e)), BAD_REQUEST
 
+        url = url_2
         try:
-            dir_path_1, filename_1 = get_text_id_from_url(
-                url_1, current_app.config["UPLOAD_DIR"], raw=raw, logger=logger
-            )
-        except DownloadError as e:
-            return jsonify(error=str(e)), BAD_REQUEST
+            if doc_2:
+                url = get_latest(doc_2, config["DT_LATEST_DRAFT_URL"], logger)
+            elif not url:
+                filename = filename_1.split("/")[-1]
+                document_name = get_name(filename)
+                original_doc_name = get_name_with_revision(filename)
+
+                if document_name is None:
+                    logger.error("Can not determine draft name for {}".format(filename))
+                    raise DocumentError("Can not determine draft/rfc")
+                elif latest or original_doc_name == document_name:
+                    # document doesn't have a revision in the file name
+                    # compare with the latest
+                    url = get_latest(
+                        document_name, config["DT_LATEST_DRAFT_URL"], logger
+                    )
+                else:
+                    url = get_previous(
+                        original_doc_name, config["DT_LATEST_DRAFT_URL"], logger
+                    )
+            return get_text_id_from_url(url, upload_dir, raw=raw, logger=logger)
+        except (DocumentNotFound, DownloadError) as e:
+            raise DocumentError(str(e))
+        except RequestException as e:
+            raise DocumentError("Error getting second document: {}".format(str(e)))
         except TextProcessingError as e:
-            error = "Error converting first document to text: {}".format(str(e))
-            return jsonify(error=str(error)), BAD_REQUEST
+            raise DocumentError(
+                "Error converting second document to text: {}".format(str(e))
+            )
+
+    if not doc_1 and not url_1 and file_1 is None:
+        logger.info("first document is missing")
+        return jsonify(error="First document to compare is missing"), BAD_REQUEST
+
+    try:
+        for url in (url_1, url_2):
+            if url:
+                is_valid_url(url, config["ALLOWED_DOMAINS"], logger)
+    except InvalidURL as e:
+        return jsonify(error=str(e)), BAD_REQUEST
+
+    with ExitStack() as stack:
+        upload_dir = stack.enter_context(workspace())
+        # second document depends on the first one when it is not given
+        single_draft = not doc_2 and not url_2 and file_2 is None
+        deadline = monotonic() + IDDIFF_DEADLINE
+        executor = ThreadPoolExecutor(max_workers=2)
+        futures = []
 
-    if not doc_2 and not url_2 and "file_2" in request.files:
-        file_2 = request.files["file_2"]
+        def submit(function, *args):
+            """Submit function in the context of the request (process
+            client) and returns the future"""
+            futures.append(executor.submit(copy_context().run, function, *args))
+            return futures[-1]
 
         try:
-            dir_path_2, filename_2 = get_text_id_from_file(
-                file=file_2,
-                upload_dir=current_app.config["UPLOAD_DIR"],
-                raw=raw,
-                logger=logger,
+            future_1 = submit(get_document_1)
+            if not single_draft:
+                future_2 = submit(get_document_2)
+            dir_path_1, filename_1 = future_1.result(timeout=deadline - monotonic())
+            if single_draft:
+                future_2 = submit(get_document_2, filename_1)
+            dir_path_2, filename_2 = future_2.result(timeout=deadline - monotonic())
+        except DocumentError as e:
+            return jsonify(error=str(e)), BAD_REQUEST
+        except TimeoutError:
+            logger.info("iddiff: timed out getting documents")
+            return jsonify(error="Timed out getting documents to compare"), BAD_REQUEST
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if not all(future.done() for future in futures):
+                # workers still write into the workspace, remove it after them
+                Thread(
+                    target=close_after, args=(executor, stack.pop_all()), daemon=True
+                ).start()
+
+        try:
+            if single_draft:
+                old_draft = filename_2
+                new_draft = filename_1
+            else:
+                old_draft = filename_1
+                new_draft = filename_2
+            iddiff_cache = get_iddiff_cache()
+            cache_key = get_iddiff_cache_key(
+                old_draft, new_draft, (diff_tool, table, wdiff, chbars, abdiff)
             )
-        except TextProcessingError as e:
-            error = "Error converting second draft to text: {}".format(str(e))
-            return jsonify(error=error), BAD_REQUEST
-    else:
-        if url_2:
-            try:
-                is_valid_url(url_2, current_app.config["ALLOWED_DOMAINS"], logger)
-            except InvalidURL as e:
-                return jsonify(error=str(e)), BAD_REQUEST
-        elif doc_2:
-            try:
-                url_2 = get_latest(
-                    doc_2, current_app.config["DT_LATEST_DRAFT_URL"], logger
+            iddiff = iddiff_cache.get(cache_key)
+            if iddiff is None:
+                iddiff = get_id_diff(
+                    old_draft=old_draft,
+                    new_draft=new_draft,
+                    diff_tool=diff_tool,
+                    table=table,
+                    wdiff=wdiff,
+                    chbars=chbars,
+                    abdiff=abdiff,
+                    logger=logger,
                 )
-            except DocumentNotFound as e:
-                return jsonify(error=str(e)), BAD_REQUEST
-        else:
-            filename = filename_1.split("/")[-1]
-            document_name = get_name(filename)
-            original_doc_name = get_name_with_revision(filename)
-
-            if original_doc_name == document_name:
-                # document doesn't have a revision in the file name
-                # compare with the latest
-                latest = True
-
-            if document_name is None:
-                logger.error("Can not determine draft name for {}".format(filename))
-                return (jsonify(error="Can not determine draft/rfc"), BAD_REQUEST)
+                for dir_path in (dir_path_1, dir_path_2):
+                    iddiff = iddiff.replace("{}/".format(dir_path), "")
+                iddiff_cache.set(cache_key, iddiff)
             else:
-                try:
-                    if latest:
-                        url_2 = get_latest(
-                            document_name,
-                            current_app.config["DT_LATEST_DRAFT_URL"],
-                            logger,
-                        )
-                    else:
-                        url_2 = get_previous(
-                            original_doc_name,
-                            current_app.config["DT_LATEST_DRAFT_URL"],
-                            logger,
-                        )
-                    single_draft = True
-                except DocumentNotFound as e:
-                    return jsonify(error=str(e)), BAD_REQUEST
-        try:
-            dir_path_2, filename_2 = get_text_id_from_url(
-                url_2, current_app.config["UPLOAD_DIR"], raw=raw, logger=logger
-            )
-        except DownloadError as e:
-            return jsonify(error=str(e)), BAD_REQUEST
-        except TextProcessingError as e:
-            error = "Error converting second document to text: {}".format(str(e))
-            return jsonify(error=str(error)), BAD_REQUEST
-
-    try:
-        if single_draft:
-            old_draft = filename_2
-            new_draft = filename_1
-        else:
-            old_draft = filename_1
-            new_draft = filename_2
-        iddiff = get_id_diff(
-            old_draft=old_draft,
-            new_draft=new_draft,
-            diff_tool=diff_tool,
-            table=table,
-            wdiff=wdiff,
-            chbars=chbars,
-            abdiff=abdiff,
-            logger=logger,
-        )
-        for dir_path in (dir_path_1, dir_path_2):
-            iddiff = iddiff.replace("{}/".format(dir_path), "")
-        if chbars or abdiff:
-            response = make_response(iddiff)
-            response.headers["Content-Type"] = "text/plain; charset=UTF-8"
-            return response
-        else:
-            return iddiff
-    except IddiffError as e:  # pragma: no cover
-        return jsonify(error="iddiff error: {}".format(e)), BAD_REQUEST
+                logger.debug("iddiff cache hit")
+            if chbars or abdiff:
+                response = make_response(iddiff)
+                response.headers["Content-Type"] = "text/plain; charset=UTF-8"
+                return response
+            else:
+                return iddiff
+        except IddiffError as e:  # pragma: no cover
+            return jsonify(error="iddiff error: {}".format(e)), BAD_REQUEST
 
 
 @bp.route("/abnf/extract", methods=("GET",))
@@ -466,17 +931,17 @@ def abnf_extract():
             logger.info("URL/document is missing")
             return jsonify(error="URL/document name must be provided"), BAD_REQUEST
 
-        _, filename = get_text_id_from_url(
-            url, current_app.config["UPLOAD_DIR"], logger=logger
-        )
-
-        output = extract_abnf(filename, logger=logger)
+        with workspace() as upload_dir:
+            _, filename = get_text_id_from_url(url, upload_dir, logger=logger)
+            output = extract_abnf(filename, logger=logger)
 
         response = make_response(output)
         response.headers["Content-Type"] = "text/plain; charset=UTF-8"
 
         return response
 
+    except DatatrackerUnavailable as e:
+        return jsonify(error=str(e)), SERVICE_UNAVAILABLE
     except DocumentNotFound as e:
         return jsonify(error=str(e)), BAD_REQUEST
     except DownloadError as e:
@@ -498,9 +963,9 @@ def abnf_parse():
     input = request.values.get("input", "")
     if input and not input.endswith("\n"):
         input += "\n"
-    _, filename = save_file_from_text(input, current_app.config["UPLOAD_DIR"])
-
-    errors, abnf = parse_abnf(filename, logger=logger)
+    with workspace() as upload_dir:
+        _, filename = save_file_from_text(input, upload_dir)
+        errors, abnf = parse_abnf(filename, logger=logger)
 
     return jsonify({"errors": errors, "abnf": abnf})
 
@@ -520,9 +985,9 @@ def svgcheck():
 
     file = request.files["file"]
 
-    _, filename = save_file(file, current_app.config["UPLOAD_DIR"])
-
-    svg, result, errors = get_svgcheck(filename, logger=logger)
+    with workspace() as upload_dir:
+        _, filename = save_file(file, upload_dir)
+        svg, result, errors = get_svgcheck(filename, logger=logger)
 
     return jsonify({"svgcheck": result, "errors": errors, "svg": svg})
 
@@ -542,19 +1007,59 @@ def clean_svg_ids():
 
     file = request.files["file"]
 
-    _, filename = save_file(file, current_app.config["UPLOAD_DIR"])
+    _, filename = save_upload(file)
 
     xml_file = clean_svg(filename, logger=logger)
 
     updated_filename = get_file(xml_file)
     if len(updated_filename) > 0:
-        url = "/".join(
-            (current_app.config["SITE_URL"], "api", "export", updated_filename)
-        )
+        url = export_file(updated_filename)
 
     return jsonify(url=url)
 
 
+@bp.route("/jobs/<job_id>", methods=("GET",))
+@require_api_key
+def job_status(job_id):
+    """GET: /jobs/<job_id> API call
+    Returns JSON with job status"""
+
+    if (job := get_job_queue().get(job_id)) is None:
+        return jsonify(error="Job not found"), NOT_FOUND
+
+    status = {
+        "id": job["id"],
+        "status": job["status"],
+        "created": job["created"],
+        "updated": job["updated"],
+    }
+    if job["status"] in (DONE, FAILED):
+        status["result_url"] = "/".join((get_job_url(job_id), "result"))
+    if job["error"]:
+        status["error"] = job["error"]
+
+    return jsonify(**status)
+
+
+@bp.route("/jobs/<job_id>/result", methods=("GET",))
+@require_api_key
+def job_result(job_id):
+    """GET: /jobs/<job_id>/result API call
+    Returns result of the finished job in the same way the synchronous API
+    call would."""
+
+    if (job := get_job_queue().get(job_id)) is None:
+        return jsonify(error="Job not found"), NOT_FOUND
+
+    if job["status"] == DONE:
+        result = job["result"]
+        return jsonify(url=get_export_url(result["filename"]), logs=result["logs"])
+    elif job["status"] == FAILED:
+        return jsonify(error=job["error"]), BAD_REQUEST
+    else:
+        return jsonify(id=job["id"], status=job["status"]), ACCEPTED
+
+
 @bp.route("/version", methods=("GET",))
 def version():
     """GET: /version API call
@@ -566,3 +1071,32 @@ def version():
     versions["author_tools_api"] = current_app.config["VERSION"]
 
     return jsonify(versions=versions)
+
+
+@bp.route("/metrics", methods=("GET",))
+@require_api_key
+def metrics():
+    """GET: /metrics API call
+    Returns JSON with cache, document cache, Datatracker metadata cache,
+    outbound HTTP, API key validation cache, per API key rate limits,
+    single-flight, process limits, admission control, upload directory, job
+    queue, reference cache and BibXML mirror statistics"""
+
+    logger = current_app.logger
+    logger.debug("metrics request")
+
+    return jsonify(
+        caches=get_cache_stats(),
+        documents=get_document_cache().stats(),
+        datatracker=get_metadata_stats(),
+        http=get_client_stats(),
+        auth=get_apikey_stats(),
+        rate_limits=get_rate_limit_stats(),
+        single_flight=get_single_flight_stats(),
+        processes=get_process_stats(),
+        admission=get_admission_stats(),
+        uploads=get_retention_stats(current_app.config["UPLOAD_DIR"]),
+        jobs=get_job_queue().stats(),
+        refcache=get_refcache_stats(),
+        bibxml=get_bibxml_stats(),
+    )
@@ -0,0 +1,154 @@
+from math import ceil
+from threading import Lock
+from time import monotonic
+
+from at.utils.runner import get_max_processes
+from at.utils.settings import get_setting
+
+ADMISSION_CONTROL = True
+LATENCY_SLO = 60  # in seconds
+# requests served in parallel, per worker process, defaults to MAX_PROCESSES
+CAPACITY = None
+ALPHA = 0.2  # weight of the latest service time in the moving average
+DEFAULT_SERVICE_TIME = 1.0  # in seconds, until an endpoint has been served
+HALF_LIFE = 60  # in seconds, estimates decay towards the default meanwhile
+# cheap endpoints, always served
+EXEMPT_ENDPOINTS = (
+    "api.abnf_parse",
+    "api.export",
+    "api.job_result",
+    "api.job_status",
+    "api.metrics",
+    "api.version",
+)
+
+
+def get_key(endpoint, view_args=None):
+    """Returns admission key of the request, render endpoints by format"""
+    if view_args and "format" in view_args:
+        return "{}:{}".format(endpoint, view_args["format"])
+    return endpoint
+
+
+class AdmissionController:
+    """Estimates queued work from requests in flight and moving averages of
+    service times per endpoint. Requests that would not be served within
+    the latency SLO are rejected, unless nothing of the same endpoint is in
+    flight."""
+
+    def __init__(
+        self, slo=LATENCY_SLO, capacity=None, alpha=ALPHA, half_life=HALF_LIFE
+    ):
+        self.slo = slo
+        self.capacity = max(capacity or get_max_processes(), 1)
+        self.alpha = alpha
+        self.half_life = half_life
+        self._in_flight = {}
+        self._service_times = {}  # (moving average, updated)
+        self._admitted = {}
+        self._rejected = {}
+        self._lock = Lock()
+
+    def get_service_time(self, endpoint):
+        """Returns moving average of the service time of the endpoint,
+        decayed towards the default since it was last updated"""
+        if endpoint not in self._service_times:
+            return DEFAULT_SERVICE_TIME
+
+        service_time, updated = self._service_times[endpoint]
+        decay = 0.5 ** ((monotonic() - updated) / self.half_life)
+        return DEFAULT_SERVICE_TIME + (service_time - DEFAULT_SERVICE_TIME) * decay
+
+    def get_backlog(self):
+        """Returns estimated time in seconds to serve requests in flight"""
+        work = sum(
+            count * self.get_service_time(endpoint)
+            for endpoint, count in self._in_flight.items()
+        )
+        return work / self.capacity
+
+    def admit(self, endpoint, exempt=False):
+        """Admit request to the endpoint.
+        Returns None if the request was admitted, else seconds after which
+        it should be retried."""
+        with self._lock:
+            estimate = self.get_backlog() + self.get_service_time(endpoint)
+            idle = not self._in_flight.get(endpoint)
+            if not (exempt or idle) and estimate > self.slo:
+                self._rejected[endpoint] = self._rejected.get(endpoint, 0) + 1
+                return max(ceil(estimate - self.slo), 1)
+
+            self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+            self._admitted[endpoint] = self._admitted.get(endpoint, 0) + 1
+            return None
+
+    def finish(self, endpoint, service_time):
+        """Record end of an admitted request"""
+        with self._lock:
+            self._in_flight[endpoint] -= 1
+            if endpoint in self._service_times:
+                average = self.get_service_time(endpoint)
+                service_time = average + self.alpha * (service_time - average)
+            self._service_times[endpoint] = (service_time, monotonic())
+
+    def stats(self):
+        """Returns admission statistics"""
+        with self._lock:
+            endpoints = set(self._admitted) | set(self._rejected)
+            return {
+                "slo": self.slo,
+                "capacity": self.capacity,
+                "backlog": round(self.get_backlog(), 4),
+                "admitted": sum(self._admitted.values()),
+                "rejected": sum(self._rejected.values()),
+                "endpoints": {
+                    endpoint: {
+                        "in_flight": self._in_flight.get(endpoint, 0),
+                        "service_time": round(self.get_service_time(endpoint), 4),
+                        "admitted": self._admitted.get(endpoint, 0),
+                        "rejected": self._rejected.get(endpoint, 0),
+                    }
+                    for endpoint in endpoints
+                },
+            }
+
+
+controller = AdmissionController()
+
+
+def is_enabled():
+    """Returns True if admission control is enabled for the current
+    application"""
+    return get_setting("ADMISSION_CONTROL", ADMISSION_CONTROL)
+
+
+def get_controller():
+    """Returns admission controller with the latency SLO and capacity of the
+    current application"""
+    controller.slo = get_setting("LATENCY_SLO", LATENCY_SLO)
+    controller.capacity = max(
+        get_setting("ADMISSION_CAPACITY", CAPACITY) or get_max_processes(), 1
+    )
+    return controller
+
+
+def admit(endpoint, view_args=None):
+    """Admit request to the endpoint.
+    Returns None if the request was admitted, else seconds after which it
+    should be retried."""
+    if not is_enabled():
+        return None
+    return get_controller().admit(
+        get_key(endpoint, view_args), exempt=endpoint in EXEMPT_ENDPOINTS
+    )
+
+
+def finish(endpoint, service_time, view_args=None):
+    """Record end of an admitted request"""
+    if is_enabled():
+        controller.finish(get_key(endpoint, view_args), service_time)
+
+
+def get_stats():
+    """Returns admission statistics"""
+    return controller.stats()
@@ -1,14 +1,125 @@
+from hashlib import sha256
+from hmac import compare_digest, new as hmac_new
+from time import monotonic, time
+
 from decorator import decorator
 from flask import current_app, jsonify, request
-from requests import post
+
+from at.utils.cache import LRUCache
+from at.utils.client import post
+from at.utils.ratelimit import get_client_id, take
+from at.utils.runner import client_context
+from at.utils.settings import get_setting
 
 UNAUTHORIZED = 401
+FORBIDDEN = 403
+TOO_MANY_REQUESTS = 429
 OK = 200
+APIKEY_CACHE_SIZE = 1024
+VALID_APIKEY_TTL = 5 * 60  # in seconds
+INVALID_APIKEY_TTL = 30  # in seconds
+SIGNED_URL_TTL = 24 * 60 * 60  # in seconds
+
+apikey_cache = LRUCache(maxsize=APIKEY_CACHE_SIZE)
+
+
+def get_apikey_cache():
+    """Returns API key validation cache with the size of the current
+    application"""
+    apikey_cache.maxsize = get_setting("APIKEY_CACHE_SIZE", APIKEY_CACHE_SIZE)
+    return apikey_cache
+
+
+def get_apikey_hash(apikey, dt_appauth_url):
+    """Returns cache key for the API key, so that keys are not kept in memory"""
+    return sha256("\n".join([dt_appauth_url, apikey]).encode("utf-8")).hexdigest()
+
+
+def validate_apikey(apikey, dt_appauth_url):
+    """Returns True if Datatracker accepts the API key.
+    Validation results are cached for VALID_APIKEY_TTL or INVALID_APIKEY_TTL,
+    except when Datatracker fails with server error."""
+
+    key = get_apikey_hash(apikey, dt_appauth_url)
+    entry = get_apikey_cache().get(key)
+
+    if entry and monotonic() < entry[1]:
+        return entry[0]
+
+    with post(dt_appauth_url, data={"apikey": apikey}) as response:
+        valid = response.status_code == OK and response.json()["success"] is True
+        if response.status_code < 500:
+            if valid:
+                ttl = get_setting("VALID_APIKEY_TTL", VALID_APIKEY_TTL)
+            else:
+                ttl = get_setting("INVALID_APIKEY_TTL", INVALID_APIKEY_TTL)
+            apikey_cache.set(key, (valid, monotonic() + ttl))
+
+    return valid
+
+
+def get_apikey_stats():
+    """Returns API key validation cache statistics"""
+    return apikey_cache.stats()
+
+
+def get_signature(path, expires, secret):
+    """Returns HMAC-SHA256 signature of the URL path and expiry time"""
+    message = "\n".join([path, str(expires)]).encode("utf-8")
+    return hmac_new(secret.encode("utf-8"), message, sha256).hexdigest()
+
+
+def sign_url(url, path, secret, ttl=None):
+    """Returns URL with expiry time and signature of the path.
+    ttl defaults to SIGNED_URL_TTL of the current application."""
+    if ttl is None:
+        ttl = get_setting("SIGNED_URL_TTL", SIGNED_URL_TTL)
+    expires = int(time()) + ttl
+    return "{}?expires={}&signature={}".format(
+        url, expires, get_signature(path, expires, secret)
+    )
+
+
+def is_valid_signature(path, expires, signature, secret):
+    """Returns True if signature of the path is valid and has not expired"""
+    try:
+        if int(expires) < time():
+            return False
+    except (TypeError, ValueError):
+        return False
+
+    return compare_digest(get_signature(path, expires, secret), signature)
+
+
+@decorator
+def require_signature(f, *args, **kwargs):
+    """Returns the function if the signed URL is valid or, for unsigned
+    URLs, if api authentication passes.
+    Else returns JSON reponse with an error."""
+    logger = current_app.logger
+    secret = current_app.config.get("EXPORT_URL_SECRET")
+
+    if secret and "signature" in request.args:
+        if is_valid_signature(
+            request.path,
+            request.args.get("expires"),
+            request.args["signature"],
+            secret,
+        ):
+            logger.debug("valid signature")
+            return f(*args, **kwargs)
+        else:
+            logger.info("invalid or expired signature")
+            return jsonify(error="URL signature is invalid or expired"), FORBIDDEN
+
+    return require_api_key(f)(*args, **kwargs)
 
 
 @decorator
 def require_api_key(f, *args, **kwargs):
-    """Returns the function if api authentication passes.
+    """Returns the function if api authentication passes and the API key is
+    within its rate limit. Processes of the function run on behalf of the
+    API key client.
     Else returns JSON reponse with an error."""
     logger = current_app.logger
     config = current_app.config
@@ -24,13 +135,24 @@ def require_api_key(f, *args, **kwargs):
                 logger.error("missing api key")
                 return jsonify(error="API key is missing"), UNAUTHORIZED
 
-        with post(
-            config["DT_APPAUTH_URL"], data={"apikey": apikey.strip()}
-        ) as response:
-            if response.status_code == OK and response.json()["success"] is True:
-                logger.debug("valid apikey")
-            else:
-                logger.error("invalid api key")
-                return jsonify(error="API key is invalid"), UNAUTHORIZED
+        if validate_apikey(apikey.strip(), config["DT_APPAUTH_URL"]):
+            logger.debug("valid apikey")
+        else:
+            logger.error("invalid api key")
+            return jsonify(error="API key is invalid"), UNAUTHORIZED
+
+        client = get_client_id(apikey.strip())
+        if retry_after := take(client):
+            logger.info(
+                "rate limit exceeded: {}, retry after {}s".format(client, retry_after)
+            )
+            return (
+                jsonify(error="Rate limit exceeded, please try again later"),
+                TOO_MANY_REQUESTS,
+                {"Retry-After": str(retry_after)},
+            )
+
+        with client_context(client):
+            return f(*args, **kwargs)
 
     return f(*args, **kwargs)
@@ -0,0 +1,310 @@
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from functools import lru_cache
+from json import dump, load
+from logging import getLogger, basicConfig, INFO
+from os import (
+    chmod,
+    link,
+    listdir,
+    makedirs,
+    path,
+    remove,
+    replace,
+    symlink,
+    utime,
+)
+from shutil import copyfile, rmtree
+from tarfile import open as open_tarfile
+from tempfile import mkdtemp, NamedTemporaryFile
+from threading import Lock
+from urllib.parse import urlsplit
+
+import xml2rfc
+from lxml import etree
+
+from at.utils.settings import get_env_settings, get_setting
+
+BIBXML_DIR = "/var/cache/bibxml"
+CURRENT = "current"
+VERSIONS = "versions"
+INDEX = "index.json"
+KEEP_VERSIONS = 2
+SCHEMAS = {"reference": "reference.rng", "referencegroup": "referencegroup.rng"}
+
+_index = {}
+_index_lock = Lock()
+
+
+# Exceptions
+class BibXMLError(Exception):
+    """Error class for BibXML mirror errors"""
+
+    pass
+
+
+@lru_cache
+def get_schema(tag):
+    """Returns RelaxNG schema xml2rfc uses for validating references"""
+    schema = path.join(path.dirname(xml2rfc.__file__), "data", SCHEMAS[tag])
+    return etree.RelaxNG(file=schema)
+
+
+def is_valid_reference(xml):
+    """Validate reference like xml2rfc does before caching it"""
+    return xml.tag in SCHEMAS and get_schema(xml.tag).validate(xml)
+
+
+def get_bibxml_dir():
+    """Returns BibXML mirror directory of the current application"""
+    return get_setting("BIBXML_DIR", BIBXML_DIR)
+
+
+def get_version_dir(bibxml_dir=BIBXML_DIR):
+    """Returns directory of the current mirror version or None"""
+    current = path.join(bibxml_dir, CURRENT)
+    if path.isfile(path.join(current, INDEX)):
+        return path.realpath(current)
+
+    return None
+
+
+def read_index(version_dir):
+    """Returns index of the mirror version"""
+    with open(path.join(version_dir, INDEX)) as file:
+        return load(file)
+
+
+def get_index(bibxml_dir=BIBXML_DIR):
+    """Returns index of the current mirror version or None.
+    NOTE: index is read once per mirror version"""
+    if (version_dir := get_version_dir(bibxml_dir)) is None:
+        return None
+
+    with _index_lock:
+        if version_dir not in _index:
+            try:
+                _index.clear()
+                _index[version_dir] = read_index(version_dir)
+            except (OSError, ValueError):
+                return None
+
+    return _index[version_dir]
+
+
+def get_reference_file(name, bibxml_dir=BIBXML_DIR):
+    """Returns mirror file for reference URL, file name or anchor.
+    Returns None if mirror does not have the reference."""
+    index = get_index(bibxml_dir)
+    if not index or not name:
+        return None
+
+    _, _, url_path, query, _ = urlsplit(name)
+    if query:
+        return None
+
+    filename = path.basename(url_path)
+    if filename not in index["files"]:
+        if not filename.endswith(".xml") and filename + ".xml" in index["files"]:
+            filename += ".xml"
+        else:
+            filename = index["anchors"].get(name)
+
+    if filename:
+        return path.join(bibxml_dir, CURRENT, filename)
+
+    return None
+
+
+def get_stats(bibxml_dir=None):
+    """Returns mirror statistics"""
+    index = get_index(bibxml_dir or get_bibxml_dir())
+    if not index:
+        return {"version": None, "references": 0}
+
+    return {
+        "version": index["version"],
+        "updated": index["updated"],
+        "references": len(index["files"]),
+    }
+
+
+def get_archive_references(archive, logger=getLogger()):
+    """Yields (file name, anchor, content) of valid references in tarball"""
+    parser = etree.XMLParser(resolve_entities=False, no_network=True)
+
+    with open_tarfile(archive) as tar:
+        for member in tar:
+            filename = path.basename(member.name)
+            if not member.isfile() or not filename.endswith(".xml"):
+                continue
+            if filename.startswith(".") or filename == INDEX:
+                continue
+
+            content = tar.extractfile(member).read()
+            try:
+                xml = etree.fromstring(content, parser)
+            except etree.XMLSyntaxError as e:
+                logger.info("bibxml: skipping {}: {}".format(member.name, str(e)))
+                continue
+            if not is_valid_reference(xml):
+                logger.info("bibxml: skipping invalid {}".format(member.name))
+                continue
+
+            yield filename, xml.get("anchor"), content
+
+
+def write_file(filename, content):
+    """Write file atomically"""
+    with NamedTemporaryFile(dir=path.dirname(filename), delete=False) as file:
+        file.write(content)
+    chmod(file.name, 0o644)
+    replace(file.name, filename)
+
+
+def activate_version(bibxml_dir, version):
+    """Point current link to the version and remove old versions"""
+    link_name = path.join(bibxml_dir, "." + CURRENT)
+    if path.lexists(link_name):
+        remove(link_name)  # left over from an interrupted update
+    symlink(path.join(VERSIONS, version), link_name)
+    replace(link_name, path.join(bibxml_dir, CURRENT))
+
+    versions_dir = path.join(bibxml_dir, VERSIONS)
+    versions = sorted(v for v in listdir(versions_dir) if not v.startswith("."))
+    for old in versions[:-KEEP_VERSIONS]:
+        if old != version:
+            rmtree(path.join(versions_dir, old), ignore_errors=True)
+
+
+def build(archive, bibxml_dir=BIBXML_DIR, incremental=False, logger=getLogger()):
+    """Build new mirror version from tarball.
+    With incremental, references of the current version are carried over
+    (hard linked) and the tarball only adds or replaces references.
+    Returns the new version."""
+
+    current_dir = get_version_dir(bibxml_dir) if incremental else None
+    index = read_index(current_dir) if current_dir else {"files": {}, "anchors": {}}
+
+    versions_dir = path.join(bibxml_dir, VERSIONS)
+    makedirs(versions_dir, exist_ok=True)
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    build_dir = mkdtemp(prefix=".", dir=versions_dir)
+
+    try:
+        if current_dir:
+            for filename in index["files"]:
+                link(path.join(current_dir, filename), path.join(build_dir, filename))
+
+        added = 0
+        for filename, anchor, content in get_archive_references(archive, logger):
+            target = path.join(build_dir, filename)
+            if path.exists(target):
+                with open(target, "rb") as file:
+                    if file.read() == content:
+                        continue
+            # replace, never write through the hard link to the old version
+            write_file(target, content)
+            if old_anchor := index["files"].get(filename):
+                index["anchors"].pop(old_anchor, None)
+            index["files"][filename] = anchor
+            if anchor:
+                index["anchors"][anchor] = filename
+            added += 1
+
+        if not index["files"]:
+            raise BibXMLError("No references found in {}".format(archive))
+
+        index["version"] = version
+        index["updated"] = datetime.now(timezone.utc).isoformat()
+        with open(path.join(build_dir, INDEX), "w") as file:
+            dump(index, file)
+        chmod(build_dir, 0o755)
+        replace(build_dir, path.join(versions_dir, version))
+    except BaseException:
+        rmtree(build_dir, ignore_errors=True)
+        raise
+
+    activate_version(bibxml_dir, version)
+    logger.info(
+        "bibxml: version {} with {} references ({} added or updated)".format(
+            version, len(index["files"]), added
+        )
+    )
+
+    return version
+
+
+def seed_refcache(refcache_dir, bibxml_dir=BIBXML_DIR):
+    """Copy mirror references to kramdown-rfc reference cache, so kramdown-rfc
+    finds them without going to the network.
+    Returns number of references added or refreshed."""
+
+    if not refcache_dir or not (version_dir := get_version_dir(bibxml_dir)):
+        return 0
+
+    makedirs(refcache_dir, exist_ok=True)
+    seeded = 0
+    for filename in read_index(version_dir)["files"]:
+        source = path.join(version_dir, filename)
+        target = path.join(refcache_dir, filename)
+        if path.exists(target) and path.getmtime(target) >= path.getmtime(source):
+            continue
+        with NamedTemporaryFile(dir=refcache_dir, delete=False) as file:
+            pass
+        copyfile(source, file.name)
+        chmod(file.name, 0o644)
+        replace(file.name, target)
+        utime(target)  # kramdown-rfc expires cache entries by mtime
+        seeded += 1
+
+    return seeded
+
+
+def main(args=None):
+    """Command line interface"""
+    settings = get_env_settings()
+    refcache_dir = settings.get("KRAMDOWN_REFCACHEDIR")
+    parser = ArgumentParser(description="Manage local BibXML mirror")
+    parser.add_argument(
+        "--dir", default=settings.get("BIBXML_DIR", BIBXML_DIR), help="mirror directory"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="build from tarball").add_argument("archive")
+    commands.add_parser("update", help="update from tarball").add_argument("archive")
+    commands.add_parser("seed", help="seed kramdown-rfc cache").add_argument(
+        "refcache", nargs="?", default=refcache_dir
+    )
+    commands.add_parser("status", help="show mirror status")
+    options = parser.parse_args(args)
+
+    basicConfig(level=INFO, format="%(message)s")
+    logger = getLogger("bibxml")
+
+    try:
+        if options.command in ("build", "update"):
+            build(
+                options.archive,
+                bibxml_dir=options.dir,
+                incremental=options.command == "update",
+                logger=logger,
+            )
+            if refcache_dir:
+                seeded = seed_refcache(refcache_dir, options.dir)
+                logger.info("bibxml: seeded {} references".format(seeded))
+        elif options.command == "seed":
+            if not options.refcache:
+                parser.error("reference cache directory is required")
+            seeded = seed_refcache(options.refcache, options.dir)
+            logger.info("bibxml: seeded {} references".format(seeded))
+        else:
+            print(get_stats(options.dir))
+    except (BibXMLError, OSError, ValueError) as e:
+        logger.error("bibxml: {}".format(str(e)))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
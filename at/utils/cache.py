@@ -0,0 +1,272 @@
+from collections import OrderedDict
+from hashlib import sha256
+from json import dumps
+from os import chmod, fstat, makedirs, path, remove, replace, scandir, utime
+from shutil import copyfileobj
+from tempfile import NamedTemporaryFile
+from threading import RLock
+from zlib import compress, decompress
+
+from flask import current_app
+
+MAXSIZE = 128
+
+
+class LRUCache:
+    """Size bounded least recently used cache with hit/miss counters"""
+
+    def __init__(self, maxsize=MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Returns cached value and marks it as recently used"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            else:
+                self.misses += 1
+                return default
+
+    def set(self, key, value):
+        """Adds value to the cache, evicting least recently used entries"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Removes key from the cache"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Removes all entries from the cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def items(self):
+        """Returns list of (key, value) of cached entries, least recent first"""
+        with self._lock:
+            return list(self._entries.items())
+
+    def stats(self):
+        """Returns cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CompressedLRUCache(LRUCache):
+    """LRU cache of text values, stored zlib compressed"""
+
+    def __init__(self, maxsize=MAXSIZE):
+        super().__init__(maxsize=maxsize)
+        self.bytes = 0
+
+    def get(self, key, default=None):
+        """Returns decompressed cached value and marks it as recently used"""
+        value = super().get(key)
+        if value is None:
+            return default
+        return decompress(value).decode("utf-8")
+
+    def set(self, key, value):
+        """Adds compressed value to the cache"""
+        compressed = compress(value.encode("utf-8"))
+        with self._lock:
+            self.delete(key)
+            self._entries[key] = compressed
+            self.bytes += len(compressed)
+            while len(self._entries) > self.maxsize:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Removes key from the cache"""
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= len(self._entries.pop(key))
+
+    def clear(self):
+        """Removes all entries from the cache"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Returns cache statistics"""
+        stats = super().stats()
+        stats["bytes"] = self.bytes
+        return stats
+
+
+class DiskCache:
+    """Size bounded least recently used cache of immutable content on disk.
+    Entries are files named after SHA-256 of the key, recency is the mtime,
+    so processes sharing the directory share the cache."""
+
+    def __init__(self, directory, maxsize):
+        self.directory = directory
+        self.maxsize = maxsize  # in bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self._lock = RLock()
+
+    def get_filename(self, key):
+        """Returns entry filename for the key"""
+        return path.join(self.directory, sha256(key.encode("utf-8")).hexdigest())
+
+    def get(self, key, default=None):
+        """Returns cached content and marks it as recently used"""
+        filename = self.get_filename(key)
+        try:
+            with open(filename, "rb") as file:
+                content = file.read()
+            utime(filename)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return default
+
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(content)
+        return content
+
+    def open(self, key):
+        """Returns binary file object of cached content, or None, and marks
+        it as recently used"""
+        filename = self.get_filename(key)
+        try:
+            file = open(filename, "rb")
+            utime(filename)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += fstat(file.fileno()).st_size
+        return file
+
+    def set(self, key, content):
+        """Adds content to the cache, evicting least recently used entries"""
+        if len(content) > self.maxsize:
+            return
+
+        self.write(key, lambda file: file.write(content))
+
+    def set_file(self, key, filename):
+        """Adds content of the file to the cache, evicting least recently used
+        entries"""
+        if path.getsize(filename) > self.maxsize:
+            return
+
+        with open(filename, "rb") as source:
+            self.write(key, lambda file: copyfileobj(source, file))
+
+    def write(self, key, writer):
+        """Write entry with writer(file) and evict least recently used entries"""
+        makedirs(self.directory, exist_ok=True)
+        # write atomically, other processes may be reading the entry
+        with NamedTemporaryFile(dir=self.directory, prefix=".", delete=False) as file:
+            writer(file)
+        chmod(file.name, 0o644)
+        replace(file.name, self.get_filename(key))
+
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until cache fits in maxsize"""
+        entries = sorted(self.scan())
+        size = sum(entry_size for _, entry_size, _ in entries)
+
+        for _, entry_size, filename in entries:
+            if size <= self.maxsize:
+                break
+            try:
+                remove(filename)
+            except FileNotFoundError:
+                pass  # evicted by another process
+            size -= entry_size
+            with self._lock:
+                self.evictions += 1
+
+    def scan(self):
+        """Returns (mtime, size, filename) of cache entries"""
+        entries = []
+        try:
+            for entry in scandir(self.directory):
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another process
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+
+        return entries
+
+    def stats(self):
+        """Returns cache statistics"""
+        entries = self.scan()
+        lookups = self.hits + self.misses
+        return {
+            "size": len(entries),
+            "bytes": sum(entry_size for _, entry_size, _ in entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+def get_cache(name, maxsize=MAXSIZE, cache_class=LRUCache):
+    """Returns named cache of the current application"""
+    caches = current_app.extensions.setdefault("caches", {})
+
+    if name not in caches:
+        caches[name] = cache_class(maxsize=maxsize)
+
+    return caches[name]
+
+
+def get_cache_stats():
+    """Returns statistics of caches of the current application"""
+    caches = current_app.extensions.get("caches", {})
+
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def get_fingerprint(data):
+    """Returns SHA-256 fingerprint of JSON serializable data"""
+    return sha256(dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
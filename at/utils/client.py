@@ -0,0 +1,96 @@
+from threading import Lock
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from at.utils.settings import get_setting
+
+CONNECT_TIMEOUT = 5  # in seconds
+READ_TIMEOUT = 30  # in seconds
+RETRIES = 2
+BACKOFF = 0.5  # in seconds, doubles on each retry
+RETRY_STATUSES = (502, 503, 504)
+POOLS = 32  # number of hosts to keep connection pools for
+POOL_SIZE = 16  # connections per host
+
+_session = None
+_session_lock = Lock()
+
+
+def get_timeout():
+    """Returns default (connect, read) timeout of outbound calls"""
+    return (
+        get_setting("HTTP_CONNECT_TIMEOUT", CONNECT_TIMEOUT),
+        get_setting("HTTP_READ_TIMEOUT", READ_TIMEOUT),
+    )
+
+
+class MeteredAdapter(HTTPAdapter):
+    """HTTP adapter with default timeout and request counters"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = 0
+        self._lock = Lock()
+
+    def send(self, request, timeout=None, **kwargs):
+        with self._lock:
+            self.requests += 1
+        return super().send(request, timeout=timeout or get_timeout(), **kwargs)
+
+    def stats(self):
+        """Returns connection statistics of live connection pools"""
+        pools = self.poolmanager.pools
+        connections = sum(pools[key].num_connections for key in pools.keys())
+        requests = sum(pools[key].num_requests for key in pools.keys())
+
+        return {
+            "requests": self.requests,
+            "connections": connections,
+            "reused": max(requests - connections, 0),
+            "reuse_ratio": round(1 - connections / requests, 4) if requests else 0.0,
+            "pools": len(pools),
+        }
+
+
+def get_session():
+    """Returns shared HTTP session for outbound calls
+    NOTE: GET and HEAD requests are retried with backoff, others are only
+    retried on connection errors"""
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=get_setting("HTTP_RETRIES", RETRIES),
+                backoff_factor=BACKOFF,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=("GET", "HEAD"),
+                raise_on_status=False,
+            )
+            adapter = MeteredAdapter(
+                pool_connections=POOLS,
+                pool_maxsize=get_setting("HTTP_POOL_SIZE", POOL_SIZE),
+                max_retries=retry,
+            )
+            _session = Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+
+    return _session
+
+
+def get(url, **kwargs):
+    """Sends GET request using the shared session"""
+    return get_session().get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    """Sends POST request using the shared session"""
+    return get_session().post(url, **kwargs)
+
+
+def get_stats():
+    """Returns outbound HTTP client statistics"""
+    return get_session().get_adapter("https://").stats()
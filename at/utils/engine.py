@@ -0,0 +1,463 @@
+from argparse import Namespace
+from copy import copy, deepcopy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextvars import copy_context
+from datetime import date
+from io import StringIO
+from logging import getLogger
+from multiprocessing import get_context
+from subprocess import CompletedProcess
+from threading import Lock
+
+import xml2rfc
+from xml2rfc import log as xml2rfc_log
+from xml2rfc.parser import XmlRfcError
+from xml2rfc.writers.base import default_options
+from lxml.etree import XMLSyntaxError
+
+from at.utils.runner import process_slot, proc_run, RunnerError, TIMEOUT
+from at.utils.settings import get_setting
+
+WORKERS = 3  # 0 disables the engine
+FORMATS = ("html", "pdf", "text", "v2v3")
+WRITERS = {
+    "html": xml2rfc.HtmlWriter,
+    "pdf": xml2rfc.PdfWriter,
+    "text": xml2rfc.TextWriter,
+}
+
+_executor = None
+_executor_lock = Lock()
+
+
+# Exceptions
+class EngineError(Exception):
+    """Error class for rendering engine errors"""
+
+    pass
+
+
+def init_worker():
+    """Initialize engine worker process
+    NOTE: PDF libraries and fonts are loaded once per worker"""
+    if xml2rfc.HAVE_WEASYPRINT and xml2rfc.HAVE_PANGO:
+        try:
+            from weasyprint.text.fonts import FontConfiguration
+
+            FontConfiguration()
+        except Exception:  # pragma: no cover
+            pass
+
+
+def get_workers():
+    """Returns number of engine workers of the current application"""
+    return get_setting("XML2RFC_ENGINE_WORKERS", WORKERS)
+
+
+def get_executor():
+    """Returns process pool of engine workers"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=get_workers(),
+                mp_context=get_context("spawn"),
+                initializer=init_worker,
+            )
+
+    return _executor
+
+
+def reset_executor():
+    """Terminate engine workers, new workers get started on next use"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            for process in list((_executor._processes or {}).values()):
+                process.terminate()
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def get_options(format, warn_bare_unicode=False):
+    """Returns xml2rfc options for given output format"""
+    options = Namespace(**vars(default_options))
+    options.date = date.today()
+    options.warn_bare_unicode = warn_bare_unicode
+    options.vocabulary = "v2" if format == "v2v3" else "v3"
+    # v3 formatters do not validate documents against the DTD
+    options.no_dtd = True
+
+    for option in FORMATS:
+        setattr(options, option, option == format)
+
+    return options
+
+
+def get_args(filename, output, format="text", warn_bare_unicode=False):
+    """Returns xml2rfc command line arguments"""
+    args = ["xml2rfc"]
+
+    if format != "text":
+        args.append("--{}".format(format))
+    if warn_bare_unicode:
+        args.append("--warn-bare-unicode")
+
+    return args + ["--out", output, filename]
+
+
+def get_log():
+    """Redirects xml2rfc log output to buffers and returns them"""
+    stdout, stderr = StringIO(), StringIO()
+    xml2rfc_log.write_out, xml2rfc_log.write_err = stdout, stderr
+    xml2rfc_log.quiet, xml2rfc_log.verbose = False, False
+
+    return (stdout, stderr)
+
+
+def run_stage(stage, filename, *args):
+    """Run given stage with xml2rfc log captured.
+    Returns stage result and exit code, stdout and stderr in the same way
+    xml2rfc would."""
+
+    stdout, stderr = get_log()
+    returncode = 0
+    result = None
+
+    try:
+        result = stage(*args)
+    except XmlRfcError as e:
+        xml2rfc_log.exception("Unable to parse the XML document: " + filename, e)
+        returncode = 1
+    except XMLSyntaxError as e:
+        xml2rfc_log.exception(
+            "Unable to parse the XML document: " + filename, e.error_log
+        )
+        returncode = 1
+    except xml2rfc.RfcWriterError as e:
+        xml2rfc_log.write(e.msg)
+        xml2rfc_log.write("Unable to complete processing %s" % filename)
+        returncode = 1
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            returncode = e.code
+        else:
+            stderr.write("{}\n".format(e.code))
+            returncode = 1
+    except Exception as e:
+        raise EngineError(str(e))
+
+    return (result, (returncode, stdout.getvalue(), stderr.getvalue()))
+
+
+def check_format(format):
+    """Raises EngineError if engine can not render given format"""
+    if format not in FORMATS:
+        raise EngineError("Unsupported format: {}".format(format))
+    if format == "pdf" and not (xml2rfc.HAVE_WEASYPRINT and xml2rfc.HAVE_PANGO):
+        raise EngineError("PDF libraries are not available")
+
+
+def set_document_options(options, xmlrfc):
+    """Set document specific xml2rfc options"""
+    root = xmlrfc.tree.getroot()
+    options.rfc = root.get("number")
+    options.pagination = False if options.rfc else True
+    if root.get("version") == "3":
+        options.vocabulary = "v3"
+
+
+def get_parser(filename, options):
+    """Returns xml2rfc parser"""
+    return xml2rfc.XmlRfcParser(
+        filename, options=options, templates_path=options.template_dir
+    )
+
+
+def write_document(xmlrfc, output, format, options):
+    """Write given xml2rfc document in given format
+    NOTE: document tree gets modified"""
+
+    if format == "v2v3":
+        writer = xml2rfc.V2v3XmlWriter(xmlrfc, options=options, date=options.date)
+        writer.write(output)
+    else:
+        if not xmlrfc.tree.getroot().get("prepTime"):
+            v2v3 = xml2rfc.V2v3XmlWriter(xmlrfc, options=options, date=options.date)
+            xmlrfc.tree = v2v3.convert2to3()
+            prep = xml2rfc.PrepToolWriter(
+                xmlrfc,
+                options=options,
+                date=options.date,
+                liberal=True,
+                keep_pis=[xml2rfc.V3_PI_TARGET],
+            )
+            xmlrfc.tree = prep.prep()
+        if xmlrfc.tree:
+            writer = WRITERS[format](xmlrfc, options=options, date=options.date)
+            writer.write(output)
+
+
+def render_document(filename, output, format="text", warn_bare_unicode=False):
+    """Render given XML file with xml2rfc writers.
+    Returns exit code, stdout and stderr in the same way xml2rfc would.
+    NOTE: runs in an engine worker process"""
+
+    check_format(format)
+    options = get_options(format, warn_bare_unicode)
+
+    def render():
+        parser = get_parser(filename, options)
+        # first pass sets document specific options
+        set_document_options(
+            options, parser.parse(remove_pis=options.remove_pis, normalize=True)
+        )
+
+        if format == "v2v3":
+            xmlrfc = parser.parse(
+                remove_comments=False,
+                quiet=True,
+                normalize=False,
+                strip_cdata=False,
+                add_xmlns=True,
+            )
+        else:
+            xmlrfc = parser.parse(remove_comments=False, quiet=True, add_xmlns=True)
+
+        write_document(xmlrfc, output, format, options)
+
+    _, status = run_stage(render, filename)
+
+    return status
+
+
+def process_document(filename, xml_file, outputs, warn_bare_unicode=False):
+    """Parse given XML file once, convert XML2RFC v2 document to v3 in memory
+    and render all the outputs from the same document.
+    Returns XML2RFC version of the input and exit code, stdout and stderr of
+    each stage ("xml" for parsing and conversion, format for outputs).
+    NOTE: runs in an engine worker process"""
+
+    for format in outputs:
+        check_format(format)
+
+    def parse():
+        options = get_options("v2v3", warn_bare_unicode)
+        xmlrfc = get_parser(filename, options).parse(
+            remove_comments=False,
+            quiet=True,
+            normalize=False,
+            strip_cdata=False,
+            add_xmlns=True,
+        )
+        version = xmlrfc.tree.getroot().get("version", "2")
+
+        if version == "2":
+            set_document_options(options, xmlrfc)
+            # converts the document tree in place
+            write_document(xmlrfc, xml_file, "v2v3", options)
+
+        return (xmlrfc, version)
+
+    parsed, status = run_stage(parse, filename)
+    results = {"xml": status}
+
+    if parsed is None or status[0] != 0:
+        return (None, results)
+
+    xmlrfc, version = parsed
+
+    for format, output in outputs.items():
+        options = get_options(format, warn_bare_unicode)
+        set_document_options(options, xmlrfc)
+        document = copy(xmlrfc)
+        document.tree = deepcopy(xmlrfc.tree)
+        _, results[format] = run_stage(
+            write_document, filename, document, output, format, options
+        )
+
+    return (version, results)
+
+
+def get_result(args, status):
+    """Returns subprocess.CompletedProcess for engine stage status"""
+    returncode, stdout, stderr = status
+
+    return CompletedProcess(
+        args=args,
+        returncode=returncode,
+        stdout=stdout.encode("utf-8"),
+        stderr=stderr.encode("utf-8"),
+    )
+
+
+def submit(function, *args, timeout=TIMEOUT, logger=getLogger()):
+    """Run function on the engine and return the result.
+    Returns None if the engine is not available."""
+
+    if get_workers() > 0:
+        try:
+            return get_executor().submit(function, *args).result(timeout=timeout)
+        except TimeoutError:
+            logger.info("xml2rfc engine timed out")
+            reset_executor()
+            raise RunnerError("Error running xml2rfc.")
+        except BrokenProcessPool as e:
+            logger.info(f"xml2rfc engine error: {str(e)}")
+            reset_executor()
+        except (EngineError, OSError) as e:
+            logger.info(f"xml2rfc engine error: {str(e)}")
+
+        logger.debug("falling back to xml2rfc command line tool")
+
+    return None
+
+
+def run_xml2rfc(
+    filename,
+    output,
+    format="text",
+    warn_bare_unicode=False,
+    timeout=TIMEOUT,
+    logger=getLogger(),
+):
+    """Returns subprocess.CompletedProcess like output of xml2rfc run.
+    Uses warm engine workers, falls back to xml2rfc command line tool if the
+    engine is not available."""
+
+    args = get_args(filename, output, format, warn_bare_unicode)
+
+    with process_slot(args):
+        status = submit(
+            render_document,
+            filename,
+            output,
+            format,
+            warn_bare_unicode,
+            timeout=timeout,
+            logger=logger,
+        )
+
+    if status:
+        return get_result(args, status)
+    else:
+        return proc_run(args=args, timeout=timeout, capture_output=True)
+
+
+def run_xml2rfc_parallel(
+    filename,
+    outputs,
+    warn_bare_unicode=False,
+    timeout=TIMEOUT,
+    logger=getLogger(),
+):
+    """Run xml2rfc for multiple formats concurrently.
+    outputs is a dictionary of output file names by format.
+    Returns subprocess.CompletedProcess like outputs by format."""
+
+    with ThreadPoolExecutor(max_workers=max(len(outputs), 1)) as executor:
+        # renders run on behalf of the client of the caller
+        futures = {
+            format: executor.submit(
+                copy_context().run,
+                run_xml2rfc,
+                filename,
+                output,
+                format=format,
+                warn_bare_unicode=warn_bare_unicode,
+                timeout=timeout,
+                logger=logger,
+            )
+            for format, output in outputs.items()
+        }
+
+        return {format: future.result() for format, future in futures.items()}
+
+
+def run_pipeline(
+    filename,
+    xml_file,
+    outputs,
+    warn_bare_unicode=False,
+    timeout=TIMEOUT,
+    logger=getLogger(),
+):
+    """Parse XML file once, convert XML2RFC v2 to v3 and render outputs.
+    outputs is a dictionary of output file names by format.
+    Returns XML2RFC version of the input (None on parse errors) and
+    subprocess.CompletedProcess like results by stage ("xml" for parsing
+    and conversion)."""
+
+    # PDF rendering is limited separately
+    with process_slot(["xml2rfc", "--pdf"] if "pdf" in outputs else ["xml2rfc"]):
+        processed = submit(
+            process_document,
+            filename,
+            xml_file,
+            outputs,
+            warn_bare_unicode,
+            timeout=timeout,
+            logger=logger,
+        )
+
+    if processed:
+        version, results = processed
+        source = xml_file if version == "2" else filename
+        args = {"xml": get_args(filename, xml_file, "v2v3")}
+        for format, output in outputs.items():
+            args[format] = get_args(source, output, format, warn_bare_unicode)
+
+        return (
+            version,
+            {
+                stage: get_result(args[stage], status)
+                for stage, status in results.items()
+            },
+        )
+    else:
+        return run_pipeline_cli(
+            filename, xml_file, outputs, warn_bare_unicode, timeout, logger
+        )
+
+
+def run_pipeline_cli(
+    filename,
+    xml_file,
+    outputs,
+    warn_bare_unicode=False,
+    timeout=TIMEOUT,
+    logger=getLogger(),
+):
+    """run_pipeline() using xml2rfc command line tool"""
+
+    args = get_args(filename, xml_file, "v2v3")
+
+    try:
+        parser = xml2rfc.XmlRfcParser(filename, quiet=True)
+        xmltree = parser.parse(remove_comments=False, quiet=True)
+        version = xmltree.getroot().get("version", "2")
+    except (XmlRfcError, XMLSyntaxError, OSError) as e:
+        logger.info("xml2rfc error: {}".format(str(e)))
+        error = "Error: {}".format(str(e))
+        return (None, {"xml": get_result(args, (1, "", error))})
+
+    if version == "2":
+        results = {"xml": proc_run(args=args, timeout=timeout, capture_output=True)}
+        if results["xml"].returncode != 0:
+            return (version, results)
+        source = xml_file
+    else:
+        results = {"xml": get_result(args, (0, "", ""))}
+        source = filename
+
+    for format, output in outputs.items():
+        results[format] = proc_run(
+            args=get_args(source, output, format, warn_bare_unicode),
+            timeout=timeout,
+            capture_output=True,
+        )
+
+    return (version, results)
@@ -1,14 +1,21 @@
+from contextlib import contextmanager
+from hashlib import sha256
 from logging import getLogger
-from os import mkdir, path
+from os import mkdir, path, remove, stat
 from re import compile as re_compile
+from tempfile import gettempdir, TemporaryDirectory
+from urllib.parse import urlsplit
 from uuid import uuid4
 
 from decorator import decorator
 from flask import current_app, jsonify, request
-from requests import get
 from requests.exceptions import ConnectionError, Timeout
 from werkzeug.utils import secure_filename
 
+from at.utils.cache import DiskCache, LRUCache
+from at.utils.client import get
+from at.utils.settings import get_setting
+
 ALLOWED_EXTENSIONS = (
     "txt",
     "xml",
@@ -20,12 +27,25 @@ ALLOWED_EXTENSIONS_BY_PROCESS = {
     "svgcheck": ("svg",),
     "clean_svg_ids": ("xml",),
 }
+CHUNK_SIZE = 64 * 1024  # in bytes
+MAX_FILE_SIZE = 10 * 1024 * 1024  # in bytes
 DIR_MODE = 0o770
 DRAFT_NAME = re_compile(r"(-\d+)?(\..*)?$")
 DRAFT_NAME_WITH_REVISION = re_compile(r"\..*$")
+DOCUMENT_CACHE_DIR = path.join(gettempdir(), "cache", "documents")
+DOCUMENT_CACHE_SIZE = 512 * 1024 * 1024  # in bytes
+# published revisions never change
+IMMUTABLE_DOCUMENT = re_compile(r"^(draft-[a-z0-9-]+-\d{2}|rfc\d+)\.(txt|xml)$")
+IMMUTABLE_DOCUMENT_DOMAINS = ("ietf.org", "rfc-editor.org")
+# memory backed directory for files that are never exported
+WORKSPACE_DIR = "/dev/shm" if path.isdir("/dev/shm") else gettempdir()
 OK = 200
 BAD_REQUEST = 400
 
+document_cache = DiskCache(DOCUMENT_CACHE_DIR, DOCUMENT_CACHE_SIZE)
+# SHA-256 of saved files, so that they do not need to be read again
+path_hashes = LRUCache(maxsize=1024)
+
 
 # Exceptions
 class DownloadError(Exception):
@@ -34,6 +54,25 @@ class DownloadError(Exception):
     pass
 
 
+class FileSizeError(Exception):
+    """Error class for files larger than the maximum size"""
+
+    pass
+
+
+def get_max_file_size():
+    """Returns maximum file size of the current application"""
+    return get_setting("MAX_FILE_SIZE", MAX_FILE_SIZE)
+
+
+def get_document_cache():
+    """Returns document cache with the directory and size of the current
+    application"""
+    document_cache.directory = get_setting("DOCUMENT_CACHE_DIR", DOCUMENT_CACHE_DIR)
+    document_cache.maxsize = get_setting("DOCUMENT_CACHE_SIZE", DOCUMENT_CACHE_SIZE)
+    return document_cache
+
+
 def allowed_file(filename, process=None):
     """Return true if file extension in allowed list"""
 
@@ -66,13 +105,85 @@ def get_file(filename):
     return "/".join(filename.split("/")[-2:])
 
 
-def save_file(file, upload_dir):
-    """Save given file and returns path"""
+def get_file_hash(file):
+    """Returns SHA-256 hex digest of the given uploaded file"""
+    digest = sha256()
+
+    for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file.stream.seek(0)
+
+    return digest.hexdigest()
+
+
+def get_path_hash(filename):
+    """Returns SHA-256 hex digest of the file at the given path"""
+    file_stat = stat(filename)
+    version = (file_stat.st_size, file_stat.st_mtime_ns)
+    if (entry := path_hashes.get(filename)) and entry[0] == version:
+        return entry[1]
+
+    digest = sha256()
+
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    path_hashes.set(filename, (version, digest.hexdigest()))
+    return digest.hexdigest()
+
+
+def write_chunks(chunks, filename, max_size=None):
+    """Write chunks of bytes to the file, computing SHA-256 on the way.
+    Raises FileSizeError and removes the file if it gets larger than
+    max_size (MAX_FILE_SIZE by default).
+    Returns SHA-256 hex digest of the file."""
+    digest = sha256()
+    size = 0
+    max_size = max_size or get_max_file_size()
+
+    try:
+        with open(filename, "wb") as file:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > max_size:
+                    raise FileSizeError("File is larger than {} bytes".format(max_size))
+                digest.update(chunk)
+                file.write(chunk)
+    except FileSizeError:
+        remove(filename)
+        raise
+
+    file_stat = stat(filename)
+    version = (file_stat.st_size, file_stat.st_mtime_ns)
+    path_hashes.set(filename, (version, digest.hexdigest()))
+
+    return digest.hexdigest()
+
+
+@contextmanager
+def workspace(workspace_dir=None):
+    """Context manager that provides a temporary upload directory.
+    The directory and everything saved in it are removed on exit, also when
+    an exception is raised."""
+    workspace_dir = workspace_dir or get_setting("WORKSPACE_DIR", WORKSPACE_DIR)
+    with TemporaryDirectory(prefix="at-", dir=workspace_dir) as upload_dir:
+        yield upload_dir
+
+
+def save_file(file, upload_dir, max_size=None):
+    """Save given file and returns path
+    Raises FileSizeError if file is larger than max_size."""
     dir_path = path.join(upload_dir, str(uuid4()))
     mkdir(dir_path, mode=DIR_MODE)
 
     filename = path.join(dir_path, secure_filename(file.filename))
-    file.save(filename)
+    try:
+        write_chunks(
+            iter(lambda: file.stream.read(CHUNK_SIZE), b""), filename, max_size
+        )
+    finally:
+        file.stream.seek(0)
 
     return (dir_path, filename)
 
@@ -90,8 +201,29 @@ def save_file_from_text(text, upload_dir):
     return (dir_path, filename)
 
 
-def save_file_from_url(url, upload_dir, logger=getLogger()):
-    """Download and save the file from given URL and returns path"""
+def get_immutable_url(url):
+    """Returns canonical URL of published draft revision or RFC.
+    Returns None for other URLs."""
+    try:
+        url_parts = urlsplit(url)
+    except ValueError:
+        return None
+
+    host = (url_parts.hostname or "").lower()
+    domain = ".".join(host.split(".")[-2:])
+    if url_parts.scheme not in ("http", "https") or url_parts.query:
+        return None
+    if domain not in IMMUTABLE_DOCUMENT_DOMAINS:
+        return None
+    if not IMMUTABLE_DOCUMENT.match(url_parts.path.split("/")[-1]):
+        return None
+
+    return "https://{}{}".format(host, url_parts.path)
+
+
+def save_file_from_url(url, upload_dir, logger=getLogger(), max_size=None):
+    """Download and save the file from given URL and returns path
+    NOTE: published draft revisions and RFCs are served from the document cache"""
     dir_path = path.join(upload_dir, str(uuid4()))
     mkdir(dir_path, mode=DIR_MODE)
     save_filename = secure_filename(url.split("/")[-1])
@@ -100,20 +232,38 @@ def save_file_from_url(url, upload_dir, logger=getLogger()):
         logger.error(error)
         raise DownloadError(error)
     filename = path.join(dir_path, save_filename)
+    max_size = max_size or get_max_file_size()
+    document_cache = get_document_cache()
+
+    cache_key = get_immutable_url(url)
+    if cache_key and (cached := document_cache.open(cache_key)) is not None:
+        logger.debug("document cache hit: {}".format(cache_key))
+        with cached:
+            write_chunks(iter(lambda: cached.read(CHUNK_SIZE), b""), filename)
+        return (dir_path, filename)
 
     try:
-        with get(url) as response:
-            if response.status_code == OK:
-                with open(filename, "w") as file:
-                    file.write(response.text)
-            else:
+        with get(url, stream=True) as response:
+            if response.status_code != OK:
                 logger.error("Error downloading file: {}".format(url))
                 raise DownloadError("Error occured while downloading file.")
-
-        return (dir_path, filename)
+            if int(response.headers.get("Content-Length", 0)) > max_size:
+                raise FileSizeError("File is larger than {} bytes".format(max_size))
+            write_chunks(response.iter_content(CHUNK_SIZE), filename, max_size)
     except (ConnectionError, Timeout) as e:
         logger.error("Connection error on {url}: {error}".format(url=url, error=e))
         raise DownloadError("Error occured while downloading file.")
+    except FileSizeError as e:
+        logger.info("Download too large: {}: {}".format(url, str(e)))
+        raise DownloadError(str(e))
+
+    if cache_key and path.getsize(filename) > 0:
+        try:
+            document_cache.set_file(cache_key, filename)
+        except OSError as e:
+            logger.info("document cache error: {}".format(str(e)))
+
+    return (dir_path, filename)
 
 
 def get_name(filename):
@@ -15,6 +15,12 @@ class IddiffError(Exception):
     pass
 
 
+class DocumentError(Exception):
+    """Error class for errors getting documents to compare"""
+
+    pass
+
+
 def get_id_diff(
     old_draft,
     new_draft,
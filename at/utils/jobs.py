@@ -0,0 +1,443 @@
+from argparse import ArgumentParser
+from json import dumps, loads
+from logging import getLogger, basicConfig, INFO
+from os import path
+from signal import signal, SIGTERM
+from sqlite3 import connect, Row
+from threading import Event, Lock, Thread
+from time import time
+from uuid import uuid4
+
+from requests.exceptions import RequestException
+
+from at.utils.client import post
+from at.utils.settings import get_setting
+
+JOB_WORKERS = 2
+POLL_INTERVAL = 1  # in seconds
+LEASE_TIME = 60  # in seconds, running jobs without heartbeat get requeued
+HEARTBEAT_INTERVAL = LEASE_TIME / 4  # in seconds
+JOB_TTL = 24 * 60 * 60  # in seconds, finished jobs are kept
+CALLBACK_TIMEOUT = 10  # in seconds
+DB_TIMEOUT = 30  # in seconds
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    callback TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+# requeue running jobs with expired leases, then claim the oldest queued job
+CLAIM_SCRIPT = """
+local now = tonumber(ARGV[1])
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('RPUSH', KEYS[1], id)
+    redis.call('HSET', ARGV[3] .. id, 'status', 'queued', 'updated', now)
+end
+local id = redis.call('RPOP', KEYS[1])
+if not id then
+    return nil
+end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), id)
+redis.call('HSET', ARGV[3] .. id, 'status', 'running', 'updated', now)
+return id
+"""
+
+
+# Exceptions
+class JobError(Exception):
+    """Error class for job errors"""
+
+    pass
+
+
+def get_job_dict(row):
+    """Returns job dictionary for jobs table row"""
+    job = dict(row)
+    job["params"] = loads(job["params"])
+    job["result"] = loads(job["result"]) if job["result"] else None
+    return job
+
+
+class SQLiteJobStore:
+    """Job queue in a SQLite database, for a single replica
+    NOTE: do not use on network file systems"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    def get_connection(self):
+        """Returns SQLite connection to jobs database"""
+        connection = connect(self.db_file, timeout=DB_TIMEOUT, isolation_level=None)
+        connection.row_factory = Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def create(self, kind, params, callback=None):
+        """Add new job to the queue and return job id"""
+        job_id = uuid4().hex
+        now = time()
+
+        connection = self.get_connection()
+        try:
+            connection.execute(
+                "INSERT INTO jobs "
+                "(id, kind, status, params, callback, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, dumps(params), callback, now, now),
+            )
+        finally:
+            connection.close()
+
+        return job_id
+
+    def get(self, job_id):
+        """Returns job or None if job does not exist"""
+        connection = self.get_connection()
+        try:
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        finally:
+            connection.close()
+
+        return get_job_dict(row) if row else None
+
+    def claim(self, lease_time=LEASE_TIME):
+        """Mark oldest queued job as running and return it.
+        Running jobs without heartbeat within lease_time (for example
+        because the worker got restarted) get requeued first.
+        Returns None if the queue is empty."""
+
+        now = time()
+        connection = self.get_connection()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "UPDATE jobs SET status = ?, updated = ? "
+                "WHERE status = ? AND updated < ?",
+                (QUEUED, now, RUNNING, now - lease_time),
+            )
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created LIMIT 1",
+                (QUEUED,),
+            ).fetchone()
+            if row:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, updated = ? WHERE id = ?",
+                    (RUNNING, now, row["id"]),
+                )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+        if row:
+            job = get_job_dict(row)
+            job.update(status=RUNNING, updated=now)
+            return job
+        return None
+
+    def heartbeat(self, job_ids):
+        """Renew leases of running jobs"""
+        connection = self.get_connection()
+        try:
+            connection.executemany(
+                "UPDATE jobs SET updated = ? WHERE id = ? AND status = ?",
+                [(time(), job_id, RUNNING) for job_id in job_ids],
+            )
+        finally:
+            connection.close()
+
+    def finish(self, job_id, result=None, error=None):
+        """Save job result or error.
+        Finished jobs older than JOB_TTL are removed."""
+        now = time()
+        connection = self.get_connection()
+        try:
+            connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? "
+                "WHERE id = ?",
+                (
+                    FAILED if error else DONE,
+                    dumps(result) if result is not None else None,
+                    error,
+                    now,
+                    job_id,
+                ),
+            )
+            connection.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?",
+                (DONE, FAILED, now - JOB_TTL),
+            )
+        finally:
+            connection.close()
+
+    def stats(self):
+        """Returns number of jobs by status"""
+        connection = self.get_connection()
+        try:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"
+            ).fetchall()
+        finally:
+            connection.close()
+
+        stats = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+        stats.update({row["status"]: row["count"] for row in rows})
+        return stats
+
+
+class RedisJobStore:
+    """Job queue in Redis, shared by all replicas"""
+
+    def __init__(self, url, prefix="at:jobs:"):
+        try:
+            from redis import Redis
+        except ImportError:
+            raise JobError("redis is required for Redis job store")
+
+        self.client = Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.queue = prefix + "queue"
+        self.running = prefix + "running"
+        self.counters = prefix + "stats"
+        self._claim = self.client.register_script(CLAIM_SCRIPT)
+
+    def get_key(self, job_id):
+        """Returns key of the job hash"""
+        return "".join((self.prefix, "job:", job_id))
+
+    def create(self, kind, params, callback=None):
+        """Add new job to the queue and return job id"""
+        job_id = uuid4().hex
+        now = time()
+
+        with self.client.pipeline() as pipeline:
+            pipeline.hset(
+                self.get_key(job_id),
+                mapping={
+                    "id": job_id,
+                    "kind": kind,
+                    "status": QUEUED,
+                    "params": dumps(params),
+                    "callback": callback or "",
+                    "result": "",
+                    "error": "",
+                    "created": now,
+                    "updated": now,
+                },
+            )
+            pipeline.lpush(self.queue, job_id)
+            pipeline.execute()
+
+        return job_id
+
+    def get(self, job_id):
+        """Returns job or None if job does not exist"""
+        if not (job := self.client.hgetall(self.get_key(job_id))):
+            return None
+
+        return {
+            "id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "params": loads(job["params"]),
+            "callback": job["callback"] or None,
+            "result": loads(job["result"]) if job["result"] else None,
+            "error": job["error"] or None,
+            "created": float(job["created"]),
+            "updated": float(job["updated"]),
+        }
+
+    def claim(self, lease_time=LEASE_TIME):
+        """Mark oldest queued job as running and return it.
+        Running jobs without heartbeat within lease_time get requeued first.
+        Returns None if the queue is empty."""
+        job_id = self._claim(
+            keys=[self.queue, self.running],
+            args=[time(), lease_time, "".join((self.prefix, "job:"))],
+        )
+        return self.get(job_id) if job_id else None
+
+    def heartbeat(self, job_ids, lease_time=LEASE_TIME):
+        """Renew leases of running jobs"""
+        if job_ids:
+            lease = time() + lease_time
+            self.client.zadd(
+                self.running, {job_id: lease for job_id in job_ids}, xx=True
+            )
+
+    def finish(self, job_id, result=None, error=None):
+        """Save job result or error"""
+        status = FAILED if error else DONE
+
+        with self.client.pipeline() as pipeline:
+            pipeline.zrem(self.running, job_id)
+            pipeline.hset(
+                self.get_key(job_id),
+                mapping={
+                    "status": status,
+                    "result": dumps(result) if result is not None else "",
+                    "error": error or "",
+                    "updated": time(),
+                },
+            )
+            pipeline.expire(self.get_key(job_id), JOB_TTL)
+            pipeline.hincrby(self.counters, status, 1)
+            pipeline.execute()
+
+    def stats(self):
+        """Returns number of jobs by status"""
+        counters = self.client.hgetall(self.counters)
+        return {
+            QUEUED: self.client.llen(self.queue),
+            RUNNING: self.client.zcard(self.running),
+            DONE: int(counters.get(DONE, 0)),
+            FAILED: int(counters.get(FAILED, 0)),
+        }
+
+
+def get_job_store(location, upload_dir):
+    """Returns job store for the location: redis:// or rediss:// URL or path
+    of SQLite database. SQLite database in the upload directory is used if
+    location is not set."""
+    if location and location.startswith(("redis://", "rediss://")):
+        return RedisJobStore(location)
+    return SQLiteJobStore(location or path.join(upload_dir, "jobs.db"))
+
+
+def notify(job, logger=getLogger()):
+    """Send job status to job callback URL"""
+    payload = {"id": job["id"], "status": job["status"], "error": job["error"]}
+
+    try:
+        with post(job["callback"], json=payload, timeout=CALLBACK_TIMEOUT) as response:
+            response.raise_for_status()
+    except RequestException as e:
+        logger.info("job {} callback error: {}".format(job["id"], str(e)))
+
+
+class JobRunner:
+    """Bounded pool of threads running queued jobs.
+    Leases of running jobs are renewed by a heartbeat thread, so that jobs
+    are requeued only if the runner holding them is gone."""
+
+    def __init__(self, store, handlers, workers=None, logger=getLogger()):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers or get_setting("JOB_WORKERS", JOB_WORKERS)
+        self.logger = logger
+        self._threads = []
+        self._running = set()
+        self._lock = Lock()
+        self._stopped = Event()
+
+    def start(self):
+        """Start worker and heartbeat threads, if not already started"""
+        with self._lock:
+            if not self._threads:
+                for _ in range(self.workers):
+                    thread = Thread(target=self.run, daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+                thread = Thread(target=self.heartbeat, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Stop worker threads after running jobs have finished"""
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+
+    def heartbeat(self):
+        """Heartbeat loop, renews leases of running jobs"""
+        while not self._stopped.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                job_ids = list(self._running)
+
+            try:
+                self.store.heartbeat(job_ids)
+            except Exception as e:  # pragma: no cover
+                self.logger.error("job heartbeat error: {}".format(str(e)))
+
+    def run(self):
+        """Worker loop"""
+        while not self._stopped.is_set():
+            try:
+                job = self.store.claim()
+            except Exception as e:  # pragma: no cover
+                self.logger.error("job queue error: {}".format(str(e)))
+                job = None
+
+            if job:
+                with self._lock:
+                    self._running.add(job["id"])
+                try:
+                    self.process(job)
+                finally:
+                    with self._lock:
+                        self._running.discard(job["id"])
+            else:
+                self._stopped.wait(POLL_INTERVAL)
+
+    def process(self, job):
+        """Run job handler and save the result"""
+        self.logger.info("running job {} ({})".format(job["id"], job["kind"]))
+        result, error = None, None
+
+        try:
+            if job["kind"] not in self.handlers:
+                raise JobError("Unknown job: {}".format(job["kind"]))
+            result = self.handlers[job["kind"]](job["params"], logger=self.logger)
+        except JobError as e:
+            error = str(e)
+        except Exception as e:
+            self.logger.error("job {} error: {}".format(job["id"], str(e)))
+            error = "Error running job"
+
+        self.store.finish(job["id"], result=result, error=error)
+
+        if job["callback"]:
+            notify(self.store.get(job["id"]), logger=self.logger)
+
+
+def main(args=None):
+    """Command line interface, runs the job runner of the application"""
+    from at import create_app
+    from at.api import start_job_runner
+
+    parser = ArgumentParser(description="Run queued jobs")
+    parser.parse_args(args)
+    basicConfig(level=INFO)
+
+    app = create_app()
+    start_job_runner(app)
+    stopped = Event()
+    signal(SIGTERM, lambda *_: stopped.set())
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    # let running jobs finish
+    app.extensions["jobs"].stop()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,142 @@
+from base64 import b64decode
+from json import dumps, loads
+from logging import getLogger
+from os import getcwd, path
+from socket import socket, AF_UNIX, SOCK_STREAM
+from subprocess import CompletedProcess, DEVNULL, Popen
+from threading import Lock
+from time import monotonic, sleep
+
+from at.utils.runner import process_slot, proc_run, RunnerError, TIMEOUT
+from at.utils.settings import get_setting
+
+SERVER = path.join(path.dirname(path.abspath(__file__)), "kramdown_server.rb")
+SOCKET = "/tmp/kramdown-rfc.sock"
+ENABLED = True
+TOOLS = ("kramdown-rfc", "kramdown-rfc-clean-svg-ids")
+PING_TIMEOUT = 1  # in seconds
+START_TIMEOUT = 10  # in seconds
+
+_server = None
+_server_lock = Lock()
+
+
+# Exceptions
+class KramdownServerError(Exception):
+    """Error class for kramdown-rfc server errors"""
+
+    pass
+
+
+def get_socket():
+    """Returns kramdown-rfc server socket of the current application"""
+    return get_setting("KRAMDOWN_SERVER_SOCKET", SOCKET)
+
+
+def send_request(request, timeout):
+    """Send request to kramdown-rfc server and return the response"""
+    with socket(AF_UNIX, SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(get_socket())
+        client.sendall(dumps(request).encode("utf-8") + b"\n")
+        with client.makefile("rb") as response:
+            line = response.readline()
+
+    if not line:
+        raise KramdownServerError("No response from kramdown-rfc server")
+
+    return loads(line)
+
+
+def ping():
+    """Returns True if kramdown-rfc server is up"""
+    try:
+        return send_request({"ping": True}, PING_TIMEOUT).get("pong", False)
+    except (OSError, ValueError, KramdownServerError):
+        return False
+
+
+def start_server(logger=getLogger()):
+    """Start kramdown-rfc server, unless it is already running.
+    Returns True if server is up."""
+    global _server
+
+    with _server_lock:
+        if ping():
+            return True
+
+        if _server is None or _server.poll() is not None:
+            logger.info("starting kramdown-rfc server")
+            try:
+                _server = Popen(
+                    ["ruby", SERVER, get_socket()],
+                    stdin=DEVNULL,
+                    start_new_session=True,
+                )
+            except OSError as e:
+                logger.info(f"kramdown-rfc server error: {str(e)}")
+                return False
+
+        deadline = monotonic() + START_TIMEOUT
+        while monotonic() < deadline and _server.poll() is None:
+            if ping():
+                return True
+            sleep(0.1)
+
+        # server exits if another process has started the server
+        return ping()
+
+
+def stop_server():
+    """Stop kramdown-rfc server started by this process"""
+    global _server
+
+    with _server_lock:
+        if _server is not None and _server.poll() is None:
+            _server.terminate()
+            _server.wait()
+        _server = None
+
+
+def run_kramdown(args, timeout=TIMEOUT, logger=getLogger()):
+    """Returns subprocess.CompletedProcess like output of kramdown-rfc tool.
+    Uses kramdown-rfc server within a process slot, falls back to running
+    the tool if the server is not available."""
+
+    if get_setting("KRAMDOWN_SERVER", ENABLED) and args[0] in TOOLS:
+        request = {
+            "tool": args[0],
+            "args": args[1:],
+            "cwd": getcwd(),
+            "timeout": timeout,
+        }
+
+        with process_slot(args):
+            for attempt in range(2):
+                try:
+                    response = send_request(request, timeout + PING_TIMEOUT)
+                except TimeoutError:
+                    logger.info("kramdown-rfc server timed out")
+                    raise RunnerError(f"Error running {args[0]}.")
+                except (OSError, ValueError, KramdownServerError) as e:
+                    logger.info(f"kramdown-rfc server error: {str(e)}")
+                    if attempt == 0 and start_server(logger):
+                        continue
+                    break
+
+                if "error" in response:
+                    logger.info(f"kramdown-rfc server error: {response['error']}")
+                    break
+                if response["timeout"]:
+                    raise RunnerError(f"Error running {args[0]}.")
+
+                return CompletedProcess(
+                    args=args,
+                    returncode=response["returncode"],
+                    stdout=b64decode(response["stdout"]),
+                    stderr=b64decode(response["stderr"]),
+                )
+
+        logger.debug(f"falling back to {args[0]} command line tool")
+
+    return proc_run(args=args, timeout=timeout, capture_output=True)
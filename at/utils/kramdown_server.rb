@@ -0,0 +1,124 @@
+# kramdown-rfc conversion server
+#
+# Loads kramdown-rfc once and forks a child for each request, so conversions
+# do not pay for Ruby VM start up and gem loading.
+#
+# Usage: ruby kramdown_server.rb [socket path]
+#
+# Protocol: one JSON document per line over a Unix socket.
+#   {"ping": true}
+#     => {"pong": true, "pid": <server pid>}
+#   {"tool": "kramdown-rfc", "args": [...], "cwd": "...", "timeout": 120}
+#     => {"returncode": <exit code>, "stdout": "<base64>",
+#         "stderr": "<base64>", "timeout": false}
+
+require 'base64'
+require 'json'
+require 'socket'
+require 'tempfile'
+
+# preload libraries used by kramdown-rfc tools
+%w[kramdown-rfc2629 rexml/document yaml open3 net/http].each do |library|
+  begin
+    require library
+  rescue LoadError => e
+    warn "kramdown-rfc server: #{library} not preloaded: #{e.message}"
+  end
+end
+
+TOOLS = %w[kramdown-rfc kramdown-rfc-clean-svg-ids].freeze
+TIMEOUT = 120 # in seconds
+SOCKET = ARGV[0] || ENV['KRAMDOWN_SERVER_SOCKET'] || '/tmp/kramdown-rfc.sock'
+
+def tool_path(tool)
+  Gem.bin_path('kramdown-rfc', tool)
+rescue Gem::Exception
+  # fall back to executable in PATH
+  ENV['PATH'].split(File::PATH_SEPARATOR)
+             .map { |dir| File.join(dir, tool) }
+             .find { |path| File.file?(path) && File.executable?(path) }
+end
+
+def run_tool(request)
+  tool = request['tool']
+  path = TOOLS.include?(tool) ? tool_path(tool) : nil
+  unless path
+    return { 'returncode' => 127, 'stdout' => '', 'timeout' => false,
+             'stderr' => Base64.strict_encode64("#{tool}: tool not available\n") }
+  end
+
+  stdout = Tempfile.new('kramdown-rfc-stdout')
+  stderr = Tempfile.new('kramdown-rfc-stderr')
+
+  begin
+    pid = fork do
+      $stdin.reopen(File::NULL)
+      $stdout.reopen(stdout.path, 'wb')
+      $stderr.reopen(stderr.path, 'wb')
+      Dir.chdir(request['cwd']) if request['cwd']
+      $0 = path
+      ARGV.replace(request['args'] || [])
+      load path
+    end
+
+    waiter = Process.detach(pid)
+    timed_out = waiter.join(request['timeout'] || TIMEOUT).nil?
+    if timed_out
+      Process.kill('KILL', pid)
+      waiter.join
+    end
+    status = waiter.value
+
+    {
+      'returncode' => status.exitstatus || -status.termsig,
+      'stdout' => Base64.strict_encode64(File.binread(stdout.path)),
+      'stderr' => Base64.strict_encode64(File.binread(stderr.path)),
+      'timeout' => timed_out
+    }
+  ensure
+    stdout.close!
+    stderr.close!
+  end
+end
+
+def handle(client)
+  request = JSON.parse(client.gets || '{}')
+  response = if request['ping']
+               { 'pong' => true, 'pid' => Process.pid }
+             else
+               run_tool(request)
+             end
+  client.write("#{JSON.generate(response)}\n")
+rescue StandardError => e
+  begin
+    client.write("#{JSON.generate('error' => e.message)}\n")
+  rescue StandardError
+    nil
+  end
+ensure
+  client.close
+end
+
+if File.exist?(SOCKET)
+  begin
+    UNIXSocket.new(SOCKET).close
+    warn "kramdown-rfc server: already running at #{SOCKET}"
+    exit 0
+  rescue Errno::ECONNREFUSED, Errno::ENOENT
+    # stale socket
+    File.unlink(SOCKET) if File.exist?(SOCKET)
+  end
+end
+
+server = UNIXServer.new(SOCKET)
+File.chmod(0o600, SOCKET)
+server_pid = Process.pid
+at_exit { File.unlink(SOCKET) if Process.pid == server_pid && File.exist?(SOCKET) }
+trap('TERM') { exit }
+trap('INT') { exit }
+
+warn "kramdown-rfc server: listening at #{SOCKET}"
+
+loop do
+  Thread.new(server.accept) { |client| handle(client) }
+end
@@ -1,10 +1,31 @@
+from contextvars import copy_context
 from logging import getLogger
+from re import compile as re_compile
+from threading import Lock, Thread
+from time import monotonic
 from urllib.parse import urlsplit
 
-from requests import get
+from requests.exceptions import HTTPError, RequestException
+
+from at.utils.cache import LRUCache
+from at.utils.client import get
+from at.utils.settings import get_setting
 
 OK = 200
+NOT_FOUND = 404
 ALLOWED_SCHEMES = ["http", "https"]
+METADATA_CACHE_SIZE = 4096
+LATEST_TTL = 5 * 60  # in seconds
+IMMUTABLE_TTL = 24 * 60 * 60  # in seconds
+NOT_FOUND_TTL = 60  # in seconds
+STALE_TTL = 60 * 60  # in seconds
+# revisions and RFCs, previous document of these never changes
+IMMUTABLE_DOCUMENT = re_compile(r"^(.*-\d{2}|rfc\d+)$")
+
+metadata_cache = LRUCache(maxsize=METADATA_CACHE_SIZE)
+_stale = {"served": 0, "refreshes": 0}
+_refreshing = set()
+_refresh_lock = Lock()
 
 
 # Exceptions
@@ -14,6 +35,12 @@ class DocumentNotFound(Exception):
     pass
 
 
+class DatatrackerUnavailable(DocumentNotFound):
+    """Error class for Datatracker not reachable error"""
+
+    pass
+
+
 class InvalidURL(Exception):
     """Error class for invalid URLs"""
 
@@ -38,73 +65,177 @@ def is_valid_url(url, allowed_domains=None, logger=getLogger()):
     return True
 
 
-def get_latest(doc, dt_latest_url, logger=getLogger()):
-    """Returns URL latest ID/RFC from Datatracker."""
+def get_ttl(doc, data):
+    """Returns time to live of Datatracker metadata of the document"""
+    if data is None:
+        return get_setting("METADATA_NOT_FOUND_TTL", NOT_FOUND_TTL)
+    if IMMUTABLE_DOCUMENT.match(doc.lower()):
+        return get_setting("METADATA_IMMUTABLE_TTL", IMMUTABLE_TTL)
+    return get_setting("METADATA_LATEST_TTL", LATEST_TTL)
+
+
+def get_metadata_cache():
+    """Returns Datatracker metadata cache with the size of the current
+    application"""
+    metadata_cache.maxsize = get_setting("METADATA_CACHE_SIZE", METADATA_CACHE_SIZE)
+    return metadata_cache
+
+
+def fetch_metadata(doc, dt_latest_url):
+    """Fetch Datatracker metadata of the document and add it to the cache.
+    Returns None if the document is not found.
+    Raises HTTPError on other errors, those are not cached."""
 
     url = "/".join([dt_latest_url, doc])
     with get(url) as response:
         if response.status_code == OK:
-            try:
-                data = response.json()
-                latest_doc = data["content_url"]
-            except KeyError:
-                logger.error("can not find content_url for {}".format(url))
-                raise DocumentNotFound(
-                    "Can not find url for the latest document on " "datatracker"
-                )
+            data = response.json()
+        elif response.status_code == NOT_FOUND:
+            data = None
         else:
-            logger.error("can not find doc for {}".format(url))
-            raise DocumentNotFound("Can not find the latest document on datatracker")
+            raise HTTPError(
+                "Datatracker error: {}".format(response.status_code),
+                response=response,
+            )
+
+    get_metadata_cache().set(url, (data, monotonic() + get_ttl(doc, data)))
+    return data
+
+
+def refresh_metadata(doc, dt_latest_url, logger=getLogger()):
+    """Refresh cached metadata of the document in the background"""
+    url = "/".join([dt_latest_url, doc])
+
+    with _refresh_lock:
+        if url in _refreshing:
+            return
+        _refreshing.add(url)
+        _stale["refreshes"] += 1
+
+    def refresh():
+        try:
+            fetch_metadata(doc, dt_latest_url)
+        except (RequestException, ValueError) as e:  # cached entry is kept
+            logger.info("can not refresh {}: {}".format(url, str(e)))
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(url)
+
+    Thread(target=copy_context().run, args=(refresh,), daemon=True).start()
 
-        return latest_doc
+
+def get_metadata(doc, dt_latest_url, logger=getLogger()):
+    """Returns Datatracker metadata of the document, None if not found.
+    Expired entries are served for a while (STALE_TTL) while they get
+    refreshed in the background, and when Datatracker is not reachable or
+    fails.
+    Raises DatatrackerUnavailable when Datatracker is not reachable and the
+    document is not cached."""
+
+    url = "/".join([dt_latest_url, doc])
+    entry = get_metadata_cache().get(url)
+
+    if entry:
+        data, expires = entry
+        if monotonic() < expires:
+            return data
+        if monotonic() < expires + get_setting("METADATA_STALE_TTL", STALE_TTL):
+            with _refresh_lock:
+                _stale["served"] += 1
+            refresh_metadata(doc, dt_latest_url, logger)
+            return data
+
+    try:
+        return fetch_metadata(doc, dt_latest_url)
+    except RequestException as e:
+        if entry:
+            logger.info("serving stale metadata for {}: {}".format(url, str(e)))
+            with _refresh_lock:
+                _stale["served"] += 1
+            return entry[0]
+        if isinstance(e, HTTPError):
+            logger.info("can not get metadata for {}: {}".format(url, str(e)))
+            return None
+        logger.error("can not reach datatracker for {}: {}".format(url, str(e)))
+        raise DatatrackerUnavailable(
+            "Datatracker is not reachable, please try again later"
+        )
+
+
+def get_metadata_stats():
+    """Returns Datatracker metadata cache statistics"""
+    stats = get_metadata_cache().stats()
+    with _refresh_lock:
+        stats["stale_served"] = _stale["served"]
+        stats["refreshes"] = _stale["refreshes"]
+
+    return stats
+
+
+def get_latest(doc, dt_latest_url, logger=getLogger()):
+    """Returns URL latest ID/RFC from Datatracker."""
+
+    url = "/".join([dt_latest_url, doc])
+    data = get_metadata(doc, dt_latest_url, logger)
+    if data is not None:
+        try:
+            latest_doc = data["content_url"]
+        except KeyError:
+            logger.error("can not find content_url for {}".format(url))
+            raise DocumentNotFound(
+                "Can not find url for the latest document on " "datatracker"
+            )
+    else:
+        logger.error("can not find doc for {}".format(url))
+        raise DocumentNotFound("Can not find the latest document on datatracker")
+
+    return latest_doc
 
 
 def get_previous(doc, dt_latest_url, logger=getLogger()):
     """Returns previous ID/RFC from datatracker"""
     url = "/".join([dt_latest_url, doc])
-    with get(url) as response:
-        if response.status_code == OK:
-            try:
-                data = response.json()
-                previous_doc = data["previous"]
-            except KeyError:
-                logger.error("can not find content_url for {}".format(url))
-                raise DocumentNotFound(
-                    "Can not find url for the previous document on " "datatracker"
-                )
-        else:
-            logger.error("can not find doc for {}".format(url))
-            raise DocumentNotFound("Can not find the previous document on datatracker")
-
-        return get_latest(previous_doc, dt_latest_url, logger)
+    data = get_metadata(doc, dt_latest_url, logger)
+    if data is not None:
+        try:
+            previous_doc = data["previous"]
+        except KeyError:
+            logger.error("can not find content_url for {}".format(url))
+            raise DocumentNotFound(
+                "Can not find url for the previous document on " "datatracker"
+            )
+    else:
+        logger.error("can not find doc for {}".format(url))
+        raise DocumentNotFound("Can not find the previous document on datatracker")
+
+    return get_latest(previous_doc, dt_latest_url, logger)
 
 
 def get_both(doc, dt_latest_url, logger=getLogger()):
     """Returns urls of given doc  and previous ID/RFC from Datatracker."""
 
     url = "/".join([dt_latest_url, doc])
-    with get(url) as response:
-        if response.status_code == OK:
+    data = get_metadata(doc, dt_latest_url, logger)
+    if data is not None:
+        try:
+            latest_doc = data["content_url"]
             try:
-                data = response.json()
-                latest_doc = data["content_url"]
-                try:
-                    previous_doc = data["previous_url"]
-                except KeyError:
-                    logger.error("Can not find previous_url for {}".format(url))
-                    raise DocumentNotFound(
-                        "Can not find url for previous document on " "datatracker"
-                    )
+                previous_doc = data["previous_url"]
             except KeyError:
-                logger.error("can not find content_url for {}".format(url))
+                logger.error("Can not find previous_url for {}".format(url))
                 raise DocumentNotFound(
-                    "Can not find url for the latest document on " "datatracker"
+                    "Can not find url for previous document on " "datatracker"
                 )
-        else:
-            logger.error("can not find doc for {}".format(url))
-            raise DocumentNotFound("Can not find the latest document on datatracker")
-
-        return (previous_doc, latest_doc)
+        except KeyError:
+            logger.error("can not find content_url for {}".format(url))
+            raise DocumentNotFound(
+                "Can not find url for the latest document on " "datatracker"
+            )
+    else:
+        logger.error("can not find doc for {}".format(url))
+        raise DocumentNotFound("Can not find the latest document on datatracker")
+
+    return (previous_doc, latest_doc)
 
 
 def is_url(string):
@@ -1,14 +1,16 @@
 from logging import getLogger
 from subprocess import CalledProcessError
 
-from xml2rfc import XmlRfcParser
-from xml2rfc.parser import XmlRfcError
-from lxml.etree import XMLSyntaxError
-
-from at.utils.file import get_extension, get_filename, save_file
-from at.utils.logs import get_errors, process_xml2rfc_log
+from at.utils.engine import run_pipeline, run_xml2rfc_parallel
+from at.utils.file import cleanup_output, get_extension, get_filename, save_file
+from at.utils.kramdown import run_kramdown
+from at.utils.logs import get_errors, process_xml2rfc_log, update_logs
+from at.utils.refcache import prefetch_refcache
+from at.utils.references import prefetch_references
 from at.utils.runner import proc_run, RunnerError
 
+EXTENSIONS = {"html": "html", "pdf": "pdf", "text": "txt"}
+
 
 # Exceptions
 class ProcessingError(Exception):
@@ -25,6 +27,13 @@ def process_file(file, upload_dir, logger=getLogger()):
 
     logger.info("file saved at {}".format(filename))
 
+    return (dir_path, convert_file(filename, logger))
+
+
+def convert_file(filename, logger=getLogger()):
+    """Returns XML version of the given saved file.
+    NOTE: if file is an XML file, that file wouldn't go through conversion."""
+
     file_ext = get_extension(filename)
 
     if file_ext.lower() in [".md", ".mkd"]:
@@ -34,7 +43,7 @@ def process_file(file, upload_dir, logger=getLogger()):
     elif file_ext.lower() == ".rst":
         filename = rst2xml(filename, logger)
 
-    return (dir_path, filename)
+    return filename
 
 
 def md2xml(filename, logger=getLogger()):
@@ -52,9 +61,10 @@ def kramdown2xml(filename, logger=getLogger()):
     """Convert kramdown-rfc markdown file to XML"""
 
     logger.debug("processing kramdown-rfc file")
+    prefetch_refcache(filename, logger=logger)
 
     try:
-        output = proc_run(args=["kramdown-rfc", "--v3", filename], capture_output=True)
+        output = run_kramdown(args=["kramdown-rfc", "--v3", filename], logger=logger)
         output.check_returncode()
     except RunnerError as e:  # pragma: no cover
         logger.info(f"process error: {str(e)}")
@@ -147,138 +157,137 @@ def txt2xml(filename, logger=getLogger()):
     return xml_file
 
 
-def convert_v2v3(filename, logger=getLogger()):
-    """Convert XML2RFC v2 file to v3"""
-    logger.debug("converting v2 XML to v3 XML")
+def process_xml(filename, formats=(), warn_bare_unicode=False, logger=getLogger()):
+    """Parse XML once, convert XML2RFC v2 to v3 and render given formats
+    from the same document.
+    Returns XML2RFC v3 file name, v2 conversion logs and a dictionary of
+    output file name and xml2rfc output by format.
+    NOTE: failures of rendering formats are not raised"""
+
+    prefetch_references(filename, logger=logger)
+
+    logger.debug("running xml2rfc pipeline")
 
     xml_file = get_filename(filename, "xml")
+    outputs = {format: get_filename(filename, EXTENSIONS[format]) for format in formats}
 
     try:
-        output = proc_run(
-            args=["xml2rfc", "--v2v3", "--out", xml_file, filename], capture_output=True
+        version, results = run_pipeline(
+            filename,
+            xml_file,
+            outputs,
+            warn_bare_unicode=warn_bare_unicode,
+            logger=logger,
         )
-        output.check_returncode()
     except RunnerError as e:  # pragma: no cover
         logger.info(f"process error: {str(e)}")
         raise ProcessingError(str(e))
-    except CalledProcessError:
+
+    output = results["xml"]
+    if version is None:
+        # parser errors are reported in full, like xml2rfc parser would
+        errors = cleanup_output(filename, output.stderr.decode("utf-8").strip())
+        logger.info("xml2rfc error: {}".format(errors))
+        raise ProcessingError(errors or "xml parsing error")
+    elif output.returncode != 0:
         errors = get_errors(output, filename)
         if errors:
-            logger.info("xml2rfc v2v3 error: {}".format(errors))
+            logger.info("xml2rfc error: {}".format(errors))
         else:
             errors = "v2v3 conversion error"
-            logger.info("xml2rfc v2v3 error: no error output")
+            logger.info("xml2rfc error: no error output")
         raise ProcessingError(errors)
 
-    logs = process_xml2rfc_log(output, filename)
+    logs = None
+    if version == "2":
+        logs = process_xml2rfc_log(output, filename)
+        logger.info("new file saved at {}".format(xml_file))
+    else:
+        xml_file = filename
+
+    return (
+        xml_file,
+        logs,
+        {format: (outputs[format], results[format]) for format in formats},
+    )
+
+
+def get_rendered(filename, formats=(), parallel=False, logger=getLogger()):
+    """Convert/parse XML to XML2RFC v3 and render given formats
+    If parallel is set, formats get rendered concurrently from the converted
+    XML file.
+    Returns XML2RFC v3 file name, dictionary of rendered files by format
+    and logs"""
+
+    if parallel and len(formats) > 1:
+        xml_file, v2_logs, _ = process_xml(filename, logger=logger)
+        rendered_files = {
+            format: get_filename(xml_file, EXTENSIONS[format]) for format in formats
+        }
+        try:
+            results = run_xml2rfc_parallel(xml_file, rendered_files, logger=logger)
+        except RunnerError as e:  # pragma: no cover
+            logger.info(f"process error: {str(e)}")
+            raise ProcessingError(str(e))
+        outputs = {
+            format: (rendered_files[format], results[format]) for format in formats
+        }
+    else:
+        xml_file, v2_logs, outputs = process_xml(filename, formats, logger=logger)
 
-    logger.info("new file saved at {}".format(xml_file))
-    return (xml_file, logs)
+    logs = update_logs({"errors": [], "warnings": []}, v2_logs)
+    rendered = {}
+
+    for format, (rendered_file, output) in outputs.items():
+        try:
+            output.check_returncode()
+        except CalledProcessError:
+            errors = get_errors(output, filename)
+            if errors:
+                logger.info("xml2rfc {} error: {}".format(format, errors))
+            else:
+                errors = "{} generation error".format(format)
+                logger.info("xml2rfc {} error: no error output".format(format))
+            raise ProcessingError(errors)
+
+        logs = update_logs(logs, process_xml2rfc_log(output, filename))
+        rendered[format] = rendered_file
+        logger.info("new file saved at {}".format(rendered_file))
+
+    return (xml_file, rendered, logs)
 
 
 def get_xml(filename, logger=getLogger()):
     """Convert/parse XML to XML2RFC v3
     NOTE: if file is XML2RFC v2 that will get converted to v3"""
+    xml_file, logs, _ = process_xml(filename, logger=logger)
+    return (xml_file, logs)
 
-    logs = None
-
-    try:
-        logger.debug("invoking xml2rfc parser")
 
-        parser = XmlRfcParser(filename)
-        xmltree = parser.parse(remove_comments=False)
-        xmlroot = xmltree.getroot()
-        xml2rfc_version = xmlroot.get("version", "2")
+def convert_v2v3(filename, logger=getLogger()):
+    """Convert XML2RFC v2 file to v3"""
+    return get_xml(filename, logger)
 
-        if xml2rfc_version == "2":
-            filename, logs = convert_v2v3(filename, logger)
-    except (XmlRfcError, XMLSyntaxError) as e:
-        logger.info("xml2rfc error: {}".format(str(e)))
-        raise ProcessingError(e)
 
-    logger.info("new file saved at {}".format(filename))
-    return (filename, logs)
+def render(filename, format, logger=getLogger()):
+    """Render format, returns rendered file name and logs"""
+    _, rendered, logs = get_rendered(filename, [format], logger=logger)
+    return (rendered[format], logs)
 
 
 def get_html(filename, logger=getLogger()):
     """Render HTML"""
-    logger.debug("running xml2rfc html converter")
-
-    html_file = get_filename(filename, "html")
-
-    try:
-        output = proc_run(
-            args=["xml2rfc", "--html", "--out", html_file, filename],
-            capture_output=True,
-        )
-        output.check_returncode()
-    except RunnerError as e:  # pragma: no cover
-        logger.info(f"process error: {str(e)}")
-        raise ProcessingError(str(e))
-    except CalledProcessError:
-        errors = get_errors(output, filename)
-        if errors:
-            logger.info("xml2rfc html error: {}".format(errors))
-        else:
-            errors = "html generation error"
-            logger.info("xml2rfc html error: no error output")
-        raise ProcessingError(errors)
-
-    logger.info("new file saved at {}".format(html_file))
-    return (html_file, process_xml2rfc_log(output, filename))
+    return render(filename, "html", logger)
 
 
 def get_text(filename, logger=getLogger()):
-
-    text_file = get_filename(filename, "txt")
-
-    try:
-        output = proc_run(
-            args=["xml2rfc", "--text", "--out", text_file, filename],
-            capture_output=True,
-        )
-        output.check_returncode()
-    except RunnerError as e:  # pragma: no cover
-        logger.info(f"process error: {str(e)}")
-        raise ProcessingError(str(e))
-    except CalledProcessError:
-        errors = get_errors(output, filename)
-        if errors:
-            logger.info("xml2rfc text error: {}".format(errors))
-        else:
-            errors = "text generation error"
-            logger.info("xml2rfc text error: no error output")
-        raise ProcessingError(errors)
-
-    logger.info("new file saved at {}".format(text_file))
-    return (text_file, process_xml2rfc_log(output, filename))
+    """Render text"""
+    return render(filename, "text", logger)
 
 
 def get_pdf(filename, logger=getLogger()):
     """Render PDF"""
-    logger.debug("running xml2rfc pdf converter")
-
-    pdf_file = get_filename(filename, "pdf")
-
-    try:
-        output = proc_run(
-            args=["xml2rfc", "--pdf", "--out", pdf_file, filename], capture_output=True
-        )
-        output.check_returncode()
-    except RunnerError as e:  # pragma: no cover
-        logger.info(f"process error: {str(e)}")
-        raise ProcessingError(str(e))
-    except CalledProcessError:
-        errors = get_errors(output, filename)
-        if errors:
-            logger.info("xml2rfc pdf error: {}".format(errors))
-        else:
-            errors = "pdf generation error"
-            logger.info("xml2rfc pdf error: no error output")
-        raise ProcessingError(errors)
-
-    logger.info("new file saved at {}".format(pdf_file))
-    return (pdf_file, process_xml2rfc_log(output, filename))
+    return render(filename, "pdf", logger)
 
 
 def clean_svg_ids(filename, logger=getLogger()):
@@ -287,8 +296,8 @@ def clean_svg_ids(filename, logger=getLogger()):
 
     output = None
     try:
-        output = proc_run(
-            args=["kramdown-rfc-clean-svg-ids", filename], capture_output=True
+        output = run_kramdown(
+            args=["kramdown-rfc-clean-svg-ids", filename], logger=logger
         )
     except RunnerError as e:  # pragma: no cover
         logger.info(f"process error: {str(e)}")
@@ -0,0 +1,104 @@
+from hashlib import sha256
+from math import ceil
+from threading import Lock
+from time import monotonic
+
+from flask import current_app
+
+from at.utils.cache import LRUCache
+
+RATE_LIMIT = 0  # requests per second, per API key, 0 disables rate limits
+RATE_LIMIT_BURST = 60  # bucket size
+RATE_LIMIT_CLIENTS = 1024  # buckets kept
+CLIENT_ID_LENGTH = 16
+
+
+def get_client_id(apikey):
+    """Returns client identifier of the API key, so that keys are not kept in
+    memory or shown in metrics"""
+    return sha256(apikey.encode("utf-8")).hexdigest()[:CLIENT_ID_LENGTH]
+
+
+class RateLimiter:
+    """Token bucket per client. Buckets refill at rate tokens per second up
+    to burst tokens, every request takes one token.
+    NOTE: buckets are kept per worker process"""
+
+    def __init__(
+        self, rate=RATE_LIMIT, burst=RATE_LIMIT_BURST, maxsize=RATE_LIMIT_CLIENTS
+    ):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = LRUCache(maxsize=maxsize)  # (tokens, updated, stats)
+        self._lock = Lock()
+
+    def take(self, client, cost=1):
+        """Take tokens from the bucket of the client.
+        Returns None if the request is allowed, else seconds after which it
+        should be retried."""
+        now = monotonic()
+
+        with self._lock:
+            tokens, updated, stats = self._buckets.get(
+                client, (self.burst, now, {"allowed": 0, "throttled": 0})
+            )
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+            if tokens >= cost:
+                tokens -= cost
+                stats["allowed"] += 1
+                retry_after = None
+            else:
+                stats["throttled"] += 1
+                retry_after = max(ceil((cost - tokens) / self.rate), 1)
+
+            self._buckets.set(client, (tokens, now, stats))
+            return retry_after
+
+    def stats(self):
+        """Returns usage and throttle counters per client"""
+        now = monotonic()
+
+        with self._lock:
+            clients = {
+                client: dict(
+                    stats,
+                    tokens=round(
+                        min(self.burst, tokens + (now - updated) * self.rate), 4
+                    ),
+                )
+                for client, (tokens, updated, stats) in self._buckets.items()
+            }
+
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "allowed": sum(client["allowed"] for client in clients.values()),
+            "throttled": sum(client["throttled"] for client in clients.values()),
+            "clients": clients,
+        }
+
+
+def get_limiter():
+    """Returns rate limiter of the current application"""
+    if "rate_limiter" not in current_app.extensions:
+        current_app.extensions["rate_limiter"] = RateLimiter(
+            rate=float(current_app.config.get("RATE_LIMIT", RATE_LIMIT)),
+            burst=float(current_app.config.get("RATE_LIMIT_BURST", RATE_LIMIT_BURST)),
+        )
+    return current_app.extensions["rate_limiter"]
+
+
+def take(client):
+    """Take a token from the bucket of the client.
+    Returns None if the request is allowed, else seconds after which it
+    should be retried."""
+    limiter = get_limiter()
+    if limiter.rate <= 0:
+        return None
+    return limiter.take(client)
+
+
+def get_stats():
+    """Returns rate limit statistics"""
+    return get_limiter().stats()
@@ -0,0 +1,266 @@
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from fcntl import flock, LOCK_EX, LOCK_UN
+from logging import getLogger, basicConfig, INFO
+from os import makedirs, path, scandir, utime
+from re import compile as re_compile
+from tarfile import open as open_tarfile
+from threading import Lock
+from time import time
+
+from lxml import etree
+from requests.exceptions import RequestException
+
+from at.utils.bibxml import (
+    get_bibxml_dir,
+    get_reference_file,
+    is_valid_reference,
+    write_file,
+)
+from at.utils.client import get_session
+from at.utils.references import get_workers, TIMEOUT
+from at.utils.settings import get_env_settings, get_setting
+
+REFCACHE_TTL = 60 * 60 * 24 * 7  # in seconds
+BIBXML_URL = "https://bib.ietf.org/public/rfc/{}/{}"
+SERIES = {
+    "RFC": "bibxml",
+    "BCP": "bibxml-rfcsubseries",
+    "STD": "bibxml-rfcsubseries",
+    "FYI": "bibxml-rfcsubseries",
+}
+REFERENCE = re_compile(r"\b(RFC|BCP|STD|FYI)(\d{1,5})\b")
+
+_stats = {"hits": 0, "misses": 0, "fetched": 0, "failed": 0}
+_stats_lock = Lock()
+
+
+def get_entry_name(series, number):
+    """Returns kramdown-rfc cache file name for RFC series reference"""
+    return "reference.{}.{:04d}.xml".format(series, int(number))
+
+
+def get_entry_names(filename):
+    """Returns cache file names of RFC series references in kramdown-rfc file"""
+    with open(filename, encoding="utf-8", errors="ignore") as file:
+        text = file.read()
+
+    names = (get_entry_name(*match) for match in REFERENCE.findall(text))
+    return list(dict.fromkeys(names))
+
+
+def get_url(name):
+    """Returns BibXML URL for cache file name"""
+    return BIBXML_URL.format(SERIES[name.split(".")[1]], name)
+
+
+def is_fresh(filename, ttl=REFCACHE_TTL):
+    """Returns True if cache entry exists and has not expired"""
+    try:
+        return path.getmtime(filename) > time() - ttl
+    except OSError:
+        return False
+
+
+def get_refcache_dir():
+    """Returns reference cache directory of the current application"""
+    return get_setting("KRAMDOWN_REFCACHEDIR", None)
+
+
+def update_stats(**counts):
+    """Add counts to reference cache statistics"""
+    with _stats_lock:
+        for key, count in counts.items():
+            _stats[key] += count
+
+
+def get_stats(refcache_dir=None):
+    """Returns reference cache statistics"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else None
+    stats["entries"] = 0
+    if refcache_dir := refcache_dir or get_refcache_dir():
+        try:
+            stats["entries"] = sum(
+                1 for entry in scandir(refcache_dir) if entry.name.endswith(".xml")
+            )
+        except OSError:
+            pass
+
+    return stats
+
+
+def add_entry(refcache_dir, name, content):
+    """Write cache entry atomically, so readers never see partial files"""
+    filename = path.join(refcache_dir, name)
+    write_file(filename, content)
+    utime(filename)  # kramdown-rfc expires entries by mtime
+
+
+def fill_entry(session, refcache_dir, name, bibxml_dir, ttl=REFCACHE_TTL):
+    """Add reference to the cache from the BibXML mirror or the network.
+    Returns True if entry is in the cache."""
+
+    filename = path.join(refcache_dir, name)
+
+    # only one worker fills the entry, rest wait for it
+    with open(path.join(refcache_dir, "." + name + ".lock"), "w") as lock_file:
+        flock(lock_file, LOCK_EX)
+        try:
+            if is_fresh(filename, ttl):
+                return True
+
+            if reference_file := get_reference_file(name, bibxml_dir):
+                with open(reference_file, "rb") as file:
+                    add_entry(refcache_dir, name, file.read())
+                return True
+
+            with session.get(get_url(name), timeout=TIMEOUT) as response:
+                if response.status_code != 200:
+                    return False
+                content = response.content
+            if not is_valid_reference(etree.fromstring(content)):
+                return False
+            add_entry(refcache_dir, name, content)
+            return True
+        finally:
+            flock(lock_file, LOCK_UN)
+
+
+def prefetch_refcache(
+    filename,
+    refcache_dir=None,
+    workers=None,
+    bibxml_dir=None,
+    logger=getLogger(),
+):
+    """Add RFC series references of the kramdown-rfc file to the cache.
+    Directories default to ones of the current application.
+    Returns statistics of the prefetch."""
+
+    stats = {"references": 0, "hits": 0, "misses": 0, "fetched": 0, "failed": 0}
+    refcache_dir = refcache_dir or get_refcache_dir()
+    bibxml_dir = bibxml_dir or get_bibxml_dir()
+    ttl = get_setting("KRAMDOWN_REFCACHETTL", REFCACHE_TTL)
+    if workers is None:
+        workers = get_workers()
+
+    if not refcache_dir or workers < 1:
+        return stats
+
+    try:
+        names = get_entry_names(filename)
+        makedirs(refcache_dir, exist_ok=True)
+    except OSError as e:
+        logger.info("reference cache error: {}".format(str(e)))
+        return stats
+
+    stats["references"] = len(names)
+    names = [name for name in names if not is_fresh(path.join(refcache_dir, name), ttl)]
+    stats["misses"] = len(names)
+    stats["hits"] = stats["references"] - stats["misses"]
+
+    if names:
+        logger.debug("filling {} reference cache entries".format(len(names)))
+
+        session = get_session()
+
+        def fill(name):
+            try:
+                return fill_entry(session, refcache_dir, name, bibxml_dir, ttl)
+            except (RequestException, etree.XMLSyntaxError, OSError) as e:
+                logger.info("reference cache error: {}: {}".format(name, e))
+                return False
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for filled in executor.map(fill, names):
+                stats["fetched" if filled else "failed"] += 1
+
+    update_stats(**{key: value for key, value in stats.items() if key in _stats})
+
+    return stats
+
+
+def prewarm(snapshot, refcache_dir, logger=getLogger()):
+    """Add entries from snapshot tarball to the cache, unless the cache has
+    a fresh copy.
+    Returns number of entries added."""
+
+    makedirs(refcache_dir, exist_ok=True)
+    added = 0
+
+    with open_tarfile(snapshot) as tar:
+        for member in tar:
+            name = path.basename(member.name)
+            if not member.isfile() or not name.endswith(".xml"):
+                continue
+            if name.startswith(".") or is_fresh(path.join(refcache_dir, name)):
+                continue
+            add_entry(refcache_dir, name, tar.extractfile(member).read())
+            added += 1
+
+    logger.info("reference cache: prewarmed {} entries".format(added))
+    return added
+
+
+def create_snapshot(output, refcache_dir):
+    """Create snapshot tarball of cache entries.
+    Returns number of entries in the snapshot."""
+
+    count = 0
+    with open_tarfile(output, "w:gz") as tar:
+        for entry in scandir(refcache_dir):
+            if entry.is_file() and entry.name.endswith(".xml"):
+                if not entry.name.startswith("."):
+                    tar.add(entry.path, arcname=entry.name)
+                    count += 1
+
+    return count
+
+
+def main(args=None):
+    """Command line interface"""
+    settings = get_env_settings()
+    parser = ArgumentParser(description="Manage kramdown-rfc reference cache")
+    parser.add_argument(
+        "--dir", default=settings.get("KRAMDOWN_REFCACHEDIR"), help="cache directory"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("prewarm", help="prewarm from snapshot").add_argument(
+        "snapshot", nargs="?", default=settings.get("KRAMDOWN_REFCACHE_SNAPSHOT")
+    )
+    commands.add_parser("snapshot", help="create snapshot").add_argument("output")
+    commands.add_parser("status", help="show cache status")
+    options = parser.parse_args(args)
+
+    basicConfig(level=INFO, format="%(message)s")
+    logger = getLogger("refcache")
+
+    if not options.dir:
+        parser.error("KRAMDOWN_REFCACHEDIR or --dir is required")
+
+    try:
+        if options.command == "prewarm":
+            if not options.snapshot:
+                logger.info("reference cache: no snapshot to prewarm from")
+            elif not path.exists(options.snapshot):
+                logger.info("reference cache: {} not found".format(options.snapshot))
+            else:
+                prewarm(options.snapshot, options.dir, logger)
+        elif options.command == "snapshot":
+            count = create_snapshot(options.output, options.dir)
+            logger.info("reference cache: {} entries in snapshot".format(count))
+        else:
+            print(get_stats(options.dir))
+    except (OSError, ValueError) as e:
+        logger.error("reference cache: {}".format(str(e)))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
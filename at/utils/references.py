@@ -0,0 +1,182 @@
+from base64 import urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from logging import getLogger
+from os import access, makedirs, path, W_OK
+from time import time
+from urllib.parse import urlsplit
+
+import xml2rfc
+from lxml import etree
+from requests.exceptions import RequestException
+
+from at.utils.bibxml import (
+    BIBXML_DIR,
+    get_bibxml_dir,
+    get_reference_file,
+    is_valid_reference,
+    write_file,
+)
+from at.utils.client import get_session
+from at.utils.settings import get_setting
+
+WORKERS = 8  # 0 disables fetching
+TIMEOUT = 10  # in seconds
+CACHE_REFRESH = 60 * 60 * 24 * 14  # same as xml2rfc, 14 days
+XINCLUDE = "{http://www.w3.org/2001/XInclude}include"
+XML_BASE = "{http://www.w3.org/XML/1998/namespace}base"
+
+
+def get_workers():
+    """Returns number of prefetch workers of the current application"""
+    return get_setting("REFERENCE_PREFETCH_WORKERS", WORKERS)
+
+
+def get_cache_dir():
+    """Returns xml2rfc cache directory, the same one xml2rfc writes to"""
+    for cache_dir in (path.expanduser(cache) for cache in xml2rfc.CACHES):
+        if path.exists(cache_dir) and access(cache_dir, W_OK):
+            return cache_dir
+        try:
+            makedirs(cache_dir)
+            return cache_dir
+        except OSError:
+            pass
+
+    return None
+
+
+def get_cache_filename(cache_dir, url):
+    """Returns cache file path for the URL, using xml2rfc cache naming"""
+    _, _, url_path, query, _ = urlsplit(url)
+    root, ext = path.splitext(url_path)
+    if query:
+        root += "-" + urlsafe_b64encode(sha1(query.encode()).digest()).decode()
+
+    return path.join(cache_dir, xml2rfc.CACHE_PREFIX, path.basename(root + ext))
+
+
+def is_cached(cache_dir, url):
+    """Returns True if URL has a fresh copy in the cache"""
+    filename = get_cache_filename(cache_dir, url)
+
+    return path.exists(filename) and path.getmtime(filename) > time() - CACHE_REFRESH
+
+
+def get_reference_urls(filename):
+    """Returns network URLs of XInclude and external entity references"""
+    parser = etree.XMLParser(
+        resolve_entities=False, load_dtd=False, no_network=True, huge_tree=True
+    )
+    tree = etree.parse(filename, parser)
+    urls = [element.get("href") for element in tree.iter(XINCLUDE)]
+
+    if dtd := tree.docinfo.internalDTD:
+        urls.extend(entity.system_url for entity in dtd.iterentities())
+
+    urls = [
+        url if url.endswith(".xml") else url + ".xml"
+        for url in urls
+        if url and urlsplit(url).scheme in ("http", "https")
+    ]
+
+    return list(dict.fromkeys(urls))
+
+
+def fetch_reference(session, cache_dir, url):
+    """Fetch reference and add it to the cache.
+    Returns True on success."""
+
+    with session.get(url, timeout=TIMEOUT) as response:
+        if response.status_code != 200:
+            return False
+        xml = etree.fromstring(response.text.encode("utf-8"))
+        if not is_valid_reference(xml):
+            # leave it to xml2rfc to report
+            return False
+        xml.set(XML_BASE, response.url)
+
+    # write atomically, renderers may be reading the cache at the same time
+    write_file(
+        get_cache_filename(cache_dir, url), etree.tostring(xml, encoding="utf-8")
+    )
+
+    return True
+
+
+def copy_reference(cache_dir, url, bibxml_dir=BIBXML_DIR):
+    """Add reference from the local BibXML mirror to the cache.
+    Returns True on success."""
+
+    if (reference_file := get_reference_file(url, bibxml_dir)) is None:
+        return False
+
+    xml = etree.parse(reference_file).getroot()
+    xml.set(XML_BASE, url)
+    write_file(
+        get_cache_filename(cache_dir, url), etree.tostring(xml, encoding="utf-8")
+    )
+
+    return True
+
+
+def prefetch_references(
+    filename,
+    cache_dir=None,
+    workers=None,
+    bibxml_dir=None,
+    logger=getLogger(),
+):
+    """Add references of the XML file to the xml2rfc cache, so that xml2rfc
+    finds them in the cache. References are taken from the local BibXML mirror
+    when available, rest are fetched concurrently.
+    Returns prefetch statistics."""
+
+    stats = {"references": 0, "cached": 0, "mirrored": 0, "fetched": 0, "failed": 0}
+    cache_dir = cache_dir or get_cache_dir()
+    bibxml_dir = bibxml_dir or get_bibxml_dir()
+    if workers is None:
+        workers = get_workers()
+
+    if not cache_dir:
+        logger.info("reference prefetch: no cache directory")
+        return stats
+
+    try:
+        urls = get_reference_urls(filename)
+    except (etree.XMLSyntaxError, OSError) as e:
+        # xml2rfc reports parsing errors
+        logger.debug("reference prefetch: {}".format(str(e)))
+        return stats
+
+    stats["references"] = len(urls)
+    urls = [url for url in urls if not is_cached(cache_dir, url)]
+    stats["cached"] = stats["references"] - len(urls)
+
+    mirrored = []
+    for url in urls:
+        try:
+            if copy_reference(cache_dir, url, bibxml_dir):
+                mirrored.append(url)
+        except (etree.XMLSyntaxError, OSError) as e:
+            logger.info("reference mirror error: {}: {}".format(url, e))
+    urls = [url for url in urls if url not in mirrored]
+    stats["mirrored"] = len(mirrored)
+
+    if urls and workers > 0:
+        logger.debug("prefetching {} references".format(len(urls)))
+
+        session = get_session()
+
+        def fetch(url):
+            try:
+                return fetch_reference(session, cache_dir, url)
+            except (RequestException, etree.XMLSyntaxError, OSError) as e:
+                logger.info("reference prefetch error: {}: {}".format(url, e))
+                return False
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for fetched in executor.map(fetch, urls):
+                stats["fetched" if fetched else "failed"] += 1
+
+    return stats
@@ -0,0 +1,250 @@
+from argparse import ArgumentParser
+from json import dumps, loads
+from logging import getLogger, basicConfig, INFO
+from os import path, remove, replace, scandir, statvfs, utime
+from shutil import rmtree
+from tempfile import NamedTemporaryFile
+from time import sleep, time
+
+from at.utils.settings import get_env_settings
+from at.utils.storage import LocalStorage, get_storage
+
+INTERMEDIATE_TTL = 15 * 60  # in seconds
+EXPORT_TTL = 24 * 60 * 60  # in seconds
+MIN_AGE = 60  # in seconds, younger workspaces are never evicted
+MAX_DISK_USAGE = 0.8  # of space and inodes
+TARGET_DISK_USAGE = 0.6  # after eviction
+INTERVAL = 5 * 60  # in seconds
+IN_USE_TTL = 60 * 60  # in seconds, lease of workspaces of running requests
+EXPORTED = ".exported"
+IN_USE = ".in_use"
+STATUS = ".retention.json"
+
+
+def mark_exported(filename):
+    """Mark workspace of the file as exported"""
+    marker = path.join(path.dirname(filename), EXPORTED)
+    with open(marker, "a"):
+        utime(marker)
+
+
+def mark_in_use(filename, ttl=IN_USE_TTL):
+    """Mark workspace of the file in use for ttl seconds or until released"""
+    marker = path.join(path.dirname(filename), IN_USE)
+    with open(marker, "a"):
+        utime(marker, (time() + ttl, time() + ttl))
+
+
+def release(filename):
+    """Release workspace of the file marked in use"""
+    try:
+        remove(path.join(path.dirname(filename), IN_USE))
+    except FileNotFoundError:
+        pass
+
+
+def get_workspaces(directory):
+    """Returns list of (path, age, exported, in use) of workspaces, oldest
+    first"""
+    now = time()
+    workspaces = []
+
+    for entry in scandir(directory):
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            modified = entry.stat().st_mtime
+            try:
+                modified = max(modified, path.getmtime(path.join(entry.path, EXPORTED)))
+                exported = True
+            except OSError:
+                exported = False
+            try:
+                in_use = path.getmtime(path.join(entry.path, IN_USE)) > now
+            except OSError:
+                in_use = False
+        except OSError:
+            continue  # removed meanwhile
+        workspaces.append((entry.path, now - modified, exported, in_use))
+
+    return sorted(workspaces, key=lambda workspace: -workspace[1])
+
+
+def get_disk_usage(directory):
+    """Returns disk usage of the file system of the directory"""
+    stat = statvfs(directory)
+    total = stat.f_blocks * stat.f_frsize
+    free = stat.f_bavail * stat.f_frsize
+    used = total - stat.f_bfree * stat.f_frsize
+
+    return {
+        "total": total,
+        "used": used,
+        "free": free,
+        "usage": round(used / total, 4) if total else 0.0,
+        "inodes": stat.f_files,
+        "inodes_free": stat.f_favail,
+        "inodes_usage": (
+            round(1 - stat.f_ffree / stat.f_files, 4) if stat.f_files else 0.0
+        ),
+    }
+
+
+def is_under_pressure(disk_usage, limit=MAX_DISK_USAGE):
+    """Returns True if disk space or inode usage is over the limit"""
+    return disk_usage["usage"] > limit or disk_usage["inodes_usage"] > limit
+
+
+def collect(
+    directory,
+    intermediate_ttl=INTERMEDIATE_TTL,
+    export_ttl=EXPORT_TTL,
+    max_disk_usage=MAX_DISK_USAGE,
+    target_disk_usage=TARGET_DISK_USAGE,
+    all_exported=False,
+    logger=getLogger(),
+):
+    """Remove expired workspaces and, under disk pressure, evict oldest
+    workspaces first. Workspaces in use are kept.
+    Returns statistics of the collection."""
+
+    stats = {"removed": 0, "expired": 0, "evicted": 0, "in_use": 0, "workspaces": 0}
+    remaining = []
+
+    for workspace, age, exported, in_use in get_workspaces(directory):
+        exported = exported or all_exported
+        if in_use:
+            stats["in_use"] += 1
+        elif (not exported and age > intermediate_ttl) or age > export_ttl:
+            rmtree(workspace, ignore_errors=True)
+            stats["expired" if exported else "removed"] += 1
+        else:
+            remaining.append((workspace, age))
+
+    if is_under_pressure(get_disk_usage(directory), max_disk_usage):
+        for workspace, age in remaining:
+            if age < MIN_AGE or not is_under_pressure(
+                get_disk_usage(directory), target_disk_usage
+            ):
+                break
+            rmtree(workspace, ignore_errors=True)
+            stats["evicted"] += 1
+
+    stats["workspaces"] = len(remaining) - stats["evicted"] + stats["in_use"]
+    logger.info("retention: {}: {}".format(directory, stats))
+
+    return stats
+
+
+def write_status(directory, status):
+    """Save status of the last run for metrics"""
+    with NamedTemporaryFile("w", dir=directory, delete=False) as file:
+        file.write(dumps(status))
+    replace(file.name, path.join(directory, STATUS))
+
+
+def get_stats(directory):
+    """Returns disk usage and status of the last run"""
+    try:
+        stats = get_disk_usage(directory)
+    except OSError:
+        return {}
+
+    try:
+        with open(path.join(directory, STATUS)) as file:
+            stats["last_run"] = loads(file.read())
+    except (OSError, ValueError):
+        stats["last_run"] = None
+
+    return stats
+
+
+def run(directory, storage=None, logger=getLogger(), **limits):
+    """Collect upload directory and artifact storage directory once.
+    Artifact storage defaults to the upload directory.
+    limits are passed to collect()."""
+    status = {"time": time(), "uploads": collect(directory, logger=logger, **limits)}
+
+    artifacts = get_storage(storage, directory)
+    if isinstance(artifacts, LocalStorage) and artifacts.directory != path.abspath(
+        directory
+    ):
+        # everything in artifact storage is exported
+        status["artifacts"] = collect(
+            artifacts.directory, all_exported=True, logger=logger, **limits
+        )
+
+    write_status(directory, status)
+
+    return status
+
+
+def main(args=None):
+    """Command line interface"""
+    settings = get_env_settings()
+    parser = ArgumentParser(description="Manage upload directory retention")
+    parser.add_argument("--dir", required=True, help="upload directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="remove expired workspaces")
+    run_parser.add_argument(
+        "--interval",
+        type=int,
+        default=settings.get("RETENTION_INTERVAL", INTERVAL),
+        help="run every INTERVAL seconds, 0 runs once",
+    )
+    run_parser.add_argument(
+        "--intermediate-ttl",
+        type=int,
+        default=settings.get("INTERMEDIATE_TTL", INTERMEDIATE_TTL),
+        help="remove workspaces that were not exported after seconds",
+    )
+    run_parser.add_argument(
+        "--export-ttl",
+        type=int,
+        default=settings.get("EXPORT_TTL", EXPORT_TTL),
+        help="remove exported workspaces after seconds",
+    )
+    run_parser.add_argument(
+        "--max-disk-usage",
+        type=float,
+        default=settings.get("MAX_DISK_USAGE", MAX_DISK_USAGE),
+        help="evict workspaces when disk usage is over this",
+    )
+    run_parser.add_argument(
+        "--target-disk-usage",
+        type=float,
+        default=settings.get("TARGET_DISK_USAGE", TARGET_DISK_USAGE),
+        help="evict workspaces until disk usage is below this",
+    )
+    commands.add_parser("status", help="show disk usage")
+    options = parser.parse_args(args)
+
+    basicConfig(level=INFO, format="%(message)s")
+    logger = getLogger("retention")
+
+    if options.command == "status":
+        print(get_stats(options.dir))
+        return 0
+
+    while True:
+        try:
+            run(
+                options.dir,
+                storage=settings.get("ARTIFACT_STORAGE"),
+                logger=logger,
+                intermediate_ttl=options.intermediate_ttl,
+                export_ttl=options.export_ttl,
+                max_disk_usage=options.max_disk_usage,
+                target_disk_usage=options.target_disk_usage,
+            )
+        except OSError as e:
+            logger.error("retention: {}".format(str(e)))
+            if not options.interval:
+                return 1
+        if not options.interval:
+            return 0
+        sleep(options.interval)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
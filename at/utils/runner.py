@@ -1,6 +1,52 @@
-from subprocess import run
+from contextlib import contextmanager
+from contextvars import ContextVar
+from importlib.metadata import entry_points
+from itertools import count
+from logging import getLogger
+from multiprocessing import get_context
+from os import (
+    chdir,
+    close,
+    cpu_count,
+    dup2,
+    environ,
+    getcwd,
+    path,
+    remove,
+    sched_getaffinity,
+    _exit,
+)
+from subprocess import CompletedProcess, run
+from tempfile import mkstemp
+from threading import Condition, Lock
+from time import monotonic
+from traceback import print_exc
+import sys
+
+from at.utils.settings import get_setting
 
 TIMEOUT = 120  # in seconds
+FORK_SERVER = False  # not available in gunicorn eventlet workers
+FORK_SERVER_TOOLS = ("xml2rfc", "id2xml", "svgcheck", "iddiff")
+try:
+    CORES = len(sched_getaffinity(0))
+except (AttributeError, OSError):  # pragma: no cover
+    CORES = cpu_count() or 1
+MAX_PROCESSES = CORES  # all tools
+PDF_PROCESSES = 2
+TOOL_LIMITS = {"pdf": PDF_PROCESSES}  # others: MAX_PROCESSES
+# lower runs first, cheap tools should not wait behind PDF renders
+TOOL_PRIORITIES = {"aex": 0, "bap": 0, "echars": 0, "pdf": 2}
+DEFAULT_PRIORITY = 1
+# fair share cost of a process, clients running costly tools wait longer
+TOOL_COSTS = {"pdf": 4}
+DEFAULT_COST = 1
+QUEUE_TIMEOUT = TIMEOUT  # in seconds
+
+_context = None
+_context_lock = Lock()
+_fork_server = None  # availability, checked once
+_client = ContextVar("client", default=None)  # API key client identifier
 
 
 # Exception
@@ -10,9 +56,355 @@ class RunnerError(Exception):
     pass
 
 
-def proc_run(args, timeout=TIMEOUT, capture_output=True):
-    """Return subprocess.run()"""
+class ProcessLimiter:
+    """Limits number of concurrent processes per tool class and in total.
+    Waiting calls get a slot in priority order and, within the same
+    priority, in weighted fair queuing order between clients: every call
+    gets a virtual finish time of the client's previous call (or current
+    virtual time, if later) plus its cost, lowest finish time runs first.
+    Calls of the same client run in arrival order."""
+
+    def __init__(self, max_processes=MAX_PROCESSES, limits=TOOL_LIMITS):
+        self.max_processes = max_processes
+        self.limits = limits
+        self._running = {}
+        self._waiting = []  # (priority, finish, arrival, tool class, client)
+        self._arrivals = count()
+        self._virtual_time = 0.0
+        self._finish_times = {}  # last virtual finish time per client
+        self._stats = {}
+        self._client_stats = {}
+        self._condition = Condition()
+
+    def is_free(self, tool_class):
+        """Returns True if a process of the tool class can be started"""
+        return sum(self._running.values()) < self.max_processes and self._running.get(
+            tool_class, 0
+        ) < self.limits.get(tool_class, self.max_processes)
+
+    def is_next(self, entry):
+        """Returns True if no waiting call before entry can be started"""
+        return not any(
+            waiting < entry and self.is_free(waiting[3]) for waiting in self._waiting
+        )
+
+    def get_class_stats(self, tool_class):
+        """Returns statistics counters of the tool class"""
+        return self._stats.setdefault(
+            tool_class, {"started": 0, "timeouts": 0, "wait_time": 0.0}
+        )
+
+    def get_finish_time(self, client, cost):
+        """Returns virtual finish time of a new call of the client"""
+        start = max(self._virtual_time, self._finish_times.get(client, 0.0))
+        self._finish_times[client] = start + cost
+        return start + cost
+
+    def start(self, entry, cost):
+        """Advance virtual time to the start of the entry and forget clients
+        that have no calls after it"""
+        self._virtual_time = max(self._virtual_time, entry[1] - cost)
+        self._finish_times = {
+            client: finish
+            for client, finish in self._finish_times.items()
+            if finish > self._virtual_time
+        }
+
+    def acquire(
+        self,
+        tool_class,
+        priority=DEFAULT_PRIORITY,
+        timeout=QUEUE_TIMEOUT,
+        client=None,
+        cost=DEFAULT_COST,
+    ):
+        """Wait for a slot for the tool class.
+        Raises RunnerError if no slot becomes free within timeout."""
+        started = monotonic()
+        deadline = started + timeout
+
+        with self._condition:
+            entry = (
+                priority,
+                self.get_finish_time(client, cost),
+                next(self._arrivals),
+                tool_class,
+                client,
+            )
+            self._waiting.append(entry)
+            try:
+                while not (self.is_free(tool_class) and self.is_next(entry)):
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        self.get_class_stats(tool_class)["timeouts"] += 1
+                        raise RunnerError(f"Timed out waiting to run {tool_class}.")
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting.remove(entry)
+                self._condition.notify_all()
+
+            self.start(entry, cost)
+            self._running[tool_class] = self._running.get(tool_class, 0) + 1
+            class_stats = self.get_class_stats(tool_class)
+            class_stats["started"] += 1
+            class_stats["wait_time"] += monotonic() - started
+            if client is not None:
+                client_stats = self._client_stats.setdefault(
+                    client, {"started": 0, "cost": 0, "wait_time": 0.0}
+                )
+                client_stats["started"] += 1
+                client_stats["cost"] += cost
+                client_stats["wait_time"] += monotonic() - started
+
+    def release(self, tool_class):
+        """Release a slot of the tool class"""
+        with self._condition:
+            self._running[tool_class] -= 1
+            self._condition.notify_all()
+
+    def stats(self):
+        """Returns running and waiting processes and wait times per tool class"""
+        with self._condition:
+            stats = {}
+            for tool_class in set(self._stats) | set(self._running):
+                class_stats = dict(self.get_class_stats(tool_class))
+                class_stats["running"] = self._running.get(tool_class, 0)
+                class_stats["waiting"] = sum(
+                    1 for entry in self._waiting if entry[3] == tool_class
+                )
+                started = class_stats["started"]
+                class_stats["average_wait_time"] = (
+                    round(class_stats["wait_time"] / started, 4) if started else 0.0
+                )
+                class_stats["wait_time"] = round(class_stats["wait_time"], 4)
+                stats[tool_class] = class_stats
+
+            clients = {}
+            for client, client_stats in self._client_stats.items():
+                clients[client] = dict(
+                    client_stats,
+                    wait_time=round(client_stats["wait_time"], 4),
+                    waiting=sum(1 for entry in self._waiting if entry[4] == client),
+                )
+
+            return {
+                "max_processes": self.max_processes,
+                "running": sum(self._running.values()),
+                "waiting": len(self._waiting),
+                "tools": stats,
+                "clients": clients,
+            }
+
+
+limiter = ProcessLimiter()
+
+
+def get_max_processes():
+    """Returns maximum number of tool processes of the current application"""
+    return get_setting("MAX_PROCESSES", MAX_PROCESSES)
+
+
+def get_limiter():
+    """Returns process limiter with the limits of the current application"""
+    limiter.max_processes = get_max_processes()
+    limiter.limits = {"pdf": get_setting("PDF_PROCESSES", PDF_PROCESSES)}
+    return limiter
+
+
+def get_tool_class(args):
+    """Returns tool class of the command line for process limits"""
+    tool = path.basename(args[0])
+    if tool == "xml2rfc" and "--pdf" in args:
+        return "pdf"
+    return tool
+
+
+@contextmanager
+def client_context(client):
+    """Context manager that runs processes on behalf of the client"""
+    token = _client.set(client)
     try:
-        return run(args, timeout=timeout, capture_output=True)
-    except Exception:
-        raise RunnerError(f"Error running {args[0]}.")
+        yield
+    finally:
+        _client.reset(token)
+
+
+def get_client():
+    """Returns client identifier of the current context"""
+    return _client.get()
+
+
+@contextmanager
+def process_slot(args, timeout=QUEUE_TIMEOUT):
+    """Context manager that holds a process slot for the command line"""
+    tool_class = get_tool_class(args)
+    limiter = get_limiter()
+    limiter.acquire(
+        tool_class,
+        TOOL_PRIORITIES.get(tool_class, DEFAULT_PRIORITY),
+        timeout,
+        client=_client.get(),
+        cost=TOOL_COSTS.get(tool_class, DEFAULT_COST),
+    )
+    try:
+        yield
+    finally:
+        limiter.release(tool_class)
+
+
+def get_stats():
+    """Returns process limiter statistics"""
+    return limiter.stats()
+
+
+def get_entry_point(tool):
+    """Returns console script entry point of the tool or None"""
+    for entry_point in entry_points(group="console_scripts", name=tool):
+        return entry_point
+
+    return None
+
+
+def get_fork_context():
+    """Returns multiprocessing fork server context
+    NOTE: fork server imports Python tools once, jobs get forked from it"""
+    global _context
+
+    with _context_lock:
+        if _context is None:
+            _context = get_context("forkserver")
+            modules = ["at.utils.runner"]
+            for tool in FORK_SERVER_TOOLS:
+                if entry_point := get_entry_point(tool):
+                    modules.append(entry_point.module)
+            _context.set_forkserver_preload(modules)
+
+    return _context
+
+
+def is_monkey_patched():
+    """Returns True if the process is eventlet monkey patched"""
+    try:
+        from eventlet.patcher import is_monkey_patched
+    except ImportError:  # pragma: no cover
+        return False
+
+    return is_monkey_patched("socket")
+
+
+def check_fork_server(logger=getLogger()):
+    """Returns True if the fork server is enabled and can be used.
+    Checked once, the result is logged.
+    NOTE: not available in eventlet monkey patched processes (gunicorn
+    eventlet workers), those can not pass file descriptors to it"""
+    global _fork_server
+
+    if _fork_server is None:
+        if not get_setting("FORK_SERVER", FORK_SERVER):
+            _fork_server = False
+            logger.info("fork server is disabled")
+        elif is_monkey_patched():
+            _fork_server = False
+            logger.info("fork server is not available in eventlet workers")
+        else:
+            try:
+                get_fork_context()
+                _fork_server = True
+                logger.info("fork server is available")
+            except ValueError as e:
+                _fork_server = False
+                logger.info("fork server is not available: {}".format(str(e)))
+
+    return _fork_server
+
+
+def run_tool(tool, args, cwd, env, stdout, stderr):
+    """Run Python tool entry point like the command line tool would.
+    NOTE: runs in a process forked from the fork server"""
+
+    # redirect standard output and error to given files
+    with open(stdout, "wb") as stdout_file, open(stderr, "wb") as stderr_file:
+        dup2(stdout_file.fileno(), 1)
+        dup2(stderr_file.fileno(), 2)
+
+    try:
+        chdir(cwd)
+        environ.clear()
+        environ.update(env)
+        sys.argv = args
+        result = get_entry_point(tool).load()()
+        returncode = result if isinstance(result, int) else 0
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            returncode = 1
+    except BaseException:
+        print_exc()
+        returncode = 1
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    _exit(returncode)
+
+
+def read_output(filename):
+    """Returns contents of the output file"""
+    with open(filename, "rb") as file:
+        return file.read()
+
+
+def fork_run(args, timeout=TIMEOUT):
+    """Run Python tool in a process forked from the fork server.
+    Returns subprocess.CompletedProcess in the same way subprocess.run() would."""
+
+    if get_entry_point(args[0]) is None:
+        raise FileNotFoundError(f"{args[0]} is not available.")
+
+    outputs = []
+    try:
+        for _ in range(2):
+            fd, filename = mkstemp(prefix="at-runner-")
+            close(fd)
+            outputs.append(filename)
+
+        process = get_fork_context().Process(
+            target=run_tool,
+            args=(args[0], list(args), getcwd(), dict(environ), *outputs),
+        )
+        process.start()
+        process.join(timeout)
+
+        if process.exitcode is None:
+            process.kill()
+            process.join()
+            raise RunnerError(f"Error running {args[0]}.")
+
+        stdout, stderr = (read_output(output) for output in outputs)
+    finally:
+        for output in outputs:
+            remove(output)
+
+    return CompletedProcess(
+        args=args, returncode=process.exitcode, stdout=stdout, stderr=stderr
+    )
+
+
+def proc_run(args, timeout=TIMEOUT, capture_output=True, logger=getLogger()):
+    """Return subprocess.run()
+    NOTE: Python tools get forked from the fork server when it's available.
+    Processes wait for a slot when too many of them are running."""
+    with process_slot(args):
+        if args[0] in FORK_SERVER_TOOLS and check_fork_server(logger):
+            try:
+                return fork_run(args, timeout=timeout)
+            except (OSError, EOFError) as e:
+                logger.info("fork server error: {}".format(str(e)))
+
+        try:
+            return run(args, timeout=timeout, capture_output=True)
+        except Exception:
+            raise RunnerError(f"Error running {args[0]}.")
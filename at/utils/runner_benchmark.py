@@ -0,0 +1,40 @@
+from subprocess import run
+from sys import argv
+from time import perf_counter
+
+from at.utils.runner import fork_run, get_entry_point, FORK_SERVER_TOOLS
+
+ROUNDS = 10
+
+
+def get_latency(runner, args, rounds=ROUNDS):
+    """Returns average latency of runner in milliseconds"""
+    start = perf_counter()
+    for _ in range(rounds):
+        runner(args)
+
+    return (perf_counter() - start) / rounds * 1000
+
+
+def benchmark(tools=FORK_SERVER_TOOLS, rounds=ROUNDS):
+    """Print cold exec and fork server latency of given tools"""
+    for tool in tools:
+        if get_entry_point(tool) is None:
+            print(f"{tool}: not available")
+            continue
+
+        args = [tool, "--version"]
+        fork_run(args)  # warm up fork server
+
+        exec_latency = get_latency(lambda a: run(a, capture_output=True), args, rounds)
+        fork_latency = get_latency(fork_run, args, rounds)
+
+        print(
+            "{}: exec {:.1f} ms, fork {:.1f} ms, speedup {:.1f}x".format(
+                tool, exec_latency, fork_latency, exec_latency / fork_latency
+            )
+        )
+
+
+if __name__ == "__main__":
+    benchmark(argv[1:] or FORK_SERVER_TOOLS)
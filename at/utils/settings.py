@@ -0,0 +1,80 @@
+from os import getenv
+
+from flask import current_app, has_app_context
+
+
+def is_enabled(value):
+    """Returns False for "0", True for other values"""
+    return value != "0"
+
+
+# settings that can be set in ENV, with their types
+ENV_SETTINGS = {
+    "ADMISSION_CAPACITY": int,
+    "ADMISSION_CONTROL": is_enabled,
+    "APIKEY_CACHE_SIZE": int,
+    "ARTIFACT_STORAGE": str,
+    "BIBXML_DIR": str,
+    "DOCUMENT_CACHE_DIR": str,
+    "DOCUMENT_CACHE_SIZE": int,
+    "EXPORT_ACCEL_REDIRECT": str,
+    "EXPORT_ACCEL_REDIRECT_ARTIFACTS": str,
+    "EXPORT_TTL": int,
+    "EXPORT_URL_SECRET": str,
+    "FORK_SERVER": is_enabled,
+    "HTTP_CONNECT_TIMEOUT": float,
+    "HTTP_POOL_SIZE": int,
+    "HTTP_READ_TIMEOUT": float,
+    "HTTP_RETRIES": int,
+    "INTERMEDIATE_TTL": int,
+    "INVALID_APIKEY_TTL": int,
+    "JOB_WORKERS": int,
+    "JOBS_STORE": str,
+    "KRAMDOWN_REFCACHEDIR": str,
+    "KRAMDOWN_REFCACHE_SNAPSHOT": str,
+    "KRAMDOWN_REFCACHETTL": int,
+    "KRAMDOWN_SERVER": is_enabled,
+    "KRAMDOWN_SERVER_SOCKET": str,
+    "LATENCY_SLO": float,
+    "MAX_DISK_USAGE": float,
+    "MAX_FILE_SIZE": int,
+    "MAX_PROCESSES": int,
+    "METADATA_CACHE_SIZE": int,
+    "METADATA_IMMUTABLE_TTL": int,
+    "METADATA_LATEST_TTL": int,
+    "METADATA_NOT_FOUND_TTL": int,
+    "METADATA_STALE_TTL": int,
+    "PDF_PROCESSES": int,
+    "RATE_LIMIT": float,
+    "RATE_LIMIT_BURST": float,
+    "REFERENCE_PREFETCH_WORKERS": int,
+    "RETENTION_INTERVAL": int,
+    "S3_ENDPOINT_URL": str,
+    "SIGNED_URL_TTL": int,
+    "SINGLE_FLIGHT": is_enabled,
+    "SINGLE_FLIGHT_DIR": str,
+    "TARGET_DISK_USAGE": float,
+    "VALID_APIKEY_TTL": int,
+    "WORKSPACE_DIR": str,
+    "XML2RFC_ENGINE_WORKERS": int,
+}
+
+
+def get_env_settings():
+    """Returns settings set in ENV"""
+    return {
+        name: setting_type(value)
+        for name, setting_type in ENV_SETTINGS.items()
+        if (value := getenv(name))
+    }
+
+
+def get_setting(name, default):
+    """Returns setting from the configuration of the current application.
+    Outside of application context (command line tools, fork server) returns
+    setting from ENV or default."""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    if name in ENV_SETTINGS and (value := getenv(name)):
+        return ENV_SETTINGS[name](value)
+    return default
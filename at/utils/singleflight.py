@@ -0,0 +1,186 @@
+from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_UN
+from hashlib import sha256
+from json import dumps, loads
+from logging import getLogger
+from os import makedirs, path, remove, replace, scandir
+from tempfile import gettempdir, NamedTemporaryFile
+from threading import Lock
+from time import sleep, time
+
+from decorator import decorator
+from flask import current_app, request, Response
+
+from at.utils.file import get_file_hash
+from at.utils.runner import TIMEOUT
+from at.utils.settings import get_setting
+
+SINGLE_FLIGHT_DIR = path.join(gettempdir(), "at-single-flight")
+SINGLE_FLIGHT = True
+WAIT_TIMEOUT = TIMEOUT * 2  # in seconds
+POLL_INTERVAL = 0.05  # in seconds
+RESULT_TTL = 30  # in seconds, expired results get removed after this
+LOCK_TTL = 60 * 60  # in seconds, idle lock files get removed after this
+IGNORED_PARAMETERS = ("apikey",)
+
+_stats = {"leaders": 0, "followers": 0, "timeouts": 0, "released": 0}
+_stats_lock = Lock()
+
+
+def get_key(endpoint, parameters, files=()):
+    """Returns single-flight key for the endpoint, request parameters and
+    (name, filename, content hash) of uploaded files"""
+    return sha256(
+        dumps([endpoint, sorted(parameters), sorted(files)]).encode("utf-8")
+    ).hexdigest()
+
+
+def get_request_key():
+    """Returns single-flight key of the current request"""
+    parameters = [
+        (name, value)
+        for name, values in request.values.lists()
+        if name not in IGNORED_PARAMETERS
+        for value in values
+    ]
+    files = [
+        (name, file.filename, get_file_hash(file))
+        for name, file in request.files.items(multi=True)
+    ]
+
+    return get_key(" ".join([request.method, request.path]), parameters, files)
+
+
+def update_stats(key):
+    """Increase single-flight statistics counter"""
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def get_stats():
+    """Returns single-flight statistics"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def acquire(lock_file, timeout):
+    """Acquire exclusive lock on the file, polling so that green threads
+    are not blocked.
+    Returns True if lock was acquired within timeout."""
+    deadline = time() + timeout
+    while True:
+        try:
+            flock(lock_file, LOCK_EX | LOCK_NB)
+            return True
+        except BlockingIOError:
+            if time() > deadline:
+                return False
+            sleep(POLL_INTERVAL)
+
+
+def read_result(filename, since):
+    """Returns result saved after since or None"""
+    try:
+        if path.getmtime(filename) < since:
+            return None
+        with open(filename, "rb") as file:
+            metadata = loads(file.readline())
+            return metadata, file.read()
+    except (OSError, ValueError):
+        return None
+
+
+def write_result(filename, metadata, data):
+    """Save result atomically"""
+    with NamedTemporaryFile(dir=path.dirname(filename), delete=False) as file:
+        file.write(dumps(metadata).encode("utf-8") + b"\n")
+        file.write(data)
+    replace(file.name, filename)
+
+
+def save_result(filename, metadata, data, logger=getLogger()):
+    """Save result and remove expired results"""
+    try:
+        write_result(filename, metadata, data)
+        cleanup(path.dirname(filename))
+    except OSError as e:
+        logger.info("single-flight: can not save result: {}".format(e))
+
+
+def cleanup(directory):
+    """Remove expired results and idle lock files"""
+    now = time()
+    for entry in scandir(directory):
+        try:
+            age = now - entry.stat().st_mtime
+            if entry.name.endswith(".result") and age > RESULT_TTL:
+                remove(entry.path)
+            elif entry.name.endswith(".lock") and age > LOCK_TTL:
+                with open(entry.path, "w") as lock_file:
+                    flock(lock_file, LOCK_EX | LOCK_NB)
+                    remove(entry.path)
+        except OSError:
+            pass  # in use or removed by another process
+
+
+def single_flight(key, function, directory=None, logger=getLogger()):
+    """Run function once for concurrent callers with the same key, across
+    threads and processes of the node.
+    Callers arriving after the result was saved run the function again.
+    Function must return (metadata, data), where metadata is JSON
+    serializable and data is bytes. Callers waiting on the same key get the
+    same result. If the function raises, callers waiting on the same key run
+    it concurrently."""
+
+    directory = directory or get_setting("SINGLE_FLIGHT_DIR", SINGLE_FLIGHT_DIR)
+    makedirs(directory, exist_ok=True)
+    result_file = path.join(directory, key + ".result")
+    since = time()  # only share results with callers that were waiting
+
+    with open(path.join(directory, key + ".lock"), "w") as lock_file:
+        if not acquire(lock_file, WAIT_TIMEOUT):
+            logger.info("single-flight: timed out waiting for {}".format(key))
+            update_stats("timeouts")
+            return function()
+
+        try:
+            if (result := read_result(result_file, since)) is None:
+                update_stats("leaders")
+                try:
+                    metadata, data = function()
+                except Exception:
+                    # null metadata marks failure for waiting callers
+                    save_result(result_file, None, b"", logger)
+                    raise
+                save_result(result_file, metadata, data, logger)
+                return metadata, data
+            elif result[0] is not None:
+                update_stats("followers")
+                return result
+        finally:
+            flock(lock_file, LOCK_UN)
+
+    logger.info("single-flight: leader failed for {}".format(key))
+    update_stats("released")
+    return function()
+
+
+@decorator
+def coalesce(f, *args, **kwargs):
+    """Coalesce identical concurrent requests, so that only one of them runs
+    the view and the rest get its response"""
+    if not get_setting("SINGLE_FLIGHT", SINGLE_FLIGHT):
+        return f(*args, **kwargs)
+
+    def view():
+        response = current_app.make_response(f(*args, **kwargs))
+        metadata = {
+            "status": response.status_code,
+            "content_type": response.content_type,
+        }
+        return metadata, response.get_data()
+
+    metadata, data = single_flight(get_request_key(), view, logger=current_app.logger)
+
+    return Response(
+        data, status=metadata["status"], content_type=metadata["content_type"]
+    )
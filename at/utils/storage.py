@@ -0,0 +1,146 @@
+from os import chmod, makedirs, path, remove, replace
+from shutil import copyfileobj
+from tempfile import NamedTemporaryFile
+
+from at.utils.settings import get_setting
+
+CHUNK_SIZE = 1024 * 1024  # in bytes
+FILE_MODE = 0o644
+NOT_FOUND_CODES = ("404", "NoSuchKey", "NotFound")
+
+
+# Exceptions
+class StorageError(Exception):
+    """Error class for artifact storage errors"""
+
+    pass
+
+
+class LocalStorage:
+    """Artifact storage on a local or shared filesystem"""
+
+    def __init__(self, directory):
+        self.directory = path.abspath(directory)
+
+    def get_path(self, name):
+        """Returns path of the artifact"""
+        filename = path.abspath(path.join(self.directory, name))
+        if not filename.startswith(self.directory + "/"):
+            raise StorageError("Invalid artifact name: {}".format(name))
+        return filename
+
+    def save(self, name, filename):
+        """Copy file to the storage, unless it is already there"""
+        destination = self.get_path(name)
+        if destination == path.abspath(filename):
+            return
+
+        makedirs(path.dirname(destination), exist_ok=True)
+        with open(filename, "rb") as source:
+            with NamedTemporaryFile(
+                dir=path.dirname(destination), delete=False
+            ) as file:
+                copyfileobj(source, file, CHUNK_SIZE)
+        chmod(file.name, FILE_MODE)
+        replace(file.name, destination)
+
+    def exists(self, name):
+        """Returns True if artifact exists"""
+        return path.isfile(self.get_path(name))
+
+    def open(self, name):
+        """Returns binary file object of the artifact"""
+        return open(self.get_path(name), "rb")
+
+    def delete(self, name):
+        """Remove the artifact"""
+        try:
+            remove(self.get_path(name))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    """Artifact storage on S3 or S3-compatible object storage"""
+
+    def __init__(self, bucket, prefix="", endpoint_url=None):
+        try:
+            from boto3 import client
+        except ImportError:
+            raise StorageError("boto3 is required for S3 artifact storage")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = client("s3", endpoint_url=endpoint_url)
+
+    def get_key(self, name):
+        """Returns object key of the artifact"""
+        return "/".join(filter(None, (self.prefix, name)))
+
+    def save(self, name, filename):
+        """Upload file to the storage, in parts for large files"""
+        from boto3.exceptions import S3UploadFailedError
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            self.client.upload_file(filename, self.bucket, self.get_key(name))
+        except (BotoCoreError, ClientError, S3UploadFailedError) as e:
+            raise StorageError("S3 error: {}".format(e))
+
+    def exists(self, name):
+        """Returns True if artifact exists"""
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.get_key(name))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in NOT_FOUND_CODES:
+                return False
+            raise StorageError("S3 error: {}".format(e))
+        except BotoCoreError as e:
+            raise StorageError("S3 error: {}".format(e))
+
+    def open(self, name):
+        """Returns binary stream of the artifact"""
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.get_key(name))[
+                "Body"
+            ]
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError("S3 error: {}".format(e))
+
+    def delete(self, name):
+        """Remove the artifact"""
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=self.get_key(name))
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError("S3 error: {}".format(e))
+
+
+def get_storage(location, upload_dir):
+    """Returns artifact storage for the location.
+    s3://<bucket>/<prefix> is S3 storage, other locations are directories.
+    Upload directory is used if location is not set."""
+
+    if not location:
+        return LocalStorage(upload_dir)
+    elif location.startswith("s3://"):
+        bucket, _, prefix = location[len("s3://") :].partition("/")
+        # S3_ENDPOINT_URL is set for S3-compatible storage
+        return S3Storage(bucket, prefix, get_setting("S3_ENDPOINT_URL", None))
+    else:
+        return LocalStorage(location)
+
+
+def iter_chunks(file, chunk_size=CHUNK_SIZE):
+    """Yields chunks of the file and closes it"""
+    try:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            yield chunk
+    finally:
+        file.close()
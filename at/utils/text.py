@@ -2,8 +2,7 @@ from logging import getLogger
 
 from at.utils.file import get_extension, save_file, save_file_from_url
 from at.utils.processor import (
-    get_text,
-    get_xml,
+    get_rendered,
     md2xml,
     rst2xml,
     ProcessingError,
@@ -59,8 +58,8 @@ def get_text_id(dir_path, filename, logger=getLogger()):
                 filename = md2xml(filename, logger)
             elif file_ext.lower() in [".rst"]:
                 filename = rst2xml(filename, logger)
-            xml_file, _ = get_xml(filename, logger=logger)
-            filename, _ = get_text(xml_file, logger=logger)
+            _, rendered, _ = get_rendered(filename, ["text"], logger=logger)
+            filename = rendered["text"]
         except ProcessingError as e:
             logger.error("error processing non text file: {}".format(filename))
             raise TextProcessingError(str(e))
@@ -1,12 +1,9 @@
 from logging import getLogger
 from subprocess import CalledProcessError
 
-from xml2rfc import XmlRfcParser
-from lxml.etree import XMLSyntaxError
-
 from at.utils.file import cleanup_output, get_extension, get_filename
 from at.utils.logs import process_xml2rfc_log
-from at.utils.processor import process_file, ProcessingError
+from at.utils.processor import process_file, process_xml
 from at.utils.text import get_text_id_from_file
 from at.utils.runner import proc_run, RunnerError
 
@@ -34,29 +31,19 @@ def validate_xml(filename, logger=getLogger()):
     """Validate XML2RFC
     NOTE: if file is XML2RFC v2 that will get converted to v3"""
 
-    try:
-        log = None
-
-        logger.debug("invoking xml2rfc parser")
-
-        parser = XmlRfcParser(filename, quiet=True)
-        xmltree = parser.parse(remove_comments=False, quiet=True)
-        xmlroot = xmltree.getroot()
-        xml2rfc_version = xmlroot.get("version", "2")
-        v2_processed_log = None
-
-        if xml2rfc_version == "2":
-            filename, output = convert_v2v3(filename, logger)
-            v2_processed_log = process_xml2rfc_log(output, filename)
-
-    except XMLSyntaxError as e:
-        logger.info("xml2rfc error: {}".format(str(e)))
-        raise ProcessingError(e)
+    # parse once and render text from the same (converted) document
+    xml_file, v2_processed_log, outputs = process_xml(
+        filename, formats=["text"], warn_bare_unicode=True, logger=logger
+    )
+    text_file, log = outputs["text"]
 
-    logger.info("new file saved at {}".format(filename))
+    if log.returncode != 0:
+        if log.stderr:
+            logger.info("xml2rfc error: {}".format(log.stderr))
+        else:
+            logger.info("xml2rfc error: no stderr output")
 
-    log, text_file = xml2rfc_validation(filename, logger)
-    processed_log = process_xml2rfc_log(log, filename)
+    processed_log = process_xml2rfc_log(log, xml_file)
 
     idnits_log = idnits(text_file, logger)
 
@@ -70,56 +57,13 @@ def validate_xml(filename, logger=getLogger()):
 
 def xml2rfc_validation(filename, logger=getLogger()):
     """Run xml2rfc to validate the document and return output and text file"""
-
-    logger.debug("running xml2rfc")
-
-    text_file = get_filename(filename, "txt")
-
-    try:
-        output = proc_run(
-            args=["xml2rfc", "--warn-bare-unicode", "--out", text_file, filename],
-            capture_output=True,
-        )
-        output.check_returncode()
-    except RunnerError as e:  # pragma: no cover
-        logger.info(f"process error: {str(e)}")
-    except CalledProcessError:
-        if output.stderr:
-            logger.info("xml2rfc error: {}".format(output.stderr))
-        else:
-            logger.info("xml2rfc error: no stderr output")
-
+    _, _, outputs = process_xml(
+        filename, formats=["text"], warn_bare_unicode=True, logger=logger
+    )
+    text_file, output = outputs["text"]
     return (output, text_file)
 
 
-def convert_v2v3(filename, logger=getLogger()):
-    """Convert XML2RFC v2 file to v3 and return file name output"""
-
-    logger.debug("converting v2 XML to v3 XML")
-
-    xml_file = get_filename(filename, "xml")
-
-    try:
-        output = proc_run(
-            args=["xml2rfc", "--v2v3", "--out", xml_file, filename], capture_output=True
-        )
-        output.check_returncode()
-    except RunnerError as e:  # pragma: no cover
-        logger.info(f"process error: {str(e)}")
-        raise ProcessingError(str(e))
-    except CalledProcessError:
-        if output.stderr:
-            error = output.stderr.decode("utf-8")
-            logger.info("xml2rfc v2v3 error: {}".format(error))
-        else:
-            error = "v2v3 conversion error"
-            logger.info("xml2rfc v2v3 error: no stderr output")
-        raise ProcessingError(error)
-
-    logger.info("new file saved at {}".format(xml_file))
-    return xml_file, output
-
-
 def idnits(
     filename,
     logger=getLogger(),
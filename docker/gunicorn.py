@@ -4,5 +4,6 @@ accesslog = "-"
 errorlog = "-"
 capture_output = True
 workers = os.getenv("GUNICORN_WORKERS", 2)
+# NOTE: eventlet workers can not use the tool fork server (FORK_SERVER)
 worker_class = "eventlet"
 bind = "0.0.0.0:8008"
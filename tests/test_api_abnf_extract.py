@@ -5,7 +5,11 @@ from pathlib import Path
 from shutil import rmtree
 from urllib.parse import urlencode
 
+import responses
+from requests.exceptions import ConnectionError
+
 from at import create_app
+from at.utils.net import metadata_cache
 
 API = "/api/abnf/extract"
 TEMPORARY_DATA_DIR = "./tests/tmp/"
@@ -62,6 +66,24 @@ class TestApiAbnfExtract(TestCase):
                     "Can not find the latest document on datatracker",
                 )
 
+    @responses.activate
+    def test_datatracker_unavailable_error(self):
+        doc = "draft-smoke-signals"
+        url = "/".join([DT_LATEST_DRAFT_URL, doc])
+        responses.add(responses.GET, url, body=ConnectionError())
+        metadata_cache.clear()
+
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                result = client.get(API + "?" + urlencode({"doc": doc}))
+                json_data = result.get_json()
+
+                self.assertEqual(result.status_code, 503)
+                self.assertEqual(
+                    json_data["error"],
+                    "Datatracker is not reachable, please try again later",
+                )
+
     def test_download_error(self):
         url = "https://www.ietf.org/archives/id/draft-404.txt"
 
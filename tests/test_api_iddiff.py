@@ -2,12 +2,16 @@ from logging import disable as set_logger, INFO, CRITICAL
 from os.path import abspath
 from pathlib import Path
 from shutil import rmtree
+from time import sleep
 from unittest import TestCase
+from unittest.mock import patch
 from urllib.parse import urlencode
 
 import responses
+from requests.exceptions import ConnectionError
 
 from at import create_app
+from at.utils.net import metadata_cache
 
 TEST_DATA_DIR = "./tests/data/"
 DRAFT_A = "draft-smoke-signals-00.txt"
@@ -39,6 +43,8 @@ class TestApiIddiff(TestCase):
         set_logger(CRITICAL)
         # create temporary data dir
         Path(TEMPORARY_DATA_DIR).mkdir(exist_ok=True)
+        # Datatracker responses are mocked in some tests
+        metadata_cache.clear()
 
         config = {
             "UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR),
@@ -105,6 +111,23 @@ class TestApiIddiff(TestCase):
                 self.assertEqual(result.status_code, 400)
                 self.assertEqual(json_data["error"], "Filename is missing")
 
+    def test_missing_first_file(self):
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                result = client.post(
+                    "/api/iddiff",
+                    data={
+                        "file_2": (open(get_path(DRAFT_B), "rb"), DRAFT_B),
+                        "apikey": VALID_API_KEY,
+                    },
+                )
+                json_data = result.get_json()
+
+                self.assertEqual(result.status_code, 400)
+                self.assertEqual(
+                    json_data["error"], "First document to compare is missing"
+                )
+
     def test_unsupported_first_file_format(self):
         with self.app.test_client() as client:
             with self.app.app_context():
@@ -248,6 +271,59 @@ class TestApiIddiff(TestCase):
                 self.assertIn(str.encode(DRAFT_A), data)
                 self.assertIn(str.encode(DRAFT_B), data)
 
+    def test_iddiff_deadline(self):
+        workspace_dir = Path(TEMPORARY_DATA_DIR, "workspaces")
+        workspace_dir.mkdir()
+        self.app.config["WORKSPACE_DIR"] = str(workspace_dir)
+
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                with patch("at.api.IDDIFF_DEADLINE", 0):
+                    result = client.post(
+                        "/api/iddiff",
+                        data={
+                            "file_1": (open(get_path(XML_DRAFT_A), "rb"), XML_DRAFT_A),
+                            "file_2": (open(get_path(XML_DRAFT_B), "rb"), XML_DRAFT_B),
+                            "apikey": VALID_API_KEY,
+                        },
+                    )
+                json_data = result.get_json()
+
+                self.assertEqual(result.status_code, 400)
+                self.assertEqual(
+                    json_data["error"], "Timed out getting documents to compare"
+                )
+
+        # workspace is removed once the workers have finished
+        for _ in range(100):
+            if not any(workspace_dir.iterdir()):
+                break
+            sleep(0.1)
+        self.assertFalse(any(workspace_dir.iterdir()))
+
+    def test_iddiff_cache(self):
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                results = []
+                for _ in range(2):
+                    result = client.post(
+                        "/api/iddiff",
+                        data={
+                            "file_1": (open(get_path(DRAFT_A), "rb"), DRAFT_A),
+                            "file_2": (open(get_path(DRAFT_B), "rb"), DRAFT_B),
+                            "apikey": VALID_API_KEY,
+                            "iddiff": True,
+                        },
+                    )
+                    self.assertEqual(result.status_code, 200)
+                    results.append(result.get_data())
+
+                self.assertEqual(results[0], results[1])
+                metrics = client.get("/api/metrics").get_json()
+                self.assertEqual(metrics["caches"]["iddiff"]["hits"], 1)
+                self.assertEqual(metrics["caches"]["iddiff"]["misses"], 1)
+                self.assertGreater(metrics["caches"]["iddiff"]["bytes"], 0)
+
     def test_iddiff_with_two_files_use_rfcdiff(self):
         with self.app.test_client() as client:
             with self.app.app_context():
@@ -758,6 +834,44 @@ class TestApiIddiff(TestCase):
                     self.assertIn(b"OLD:", data)
                     self.assertIn(b"NEW:", data)
 
+    @responses.activate
+    def test_iddiff_with_two_labels_mocked(self):
+        responses.add_passthru("http://localhost")
+        for draft in (DRAFT_A, DRAFT_B):
+            url = "https://www.ietf.org/archive/id/{}".format(draft)
+            responses.add(
+                responses.GET,
+                "/".join([DT_LATEST_DRAFT_URL, draft[: -len(".txt")]]),
+                json={"content_url": url},
+            )
+            with open(get_path(draft), "rb") as file:
+                responses.add(responses.GET, url, body=file.read())
+
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                for params in (
+                    {
+                        "doc_1": "draft-smoke-signals-00",
+                        "doc_2": "draft-smoke-signals-01",
+                        "iddiff": 1,
+                    },
+                    {
+                        "url1": "draft-smoke-signals-00",
+                        "url2": "draft-smoke-signals-01",
+                        "iddiff": 1,
+                    },
+                ):
+                    result = client.get(
+                        "/api/iddiff?" + urlencode(params),
+                        headers={"X-API-KEY": VALID_API_KEY},
+                    )
+                    data = result.get_data()
+
+                    self.assertEqual(result.status_code, 200)
+                    self.assertIn(b"<html", data)
+                    self.assertIn(b"draft-smoke-signals-00", data)
+                    self.assertIn(b"draft-smoke-signals-01", data)
+
     @responses.activate
     def test_error_document_not_found(self):
         rfc = "rfc666"
@@ -776,6 +890,26 @@ class TestApiIddiff(TestCase):
                 msg = "Can not find url for the latest document on datatracker"
                 self.assertEqual(json_data["error"], msg)
 
+    @responses.activate
+    def test_error_datatracker_unavailable(self):
+        rfc = "rfc667"
+        responses.add(
+            responses.GET,
+            "/".join([DT_LATEST_DRAFT_URL, rfc]),
+            body=ConnectionError(),
+        )
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                result = client.get(
+                    "/api/iddiff?" + urlencode({"doc_1": rfc}),
+                    headers={"X-API-KEY": VALID_API_KEY},
+                )
+                json_data = result.get_json()
+
+                self.assertEqual(result.status_code, 503)
+                msg = "Datatracker is not reachable, please try again later"
+                self.assertEqual(json_data["error"], msg)
+
     @responses.activate
     def test_error_document_not_found_with_url(self):
         rfc = "rfc666"
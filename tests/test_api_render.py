@@ -1,7 +1,9 @@
 from logging import disable as set_logger, INFO, CRITICAL
+from os import utime
 from os.path import abspath
 from pathlib import Path
 from shutil import rmtree
+from time import sleep, time
 from unittest import TestCase
 
 from at import create_app
@@ -53,6 +55,9 @@ class TestApiRender(TestCase):
     def tearDown(self):
         # set logging to INFO
         set_logger(INFO)
+        # stop job runner
+        if "jobs" in self.app.extensions:
+            self.app.extensions["jobs"].stop()
         # remove temporary data dir
         rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
 
@@ -260,6 +265,164 @@ class TestApiRender(TestCase):
                 self.assertEqual(result.status_code, 400)
                 self.assertTrue(json_data["error"].startswith("processing error:"))
 
+    def test_render_cache(self):
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                urls = []
+                for _ in range(2):
+                    result = client.post(
+                        "/api/render/xml",
+                        data={
+                            "file": (
+                                open(get_path(TEST_XML_DRAFT), "rb"),
+                                TEST_XML_DRAFT,
+                            ),
+                            "apikey": VALID_API_KEY,
+                        },
+                    )
+                    json_data = result.get_json()
+
+                    self.assertEqual(result.status_code, 200)
+                    urls.append(json_data["url"])
+
+                    # workspace is released, export marker is refreshed
+                    workspace = Path(
+                        TEMPORARY_DATA_DIR, json_data["url"].split("/")[-2]
+                    )
+                    self.assertFalse((workspace / ".in_use").exists())
+                    exported = (workspace / ".exported").stat().st_mtime
+                    self.assertGreater(exported, time() - 60)
+                    utime(workspace / ".exported", (time() - 3600, time() - 3600))
+
+                self.assertEqual(urls[0], urls[1])
+
+                metrics = client.get("/api/metrics").get_json()
+                self.assertEqual(metrics["caches"]["render"]["hits"], 1)
+                self.assertEqual(metrics["caches"]["render"]["misses"], 1)
+
+    def test_render_formats(self):
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                for filename in (TEST_XML_DRAFT, TEST_XML_V2_DRAFT):
+                    result = client.post(
+                        "/api/render",
+                        data={
+                            "file": (open(get_path(filename), "rb"), filename),
+                            "formats": "xml,html,text",
+                            "apikey": VALID_API_KEY,
+                        },
+                    )
+                    json_data = result.get_json()
+
+                    self.assertEqual(result.status_code, 200)
+                    self.assertEqual(
+                        sorted(json_data["urls"].keys()), ["html", "text", "xml"]
+                    )
+                    self.assertIn("errors", json_data["logs"].keys())
+                    self.assertIn("warnings", json_data["logs"].keys())
+
+                    for url in json_data["urls"].values():
+                        self.assertTrue(url.startswith("{}/".format(SITE_URL)))
+                        export = client.get(url.replace(SITE_URL, ""))
+                        self.assertEqual(export.status_code, 200)
+
+    def test_render_formats_unsupported_format(self):
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                result = client.post(
+                    "/api/render",
+                    data={
+                        "file": (open(get_path(TEST_XML_DRAFT), "rb"), TEST_XML_DRAFT),
+                        "formats": "html,flac",
+                        "apikey": VALID_API_KEY,
+                    },
+                )
+                json_data = result.get_json()
+
+                self.assertEqual(result.status_code, 400)
+                self.assertEqual(json_data["error"], "Render format not supported")
+
+    def test_render_formats_error(self):
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                result = client.post(
+                    "/api/render",
+                    data={
+                        "file": (open(get_path(TEST_XML_ERROR), "rb"), TEST_XML_ERROR),
+                        "formats": "html,text",
+                        "apikey": VALID_API_KEY,
+                    },
+                )
+                json_data = result.get_json()
+
+                self.assertEqual(result.status_code, 400)
+                self.assertTrue(json_data["error"].startswith("processing error:"))
+
+    def test_render_async(self):
+        self.app = create_app(
+            {
+                "UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR),
+                "REQUIRE_AUTH": False,
+                "SITE_URL": SITE_URL,
+                "JOB_RUNNER": True,
+            }
+        )
+
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                result = client.post(
+                    "/api/render/text?async=1",
+                    data={
+                        "file": (open(get_path(TEST_XML_DRAFT), "rb"), TEST_XML_DRAFT),
+                        "apikey": VALID_API_KEY,
+                    },
+                )
+                json_data = result.get_json()
+
+                self.assertEqual(result.status_code, 202)
+                self.assertEqual(json_data["status"], "queued")
+                self.assertTrue(json_data["url"].startswith("{}/".format(SITE_URL)))
+
+                status_url = json_data["url"].replace(SITE_URL, "")
+                for _ in range(300):
+                    status = client.get(status_url).get_json()
+                    if status["status"] in ("done", "failed"):
+                        break
+                    sleep(0.1)
+
+                self.assertEqual(status["status"], "done")
+                result = client.get(status["result_url"].replace(SITE_URL, ""))
+                json_data = result.get_json()
+
+                self.assertEqual(result.status_code, 200)
+                self.assertTrue(json_data["url"].startswith("{}/".format(SITE_URL)))
+                self.assertIn("errors", json_data["logs"].keys())
+                self.assertIn("warnings", json_data["logs"].keys())
+
+    def test_render_async_invalid_callback(self):
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                result = client.post(
+                    "/api/render/pdf?async=1",
+                    data={
+                        "file": (open(get_path(TEST_XML_DRAFT), "rb"), TEST_XML_DRAFT),
+                        "callback": "ftp://example.org/callback",
+                        "apikey": VALID_API_KEY,
+                    },
+                )
+
+                self.assertEqual(result.status_code, 400)
+
+    def test_job_not_found(self):
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                for url in ("/api/jobs/foobar", "/api/jobs/foobar/result"):
+                    result = client.get(url)
+                    json_data = result.get_json()
+
+                    self.assertEqual(result.status_code, 404)
+                    self.assertEqual(json_data["error"], "Job not found")
+
     def test_export_error(self):
         with self.app.test_client() as client:
             with self.app.app_context():
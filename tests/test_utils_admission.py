@@ -0,0 +1,115 @@
+from logging import disable as set_logger, INFO, CRITICAL
+from os.path import abspath
+from pathlib import Path
+from shutil import rmtree
+from unittest import TestCase
+from unittest.mock import patch
+
+from at import create_app
+from at.utils.admission import AdmissionController, DEFAULT_SERVICE_TIME, get_key
+
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+
+
+class TestUtilsAdmission(TestCase):
+    """Tests for at.utils.admission"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(TEMPORARY_DATA_DIR).mkdir(exist_ok=True)
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    @patch("at.utils.admission.monotonic", return_value=100)
+    def test_admit(self, _):
+        controller = AdmissionController(slo=10, capacity=2)
+
+        self.assertIsNone(controller.admit("api.render"))
+        controller.finish("api.render", 8)
+        self.assertIsNone(controller.admit("api.render"))
+
+        # backlog of 4s and 8s service time is over the SLO
+        self.assertEqual(controller.admit("api.render"), 2)
+        # cheap requests are served
+        self.assertIsNone(controller.admit("api.version", exempt=True))
+        controller.finish("api.version", 0.01)
+
+        stats = controller.stats()
+        self.assertEqual(stats["backlog"], 4)
+        self.assertEqual(stats["admitted"], 3)
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["endpoints"]["api.render"]["in_flight"], 1)
+        self.assertEqual(stats["endpoints"]["api.render"]["rejected"], 1)
+
+        controller.finish("api.render", 8)
+        self.assertIsNone(controller.admit("api.render"))
+
+    @patch("at.utils.admission.monotonic", return_value=100)
+    def test_service_time(self, _):
+        controller = AdmissionController(alpha=0.5)
+
+        controller.admit("api.idnits")
+        controller.finish("api.idnits", 4)
+        controller.admit("api.idnits")
+        controller.finish("api.idnits", 2)
+
+        self.assertEqual(controller.get_service_time("api.idnits"), 3)
+
+    def test_slow_request(self):
+        controller = AdmissionController(slo=60, capacity=2, half_life=30)
+
+        with patch("at.utils.admission.monotonic", return_value=100):
+            controller.admit("api.render:pdf")
+            controller.finish("api.render:pdf", 90)
+
+            # nothing in flight, served
+            self.assertIsNone(controller.admit("api.render:pdf"))
+            self.assertEqual(controller.admit("api.render:pdf"), 75)
+            # other formats are estimated separately
+            self.assertIsNone(controller.admit("api.render:text"))
+            self.assertIsNone(controller.admit("api.render:text"))
+
+        with patch("at.utils.admission.monotonic", return_value=190):
+            # estimate decays towards the default
+            self.assertEqual(
+                controller.get_service_time("api.render:pdf"),
+                DEFAULT_SERVICE_TIME + (90 - DEFAULT_SERVICE_TIME) / 8,
+            )
+
+    def test_get_key(self):
+        self.assertEqual(get_key("api.render", {"format": "pdf"}), "api.render:pdf")
+        self.assertEqual(get_key("api.idnits", {}), "api.idnits")
+        self.assertIsNone(get_key(None))
+
+    def test_load_shedding(self):
+        controller = AdmissionController()
+        app = create_app(
+            {
+                "UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR),
+                "REQUIRE_AUTH": False,
+                "LATENCY_SLO": 0,
+                "ADMISSION_CAPACITY": 1,
+            }
+        )
+
+        with patch("at.utils.admission.controller", controller):
+            # request of the same endpoint in flight
+            controller.admit("api.abnf_extract")
+            with app.test_client() as client:
+                with app.app_context():
+                    result = client.get("/api/abnf/extract")
+
+                    self.assertEqual(result.status_code, 503)
+                    self.assertEqual(result.headers["Retry-After"], "2")
+
+                    result = client.get("/api/metrics")
+
+                    self.assertEqual(result.status_code, 200)
+                    self.assertEqual(controller.stats()["rejected"], 1)
+                    self.assertEqual(controller.stats()["backlog"], 1)
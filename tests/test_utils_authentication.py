@@ -9,6 +9,7 @@ from hypothesis.strategies import text
 import responses
 
 from at import create_app
+from at.utils.authentication import apikey_cache, is_valid_signature, sign_url
 
 TEST_DATA_DIR = "./tests/data/"
 TEST_XML_DRAFT = "draft-smoke-signals-00.xml"
@@ -16,6 +17,7 @@ TEMPORARY_DATA_DIR = "./tests/tmp/"
 AUTHOR_TOOLS_API_TEST_VERSION = "0.0.1"
 DT_APPAUTH_URL = "https://example.com/"
 VALID_API_KEY = "foobar"
+EXPORT_URL_SECRET = "secret"
 
 
 def get_path(filename):
@@ -31,12 +33,15 @@ class TestUtilsAuthentication(TestCase):
         set_logger(CRITICAL)
         # create temporary data dir
         Path(TEMPORARY_DATA_DIR).mkdir(exist_ok=True)
+        # clear API key validation cache
+        apikey_cache.clear()
 
         config = {
             "UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR),
             "DT_APPAUTH_URL": DT_APPAUTH_URL,
             "REQUIRE_AUTH": True,
             "VERSION": AUTHOR_TOOLS_API_TEST_VERSION,
+            "EXPORT_URL_SECRET": EXPORT_URL_SECRET,
         }
 
         self.app = create_app(config)
@@ -136,6 +141,107 @@ class TestUtilsAuthentication(TestCase):
                 self.assertEqual(result.status_code, 401)
                 self.assertEqual(json_data["error"], "API key is invalid")
 
+    def test_metrics_no_api_key(self):
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                result = client.get("/api/metrics")
+
+                self.assertEqual(result.status_code, 401)
+                self.assertNotIn("auth", result.get_json())
+
+    @responses.activate
+    def test_authentication_cache(self):
+        responses.add(
+            responses.POST, DT_APPAUTH_URL, json={"success": True}, status=200
+        )
+
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                for _ in range(3):
+                    result = client.get(
+                        "/api/abnf/extract", headers={"X-API-KEY": VALID_API_KEY}
+                    )
+                    self.assertNotEqual(result.status_code, 401)
+
+                self.assertEqual(len(responses.calls), 1)
+                metrics = client.get(
+                    "/api/metrics", headers={"X-API-KEY": VALID_API_KEY}
+                ).get_json()
+                # metrics request is authenticated from the cache as well
+                self.assertEqual(metrics["auth"]["hits"], 3)
+
+    @responses.activate
+    def test_authentication_cache_server_error(self):
+        responses.add(responses.POST, DT_APPAUTH_URL, status=500)
+
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                for _ in range(2):
+                    result = client.get(
+                        "/api/abnf/extract", headers={"X-API-KEY": VALID_API_KEY}
+                    )
+                    self.assertEqual(result.status_code, 401)
+
+                # server errors are not cached
+                self.assertEqual(len(responses.calls), 2)
+
+    def test_signature(self):
+        url = sign_url("/api/export/foo/bar.pdf", "/api/export/foo/bar.pdf", "key")
+        _, query = url.split("?")
+        expires, signature = (value.split("=")[1] for value in query.split("&"))
+
+        self.assertTrue(
+            is_valid_signature("/api/export/foo/bar.pdf", expires, signature, "key")
+        )
+        self.assertFalse(
+            is_valid_signature("/api/export/foo/baz.pdf", expires, signature, "key")
+        )
+        self.assertFalse(
+            is_valid_signature("/api/export/foo/bar.pdf", expires, signature, "foo")
+        )
+        self.assertFalse(
+            is_valid_signature("/api/export/foo/bar.pdf", "1", signature, "key")
+        )
+        self.assertFalse(
+            is_valid_signature("/api/export/foo/bar.pdf", "foo", signature, "key")
+        )
+
+    def test_signed_export_url(self):
+        Path(TEMPORARY_DATA_DIR, "foo").mkdir()
+        Path(TEMPORARY_DATA_DIR, "foo", "bar.txt").write_text("exported")
+        path = "/api/export/foo/bar.txt"
+
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                # no Datatracker call for signed URLs
+                result = client.get(sign_url(path, path, EXPORT_URL_SECRET))
+                self.assertEqual(result.status_code, 200)
+                self.assertEqual(result.data, b"exported")
+
+                result = client.get(sign_url(path, path, EXPORT_URL_SECRET, ttl=-1))
+                self.assertEqual(result.status_code, 403)
+
+                result = client.get(sign_url(path, path, "foobar"))
+                self.assertEqual(result.status_code, 403)
+
+                result = client.get(path)
+                self.assertEqual(result.status_code, 401)
+
+    def test_signed_export_url_accel_redirect(self):
+        Path(TEMPORARY_DATA_DIR, "foo").mkdir()
+        Path(TEMPORARY_DATA_DIR, "foo", "bar.txt").write_text("exported")
+        path = "/api/export/foo/bar.txt"
+        self.app.config["EXPORT_ACCEL_REDIRECT"] = "/internal/export/"
+
+        with self.app.test_client() as client:
+            with self.app.app_context():
+                result = client.get(sign_url(path, path, EXPORT_URL_SECRET))
+                self.assertEqual(result.status_code, 200)
+                self.assertEqual(
+                    result.headers["X-Accel-Redirect"], "/internal/export/foo/bar.txt"
+                )
+                self.assertEqual(result.data, b"")
+
     def test_authentication_disabled(self):
         config = {
             "UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR),
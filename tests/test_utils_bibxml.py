@@ -0,0 +1,155 @@
+from io import BytesIO
+from logging import disable as set_logger, INFO, CRITICAL
+from os import path
+from os.path import abspath
+from pathlib import Path
+from shutil import rmtree
+from tarfile import open as open_tarfile, TarInfo
+from unittest import TestCase
+
+from at import create_app
+from at.utils.bibxml import (
+    BibXMLError,
+    build,
+    get_reference_file,
+    get_stats,
+    main,
+    seed_refcache,
+)
+
+TEST_DATA_DIR = "./tests/data/"
+TEST_REFERENCE = "reference.RFC.2119.xml"
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+BIBXML_DIR = "./tests/tmp/bibxml/"
+REFCACHE_DIR = "./tests/tmp/refcache/"
+TEST_REFERENCE_8174 = b"""<?xml version="1.0" encoding="UTF-8"?>
+<reference anchor="RFC8174" target="https://www.rfc-editor.org/info/rfc8174">
+  <front>
+    <title>Ambiguity of Uppercase vs Lowercase in RFC 2119 Key Words</title>
+    <author fullname="B. Leiba" initials="B." surname="Leiba"/>
+    <date month="May" year="2017"/>
+  </front>
+</reference>
+"""
+
+
+def create_archive(filename, files):
+    """Create BibXML like tarball with given files"""
+    with open_tarfile(filename, "w:gz") as tar:
+        for name, content in files.items():
+            info = TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, BytesIO(content))
+
+
+class TestUtilsBibXML(TestCase):
+    """Tests for at.utils.bibxml"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(TEMPORARY_DATA_DIR).mkdir(parents=True, exist_ok=True)
+        with open("".join([TEST_DATA_DIR, TEST_REFERENCE]), "rb") as file:
+            self.reference = file.read()
+        self.archive = "".join([TEMPORARY_DATA_DIR, "bibxml.tgz"])
+        create_archive(
+            self.archive,
+            {
+                "bibxml/" + TEST_REFERENCE: self.reference,
+                "bibxml/reference.RFC.0000.xml": b"<reference/>",
+                "bibxml/reference.RFC.0001.xml": b"<invalid",
+                "bibxml/README": b"not a reference",
+            },
+        )
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def test_build(self):
+        version = build(self.archive, bibxml_dir=BIBXML_DIR)
+
+        stats = get_stats(BIBXML_DIR)
+        self.assertEqual(stats["version"], version)
+        self.assertEqual(stats["references"], 1)
+
+        reference_file = get_reference_file(TEST_REFERENCE, BIBXML_DIR)
+        with open(reference_file, "rb") as file:
+            self.assertEqual(file.read(), self.reference)
+
+        for name in (
+            "https://bib.ietf.org/public/rfc/bibxml/reference.RFC.2119.xml",
+            "https://bib.ietf.org/public/rfc/bibxml/reference.RFC.2119",
+            "RFC2119",
+        ):
+            self.assertEqual(get_reference_file(name, BIBXML_DIR), reference_file)
+
+        for name in (
+            "reference.RFC.0000.xml",
+            "reference.RFC.0001.xml",
+            "https://example.org/reference.RFC.2119.xml?anchor=foo",
+            "",
+        ):
+            self.assertIsNone(get_reference_file(name, BIBXML_DIR))
+
+    def test_build_empty(self):
+        archive = "".join([TEMPORARY_DATA_DIR, "empty.tgz"])
+        create_archive(archive, {"README": b"not a reference"})
+
+        with self.assertRaises(BibXMLError):
+            build(archive, bibxml_dir=BIBXML_DIR)
+
+        self.assertEqual(get_stats(BIBXML_DIR)["references"], 0)
+
+    def test_update(self):
+        old_version = build(self.archive, bibxml_dir=BIBXML_DIR)
+        old_file = get_reference_file("RFC2119", BIBXML_DIR)
+        with open(old_file, "rb") as file:
+            old_reference = file.read()
+
+        archive = "".join([TEMPORARY_DATA_DIR, "update.tgz"])
+        reference = self.reference.replace(b"Key words", b"Keywords")
+        create_archive(
+            archive,
+            {TEST_REFERENCE: reference, "reference.RFC.8174.xml": TEST_REFERENCE_8174},
+        )
+        version = build(archive, bibxml_dir=BIBXML_DIR, incremental=True)
+
+        self.assertNotEqual(version, old_version)
+        self.assertEqual(get_stats(BIBXML_DIR)["references"], 2)
+        self.assertIsNotNone(get_reference_file("RFC8174", BIBXML_DIR))
+        with open(get_reference_file("RFC2119", BIBXML_DIR), "rb") as file:
+            self.assertEqual(file.read(), reference)
+
+        # previous version is left untouched
+        old_file = path.join(BIBXML_DIR, "versions", old_version, TEST_REFERENCE)
+        with open(old_file, "rb") as file:
+            self.assertEqual(file.read(), old_reference)
+
+    def test_get_stats_app_config(self):
+        build(self.archive, bibxml_dir=BIBXML_DIR)
+        app = create_app(
+            {"UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR), "BIBXML_DIR": BIBXML_DIR}
+        )
+
+        with app.app_context():
+            self.assertEqual(get_stats()["references"], 1)
+
+    def test_seed_refcache(self):
+        self.assertEqual(seed_refcache(REFCACHE_DIR, BIBXML_DIR), 0)
+
+        build(self.archive, bibxml_dir=BIBXML_DIR)
+
+        self.assertEqual(seed_refcache(REFCACHE_DIR, BIBXML_DIR), 1)
+        self.assertTrue(Path(REFCACHE_DIR, TEST_REFERENCE).exists())
+        # fresh entries are not copied again
+        self.assertEqual(seed_refcache(REFCACHE_DIR, BIBXML_DIR), 0)
+
+    def test_main(self):
+        self.assertEqual(main(["--dir", BIBXML_DIR, "build", self.archive]), 0)
+        self.assertEqual(main(["--dir", BIBXML_DIR, "seed", REFCACHE_DIR]), 0)
+        self.assertTrue(Path(REFCACHE_DIR, TEST_REFERENCE).exists())
+        self.assertEqual(main(["--dir", BIBXML_DIR, "update", "missing.tgz"]), 1)
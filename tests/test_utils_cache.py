@@ -0,0 +1,136 @@
+from os import utime
+from pathlib import Path
+from shutil import rmtree
+from unittest import TestCase
+from zlib import compress
+
+from at import create_app
+from at.utils.cache import (
+    get_cache,
+    get_cache_stats,
+    get_fingerprint,
+    CompressedLRUCache,
+    DiskCache,
+    LRUCache,
+)
+
+CACHE_DIR = "./tests/tmp/cache/"
+
+
+class TestUtilsCache(TestCase):
+    """Tests for at.utils.cache"""
+
+    def test_lru_cache_get_set(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("foo", "bar")
+
+        self.assertEqual(cache.get("foo"), "bar")
+        self.assertIsNone(cache.get("bar"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertEqual(cache.stats()["hit_ratio"], 0.5)
+
+    def test_lru_cache_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("foo", 1)
+        cache.set("bar", 2)
+        cache.get("foo")  # foo is now the most recently used entry
+        cache.set("baz", 3)
+
+        self.assertIn("foo", cache)
+        self.assertNotIn("bar", cache)
+        self.assertIn("baz", cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_lru_cache_delete(self):
+        cache = LRUCache()
+        cache.set("foo", "bar")
+        cache.delete("foo")
+        cache.delete("foo")
+
+        self.assertNotIn("foo", cache)
+
+    def test_compressed_lru_cache(self):
+        cache = CompressedLRUCache(maxsize=2)
+        cache.set("foo", "<html>" * 100)
+        cache.set("foo", "<html>" * 100)
+
+        self.assertEqual(cache.get("foo"), "<html>" * 100)
+        self.assertIsNone(cache.get("bar"))
+        self.assertLess(cache.stats()["bytes"], 600)
+
+        cache.set("bar", "bar")
+        cache.set("baz", "baz")
+
+        self.assertNotIn("foo", cache)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["bytes"], 2 * len(compress(b"bar")))
+
+    def test_disk_cache_get_set(self):
+        cache = DiskCache(CACHE_DIR, maxsize=10)
+        self.addCleanup(rmtree, CACHE_DIR, ignore_errors=True)
+        cache.set("foo", b"bar")
+        cache.set("toolarge", b"x" * 11)
+
+        self.assertEqual(cache.get("foo"), b"bar")
+        self.assertIsNone(cache.get("bar"))
+        self.assertIsNone(cache.get("toolarge"))
+        # cache is shared through the directory
+        self.assertEqual(DiskCache(CACHE_DIR, maxsize=10).get("foo"), b"bar")
+
+        stats = cache.stats()
+        self.assertEqual(stats["size"], 1)
+        self.assertEqual(stats["bytes"], 3)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["bytes_saved"], 3)
+
+    def test_disk_cache_open_set_file(self):
+        cache = DiskCache(CACHE_DIR, maxsize=10)
+        self.addCleanup(rmtree, CACHE_DIR, ignore_errors=True)
+        filename = Path(CACHE_DIR, ".foo")
+        Path(CACHE_DIR).mkdir()
+        filename.write_bytes(b"bar")
+        cache.set_file("foo", filename)
+
+        with cache.open("foo") as file:
+            self.assertEqual(file.read(), b"bar")
+        self.assertIsNone(cache.open("bar"))
+        self.assertEqual(cache.stats()["bytes_saved"], 3)
+
+    def test_disk_cache_eviction(self):
+        cache = DiskCache(CACHE_DIR, maxsize=10)
+        self.addCleanup(rmtree, CACHE_DIR, ignore_errors=True)
+        cache.set("foo", b"1234")
+        utime(cache.get_filename("foo"), (1, 1))
+        cache.set("bar", b"1234")
+        utime(cache.get_filename("bar"), (2, 2))
+        cache.get("foo")  # foo is now the most recently used entry
+        cache.set("baz", b"1234")
+
+        self.assertIsNotNone(cache.get("foo"))
+        self.assertIsNone(cache.get("bar"))
+        self.assertIsNotNone(cache.get("baz"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_get_cache(self):
+        app = create_app({"REQUIRE_AUTH": False})
+
+        with app.app_context():
+            cache = get_cache("foobar", maxsize=10)
+            cache.set("foo", "bar")
+
+            self.assertIs(get_cache("foobar"), cache)
+            self.assertEqual(get_cache_stats()["foobar"]["size"], 1)
+            self.assertEqual(get_cache_stats()["foobar"]["maxsize"], 10)
+
+    def test_get_fingerprint(self):
+        self.assertEqual(
+            get_fingerprint({"foo": "1", "bar": "2"}),
+            get_fingerprint({"bar": "2", "foo": "1"}),
+        )
+        self.assertNotEqual(
+            get_fingerprint({"foo": "1"}), get_fingerprint({"foo": "2"})
+        )
+        self.assertEqual(len(get_fingerprint(None)), 64)
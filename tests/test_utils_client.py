@@ -0,0 +1,93 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep
+from unittest import TestCase
+from unittest.mock import patch
+
+from requests.exceptions import ConnectionError
+
+from at import create_app
+from at.utils.client import get, get_session, get_stats, post
+
+
+class HTTPRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    failures = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=b"ok"):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass  # client timed out
+
+    def do_GET(self):
+        if self.path == "/slow":
+            sleep(1)
+        elif self.path.startswith("/flaky"):
+            # fail first request of each path
+            if self.failures.setdefault(self.path, 0) == 0:
+                self.failures[self.path] += 1
+                return self.reply(503)
+        self.reply(200)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path.startswith("/flaky"):
+            return self.reply(503)
+        self.reply(200)
+
+
+class TestUtilsClient(TestCase):
+    """Tests for at.utils.client"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), HTTPRequestHandler)
+        cls.url = "http://127.0.0.1:{}".format(cls.server.server_address[1])
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_get_session(self):
+        self.assertIs(get_session(), get_session())
+
+    def test_connection_reuse(self):
+        before = get_stats()
+
+        for _ in range(3):
+            with get(self.url + "/") as response:
+                self.assertEqual(response.status_code, 200)
+
+        stats = get_stats()
+        self.assertEqual(stats["requests"] - before["requests"], 3)
+        self.assertGreaterEqual(stats["reused"] - before["reused"], 2)
+        self.assertGreater(stats["reuse_ratio"], 0)
+
+    def test_get_retry(self):
+        with get(self.url + "/flaky-get") as response:
+            self.assertEqual(response.status_code, 200)
+
+    def test_post_no_retry(self):
+        with post(self.url + "/flaky-post", data={"foo": "bar"}) as response:
+            self.assertEqual(response.status_code, 503)
+
+    def test_default_timeout(self):
+        with patch("at.utils.client.READ_TIMEOUT", 0.1):
+            with self.assertRaises(ConnectionError):
+                get(self.url + "/slow")
+
+    def test_default_timeout_app_config(self):
+        app = create_app({"HTTP_READ_TIMEOUT": 0.1})
+
+        with app.app_context():
+            with self.assertRaises(ConnectionError):
+                get(self.url + "/slow")
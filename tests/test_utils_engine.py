@@ -0,0 +1,153 @@
+from logging import disable as set_logger, INFO, CRITICAL
+from pathlib import Path
+from shutil import copy, rmtree
+from subprocess import run
+from unittest import TestCase
+from unittest.mock import patch
+
+from at.utils.engine import (
+    get_args,
+    get_options,
+    process_document,
+    render_document,
+    run_pipeline,
+    run_xml2rfc,
+    EngineError,
+)
+from at.utils.logs import process_xml2rfc_log
+
+TEST_DATA_DIR = "./tests/data/"
+TEST_XML_DRAFT = "draft-smoke-signals-00.xml"
+TEST_XML_V2_DRAFT = "draft-smoke-signals-00.v2.xml"
+TEST_XML_ERROR = "draft-smoke-signals-00.error.xml"
+TEST_XML_INVALID = "draft-smoke-signals-00.invalid.xml"
+TEST_DATA = [TEST_XML_DRAFT, TEST_XML_V2_DRAFT, TEST_XML_ERROR, TEST_XML_INVALID]
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+
+
+class TestUtilsEngine(TestCase):
+    """Tests for at.utils.engine"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(TEMPORARY_DATA_DIR).mkdir(exist_ok=True)
+        # create copies of test data in temporary data dir
+        for file in TEST_DATA:
+            original = "".join([TEST_DATA_DIR, file])
+            new = "".join([TEMPORARY_DATA_DIR, file])
+            copy(original, new)
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def test_get_args(self):
+        self.assertEqual(
+            get_args("foo.xml", "foo.txt"), ["xml2rfc", "--out", "foo.txt", "foo.xml"]
+        )
+        self.assertEqual(
+            get_args("foo.xml", "foo.html", format="html"),
+            ["xml2rfc", "--html", "--out", "foo.html", "foo.xml"],
+        )
+        self.assertEqual(
+            get_args("foo.xml", "foo.txt", warn_bare_unicode=True),
+            ["xml2rfc", "--warn-bare-unicode", "--out", "foo.txt", "foo.xml"],
+        )
+
+    def test_get_options(self):
+        options = get_options("html", warn_bare_unicode=True)
+
+        self.assertTrue(options.html)
+        self.assertFalse(options.text)
+        self.assertTrue(options.warn_bare_unicode)
+        self.assertEqual(options.vocabulary, "v3")
+        self.assertEqual(get_options("v2v3").vocabulary, "v2")
+
+    def test_render_document_unsupported_format(self):
+        with self.assertRaises(EngineError):
+            render_document("".join([TEMPORARY_DATA_DIR, TEST_XML_DRAFT]), "", "flac")
+
+    def test_run_xml2rfc(self):
+        for filename in TEST_DATA:
+            source = "".join([TEMPORARY_DATA_DIR, filename])
+            for format, ext in (("text", "txt"), ("html", "html"), ("v2v3", "v3.xml")):
+                output = "".join([source, ".engine.", ext])
+                expected = run(
+                    get_args(source, "".join([source, ".cli.", ext]), format),
+                    capture_output=True,
+                )
+
+                result = run_xml2rfc(source, output, format=format)
+
+                self.assertEqual(result.returncode, expected.returncode)
+                self.assertEqual(
+                    process_xml2rfc_log(result, source),
+                    process_xml2rfc_log(expected, source),
+                )
+                if result.returncode == 0:
+                    self.assertTrue(Path(output).exists())
+
+    @patch("at.utils.engine.WORKERS", 0)
+    def test_run_xml2rfc_without_engine(self):
+        source = "".join([TEMPORARY_DATA_DIR, TEST_XML_DRAFT])
+        output = "".join([TEMPORARY_DATA_DIR, "draft.txt"])
+
+        result = run_xml2rfc(source, output)
+
+        self.assertEqual(result.returncode, 0)
+        self.assertTrue(Path(output).exists())
+
+    def test_process_document_unsupported_format(self):
+        with self.assertRaises(EngineError):
+            process_document(
+                "".join([TEMPORARY_DATA_DIR, TEST_XML_DRAFT]), "", {"flac": ""}
+            )
+
+    def test_run_pipeline(self):
+        for filename in TEST_DATA:
+            source = "".join([TEMPORARY_DATA_DIR, filename])
+            xml_file = "".join([source, ".v3.xml"])
+            outputs = {
+                "text": "".join([source, ".txt"]),
+                "html": "".join([source, ".html"]),
+            }
+
+            version, results = run_pipeline(source, xml_file, outputs)
+
+            if filename == TEST_XML_ERROR:
+                self.assertIsNone(version)
+                self.assertEqual(results["xml"].returncode, 1)
+                self.assertNotIn("text", results)
+                continue
+
+            self.assertIn(version, ("2", "3"))
+            self.assertEqual(Path(xml_file).exists(), version == "2")
+            for format, output in outputs.items():
+                expected = run(
+                    get_args(xml_file if version == "2" else source, output, format),
+                    capture_output=True,
+                )
+                self.assertEqual(results[format].returncode, expected.returncode)
+                if version == "3":
+                    self.assertEqual(
+                        process_xml2rfc_log(results[format], source),
+                        process_xml2rfc_log(expected, source),
+                    )
+
+    @patch("at.utils.engine.WORKERS", 0)
+    def test_run_pipeline_without_engine(self):
+        source = "".join([TEMPORARY_DATA_DIR, TEST_XML_V2_DRAFT])
+        xml_file = "".join([TEMPORARY_DATA_DIR, "draft.v3.xml"])
+        output = "".join([TEMPORARY_DATA_DIR, "draft.txt"])
+
+        version, results = run_pipeline(source, xml_file, {"text": output})
+
+        self.assertEqual(version, "2")
+        self.assertEqual(results["xml"].returncode, 0)
+        self.assertEqual(results["text"].returncode, 0)
+        self.assertTrue(Path(xml_file).exists())
+        self.assertTrue(Path(output).exists())
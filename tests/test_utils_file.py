@@ -1,3 +1,4 @@
+from hashlib import sha256
 from logging import disable as set_logger, INFO, CRITICAL
 from pathlib import Path
 from shutil import rmtree
@@ -6,6 +7,7 @@ from unittest import TestCase
 from faker import Faker
 from hypothesis import given, assume
 from hypothesis.strategies import text
+import responses
 from werkzeug.datastructures import FileStorage
 
 from at.utils.file import (
@@ -13,14 +15,20 @@ from at.utils.file import (
     cleanup_output,
     get_file,
     get_filename,
+    get_immutable_url,
     get_name,
     get_name_with_revision,
+    get_path_hash,
+    path_hashes,
     save_file,
     save_file_from_text,
     save_file_from_url,
+    workspace,
     ALLOWED_EXTENSIONS,
     ALLOWED_EXTENSIONS_BY_PROCESS,
     DownloadError,
+    FileSizeError,
+    document_cache,
 )
 
 TEST_DATA_DIR = "./tests/data/"
@@ -107,6 +115,21 @@ class TestUtilsFile(TestCase):
                 self.assertTrue(Path(dir_path).exists())
                 self.assertTrue(Path(file_path).exists())
 
+    def test_save_file_max_size(self):
+        filename = "".join([TEST_DATA_DIR, TEST_XML_DRAFT])
+        with open(filename, "rb") as file:
+            file_object = FileStorage(file, filename=TEST_XML_DRAFT)
+            with self.assertRaises(FileSizeError):
+                save_file(file_object, TEMPORARY_DATA_DIR, max_size=1024)
+
+            dir_path, file_path = save_file(file_object, TEMPORARY_DATA_DIR)
+
+        # hash is computed while saving
+        with open(filename, "rb") as file:
+            digest = sha256(file.read()).hexdigest()
+        self.assertEqual(path_hashes.get(file_path)[1], digest)
+        self.assertEqual(get_path_hash(file_path), digest)
+
     @given(text())
     def test_save_file_from_text(self, text):
         dir_path, file_path = save_file_from_text(text, TEMPORARY_DATA_DIR)
@@ -117,6 +140,21 @@ class TestUtilsFile(TestCase):
         with open(file_path, "r", newline="") as file:
             self.assertEqual(text, "".join(file.readlines()))
 
+    def test_workspace(self):
+        with workspace(TEMPORARY_DATA_DIR) as upload_dir:
+            dir_path, file_path = save_file_from_text("foobar", upload_dir)
+            self.assertTrue(Path(file_path).exists())
+
+        self.assertFalse(Path(upload_dir).exists())
+
+    def test_workspace_on_exception(self):
+        with self.assertRaises(ValueError):
+            with workspace(TEMPORARY_DATA_DIR) as upload_dir:
+                save_file_from_text("foobar", upload_dir)
+                raise ValueError
+
+        self.assertFalse(Path(upload_dir).exists())
+
     def test_save_file_from_url_connection_error(self):
         with self.assertRaises(DownloadError) as error:
             save_file_from_url("https://example.foobar/draft.txt", TEMPORARY_DATA_DIR)
@@ -141,6 +179,49 @@ class TestUtilsFile(TestCase):
         self.assertTrue(Path(dir_path).exists())
         self.assertTrue(Path(file_path).exists())
 
+    @responses.activate
+    def test_save_file_from_url_max_size(self):
+        url = "https://example.com/draft-foo-bar.txt"
+        responses.add(responses.GET, url, body=b"x" * 2048, status=200)
+
+        with self.assertRaises(DownloadError) as error:
+            save_file_from_url(url, TEMPORARY_DATA_DIR, max_size=1024)
+        self.assertEqual(str(error.exception), "File is larger than 1024 bytes")
+
+        dir_path, file_path = save_file_from_url(url, TEMPORARY_DATA_DIR)
+        self.assertEqual(get_path_hash(file_path), sha256(b"x" * 2048).hexdigest())
+
+    def test_save_file_from_url_cached(self):
+        url = "https://www.ietf.org/archive/id/draft-smoke-signals-00.txt"
+        cache_key = get_immutable_url(url)
+        self.addCleanup(Path(document_cache.get_filename(cache_key)).unlink, True)
+        with open("".join([TEST_DATA_DIR, TEST_TEXT_DRAFT]), "rb") as file:
+            content = file.read()
+        document_cache.set(cache_key, content)
+
+        dir_path, file_path = save_file_from_url(url, TEMPORARY_DATA_DIR)
+
+        with open(file_path, "rb") as file:
+            self.assertEqual(file.read(), content)
+
+    def test_get_immutable_url(self):
+        self.assertEqual(
+            get_immutable_url("http://WWW.ietf.org/archive/id/draft-foo-bar-07.txt"),
+            "https://www.ietf.org/archive/id/draft-foo-bar-07.txt",
+        )
+        self.assertEqual(
+            get_immutable_url("https://www.rfc-editor.org/rfc/rfc8855.xml"),
+            "https://www.rfc-editor.org/rfc/rfc8855.xml",
+        )
+        for url in (
+            "https://www.ietf.org/archive/id/draft-foo-bar.txt",
+            "https://www.ietf.org/archive/id/draft-foo-bar-07.txt?foo=bar",
+            "https://example.com/draft-foo-bar-07.txt",
+            "https://www.rfc-editor.org/rfc/rfc8855.html",
+            "ftp://www.ietf.org/rfc/rfc8855.txt",
+        ):
+            self.assertIsNone(get_immutable_url(url))
+
     @given(text())
     def test_get_name_non_standarded(self, filename):
         for prefix in ["draft-", "rfc"]:
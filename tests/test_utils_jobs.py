@@ -0,0 +1,163 @@
+from logging import disable as set_logger, INFO, CRITICAL
+from pathlib import Path
+from shutil import rmtree
+from time import time
+from unittest import TestCase
+
+import responses
+
+from at.utils.jobs import (
+    get_job_store,
+    JobError,
+    JobRunner,
+    SQLiteJobStore,
+    DONE,
+    FAILED,
+    JOB_TTL,
+    QUEUED,
+    RUNNING,
+)
+
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+JOBS_DB = "".join([TEMPORARY_DATA_DIR, "jobs.db"])
+CALLBACK_URL = "https://example.org/callback"
+
+
+class TestUtilsJobs(TestCase):
+    """Tests for at.utils.jobs"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(TEMPORARY_DATA_DIR).mkdir(exist_ok=True)
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def get_store(self):
+        return SQLiteJobStore(JOBS_DB)
+
+    def test_get_job_store(self):
+        self.assertIsInstance(get_job_store(None, TEMPORARY_DATA_DIR), SQLiteJobStore)
+        self.assertEqual(get_job_store(JOBS_DB, TEMPORARY_DATA_DIR).db_file, JOBS_DB)
+
+    def test_job_lifecycle(self):
+        store = self.get_store()
+        job_id = store.create("foo", {"bar": "baz"})
+
+        self.assertEqual(store.get(job_id)["status"], QUEUED)
+        self.assertIsNone(store.get("foobar"))
+
+        job = store.claim()
+        self.assertEqual(job["id"], job_id)
+        self.assertEqual(job["params"], {"bar": "baz"})
+        self.assertEqual(store.get(job_id)["status"], RUNNING)
+        self.assertIsNone(store.claim())
+
+        store.finish(job_id, result={"foo": "bar"})
+        job = store.get(job_id)
+        self.assertEqual(job["status"], DONE)
+        self.assertEqual(job["result"], {"foo": "bar"})
+
+        stats = store.stats()
+        self.assertEqual(stats[DONE], 1)
+        self.assertEqual(stats[QUEUED], 0)
+
+    def test_claim_job_order(self):
+        store = self.get_store()
+        first = store.create("foo", {})
+        second = store.create("foo", {})
+
+        self.assertEqual(store.claim()["id"], first)
+        self.assertEqual(store.claim()["id"], second)
+
+    def test_claim_job_lease(self):
+        store = self.get_store()
+        job_id = store.create("foo", {})
+        store.claim()
+
+        # simulate a job left running by a restarted worker
+        connection = store.get_connection()
+        connection.execute("UPDATE jobs SET updated = ?", (time() - 3600,))
+        connection.close()
+
+        # heartbeat renews the lease
+        store.heartbeat([job_id])
+        self.assertIsNone(store.claim(lease_time=60))
+
+        connection = store.get_connection()
+        connection.execute("UPDATE jobs SET updated = ?", (time() - 3600,))
+        connection.close()
+
+        self.assertEqual(store.claim(lease_time=60)["id"], job_id)
+
+    def test_finished_job_expiry(self):
+        store = self.get_store()
+        old_job = store.create("foo", {})
+        store.claim()
+        store.finish(old_job, result={})
+
+        # simulate a job finished before JOB_TTL
+        connection = store.get_connection()
+        connection.execute("UPDATE jobs SET updated = ?", (time() - JOB_TTL - 3600,))
+        connection.close()
+
+        queued_job = store.create("foo", {})
+        job_id = store.create("foo", {})
+        store.finish(job_id, error="foobar")
+
+        self.assertIsNone(store.get(old_job))
+        self.assertEqual(store.get(queued_job)["status"], QUEUED)
+        self.assertEqual(store.get(job_id)["status"], FAILED)
+
+    def test_runner_process(self):
+        def handler(params, logger):
+            if params.get("fail"):
+                raise JobError("foobar")
+            return {"foo": params["foo"]}
+
+        store = self.get_store()
+        runner = JobRunner(store, handlers={"foo": handler})
+
+        for params, kind, status, error in (
+            ({"foo": "bar"}, "foo", DONE, None),
+            ({"fail": True}, "foo", FAILED, "foobar"),
+            ({}, "bar", FAILED, "Unknown job: bar"),
+            ({}, "foo", FAILED, "Error running job"),
+        ):
+            job_id = store.create(kind, params)
+            runner.process(store.claim())
+            job = store.get(job_id)
+
+            self.assertEqual(job["status"], status)
+            self.assertEqual(job["error"], error)
+
+    @responses.activate
+    def test_runner_callback(self):
+        responses.add(responses.POST, CALLBACK_URL, status=200)
+        store = self.get_store()
+        runner = JobRunner(store, handlers={"foo": lambda params, logger: {}})
+        job_id = store.create("foo", {}, callback=CALLBACK_URL)
+
+        runner.process(store.claim())
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertIn(job_id.encode(), responses.calls[0].request.body)
+
+    def test_runner_start_stop(self):
+        store = self.get_store()
+        runner = JobRunner(store, handlers={"foo": lambda params, logger: {}})
+        job_id = store.create("foo", {})
+
+        runner.start()
+        for _ in range(50):
+            if store.get(job_id)["status"] == DONE:
+                break
+            runner._stopped.wait(0.1)
+        runner.stop()
+
+        self.assertEqual(store.get(job_id)["status"], DONE)
@@ -0,0 +1,79 @@
+from logging import disable as set_logger, INFO, CRITICAL
+from os.path import abspath
+from pathlib import Path
+from shutil import copy, rmtree
+from unittest import TestCase
+from unittest.mock import patch
+
+from at.utils.kramdown import ping, run_kramdown, start_server, stop_server
+from at.utils.runner import limiter
+
+TEST_DATA_DIR = "./tests/data/"
+TEST_KRAMDOWN_DRAFT = "draft-smoke-signals-00.md"
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+SOCKET = abspath("".join([TEMPORARY_DATA_DIR, "kramdown-rfc.sock"]))
+
+
+class TestUtilsKramdown(TestCase):
+    """Tests for at.utils.kramdown"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(TEMPORARY_DATA_DIR).mkdir(exist_ok=True)
+        # create copies of test data in temporary data dir
+        original = "".join([TEST_DATA_DIR, TEST_KRAMDOWN_DRAFT])
+        new = "".join([TEMPORARY_DATA_DIR, TEST_KRAMDOWN_DRAFT])
+        copy(original, new)
+        # use a kramdown-rfc server of the test
+        self.socket = patch("at.utils.kramdown.SOCKET", SOCKET)
+        self.socket.start()
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # stop kramdown-rfc server of the test
+        stop_server()
+        self.socket.stop()
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def test_run_kramdown(self):
+        output = run_kramdown(
+            ["kramdown-rfc", "--v3", "".join([TEMPORARY_DATA_DIR, TEST_KRAMDOWN_DRAFT])]
+        )
+
+        self.assertEqual(output.returncode, 0)
+        self.assertIn(b"<rfc", output.stdout)
+        self.assertTrue(ping())
+
+    def test_run_kramdown_process_slot(self):
+        running = []
+
+        def send_request(request, timeout):
+            running.append(limiter.stats()["running"])
+            return {"returncode": 0, "stdout": "", "stderr": "", "timeout": False}
+
+        with patch("at.utils.kramdown.send_request", side_effect=send_request):
+            output = run_kramdown(["kramdown-rfc", "--v3", "foobar.md"])
+
+        self.assertEqual(output.returncode, 0)
+        # server round trip holds a process slot
+        self.assertEqual(running, [1])
+        self.assertEqual(limiter.stats()["running"], 0)
+
+    def test_run_kramdown_other_tool(self):
+        output = run_kramdown(["echo", "foobar"])
+
+        self.assertEqual(output.returncode, 0)
+        self.assertEqual(output.stdout, b"foobar\n")
+
+    def test_ping_without_server(self):
+        self.assertFalse(ping())
+
+    def test_stop_server(self):
+        start_server()
+        stop_server()
+
+        self.assertFalse(ping())
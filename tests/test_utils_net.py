@@ -1,15 +1,21 @@
 from logging import disable as set_logger, INFO, CRITICAL
+from time import sleep
 from unittest import TestCase
+from unittest.mock import patch
 
 import responses
+from requests.exceptions import ConnectionError
 
 from at.utils.net import (
     get_both,
     get_latest,
+    get_metadata_stats,
     get_previous,
     is_valid_url,
     is_url,
+    metadata_cache,
     InvalidURL,
+    DatatrackerUnavailable,
     DocumentNotFound,
 )
 
@@ -22,6 +28,7 @@ class TestUtilsNet(TestCase):
     def setUp(self):
         # susspress logging messages
         set_logger(CRITICAL)
+        metadata_cache.clear()
 
     def tearDown(self):
         # set logging to INFO
@@ -211,3 +218,95 @@ class TestUtilsNet(TestCase):
             str(error.exception),
             "Can not find url for the latest document on datatracker",
         )
+
+    @responses.activate
+    def test_get_latest_cached(self):
+        draft = "draft-foo-bar"
+        url = "/".join([DT_LATEST_DRAFT_URL, draft])
+        content_url = "https://www.ietf.org/archive/id/draft-foo-bar-01.txt"
+        responses.add(responses.GET, url, json={"content_url": content_url})
+
+        self.assertEqual(get_latest(draft, DT_LATEST_DRAFT_URL), content_url)
+        self.assertEqual(get_latest(draft, DT_LATEST_DRAFT_URL), content_url)
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_get_latest_not_found_cached(self):
+        rfc = "rfc0"
+        responses.add(responses.GET, "/".join([DT_LATEST_DRAFT_URL, rfc]), status=404)
+
+        for _ in range(2):
+            with self.assertRaises(DocumentNotFound):
+                get_latest(rfc, DT_LATEST_DRAFT_URL)
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_get_latest_stale(self):
+        draft = "draft-foo-bar"
+        url = "/".join([DT_LATEST_DRAFT_URL, draft])
+        old_url = "https://www.ietf.org/archive/id/draft-foo-bar-01.txt"
+        new_url = "https://www.ietf.org/archive/id/draft-foo-bar-02.txt"
+        responses.add(responses.GET, url, json={"content_url": old_url})
+        stale_served = get_metadata_stats()["stale_served"]
+
+        with patch("at.utils.net.LATEST_TTL", -1):
+            self.assertEqual(get_latest(draft, DT_LATEST_DRAFT_URL), old_url)
+
+        # expired entry is served while it gets refreshed in the background
+        responses.replace(responses.GET, url, json={"content_url": new_url})
+        self.assertEqual(get_latest(draft, DT_LATEST_DRAFT_URL), old_url)
+        for _ in range(50):
+            if len(responses.calls) == 2:
+                break
+            sleep(0.1)
+        sleep(0.1)
+        self.assertEqual(get_latest(draft, DT_LATEST_DRAFT_URL), new_url)
+        self.assertEqual(get_metadata_stats()["stale_served"], stale_served + 1)
+
+    @responses.activate
+    def test_get_latest_stale_on_error(self):
+        draft = "draft-foo-bar"
+        url = "/".join([DT_LATEST_DRAFT_URL, draft])
+        content_url = "https://www.ietf.org/archive/id/draft-foo-bar-01.txt"
+        responses.add(responses.GET, url, json={"content_url": content_url})
+
+        with patch("at.utils.net.LATEST_TTL", -1):
+            get_latest(draft, DT_LATEST_DRAFT_URL)
+
+        responses.replace(responses.GET, url, body=ConnectionError())
+        with patch("at.utils.net.STALE_TTL", 0):
+            self.assertEqual(get_latest(draft, DT_LATEST_DRAFT_URL), content_url)
+
+    @responses.activate
+    def test_get_latest_server_error(self):
+        draft = "draft-foo-bar"
+        url = "/".join([DT_LATEST_DRAFT_URL, draft])
+        content_url = "https://www.ietf.org/archive/id/draft-foo-bar-01.txt"
+        responses.add(responses.GET, url, status=503)
+
+        # server errors are not found and not cached
+        with self.assertRaises(DocumentNotFound):
+            get_latest(draft, DT_LATEST_DRAFT_URL)
+
+        responses.replace(responses.GET, url, json={"content_url": content_url})
+        with patch("at.utils.net.LATEST_TTL", -1):
+            self.assertEqual(get_latest(draft, DT_LATEST_DRAFT_URL), content_url)
+
+        # stale entry is served and kept
+        responses.replace(responses.GET, url, status=429)
+        with patch("at.utils.net.STALE_TTL", 0):
+            self.assertEqual(get_latest(draft, DT_LATEST_DRAFT_URL), content_url)
+            self.assertEqual(get_latest(draft, DT_LATEST_DRAFT_URL), content_url)
+        self.assertEqual(len(responses.calls), 4)
+
+    @responses.activate
+    def test_get_latest_unavailable_error(self):
+        draft = "draft-foo-bar"
+        url = "/".join([DT_LATEST_DRAFT_URL, draft])
+        responses.add(responses.GET, url, body=ConnectionError())
+
+        with self.assertRaises(DatatrackerUnavailable):
+            get_latest(draft, DT_LATEST_DRAFT_URL)
+
+        # not cached
+        self.assertIsNone(metadata_cache.get(url))
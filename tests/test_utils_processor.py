@@ -10,12 +10,14 @@ from at.utils.processor import (
     convert_v2v3,
     get_html,
     get_pdf,
+    get_rendered,
     get_text,
     get_xml,
     kramdown2xml,
     md2xml,
     mmark2xml,
     process_file,
+    process_xml,
     txt2xml,
     rst2xml,
     ProcessingError,
@@ -176,6 +178,45 @@ class TestUtilsProcessor(TestCase):
         with self.assertRaises(ProcessingError):
             saved_file, logs = get_pdf("".join([TEMPORARY_DATA_DIR, TEST_XML_ERROR]))
 
+    def test_process_xml(self):
+        xml_file, logs, outputs = process_xml(
+            "".join([TEMPORARY_DATA_DIR, TEST_XML_V2_DRAFT]), formats=["text", "html"]
+        )
+
+        self.assertTrue(Path(xml_file).exists())
+        self.assertEqual(Path(xml_file).suffix, ".xml")
+        self.assertIn("errors", logs.keys())
+        self.assertIn("warnings", logs.keys())
+        for format, suffix in (("text", ".txt"), ("html", ".html")):
+            saved_file, output = outputs[format]
+            self.assertEqual(output.returncode, 0)
+            self.assertTrue(Path(saved_file).exists())
+            self.assertEqual(Path(saved_file).suffix, suffix)
+
+    def test_process_xml_error(self):
+        with self.assertRaises(ProcessingError):
+            process_xml("".join([TEMPORARY_DATA_DIR, TEST_XML_ERROR]), ["text"])
+
+    def test_get_rendered(self):
+        xml_file, rendered, logs = get_rendered(
+            "".join([TEMPORARY_DATA_DIR, TEST_XML_DRAFT]), formats=["text"]
+        )
+
+        self.assertEqual(xml_file, "".join([TEMPORARY_DATA_DIR, TEST_XML_DRAFT]))
+        self.assertTrue(Path(rendered["text"]).exists())
+        self.assertEqual(Path(rendered["text"]).suffix, ".txt")
+        self.assertIn("errors", logs.keys())
+        self.assertIn("warnings", logs.keys())
+
+    def test_get_rendered_xml(self):
+        xml_file, rendered, logs = get_rendered(
+            "".join([TEMPORARY_DATA_DIR, TEST_XML_V2_DRAFT])
+        )
+
+        self.assertTrue(Path(xml_file).exists())
+        self.assertEqual(rendered, {})
+        self.assertGreater(len(logs["warnings"]), 0)
+
     def test_clean_svg_ids(self):
         saved_file = clean_svg_ids("".join([TEMPORARY_DATA_DIR, TEST_XML_DRAFT]))
 
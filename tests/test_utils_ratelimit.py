@@ -0,0 +1,105 @@
+from logging import disable as set_logger, INFO, CRITICAL
+from os.path import abspath
+from pathlib import Path
+from shutil import rmtree
+from unittest import TestCase
+from unittest.mock import patch
+
+from at import create_app
+from at.utils.ratelimit import get_client_id, get_stats, RateLimiter
+
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+DT_APPAUTH_URL = "https://example.com/"
+VALID_API_KEY = "foobar"
+
+
+class TestUtilsRateLimit(TestCase):
+    """Tests for at.utils.ratelimit"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(TEMPORARY_DATA_DIR).mkdir(exist_ok=True)
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def test_get_client_id(self):
+        client = get_client_id(VALID_API_KEY)
+
+        self.assertEqual(len(client), 16)
+        self.assertNotIn(VALID_API_KEY, client)
+        self.assertEqual(client, get_client_id(VALID_API_KEY))
+
+    def test_take(self):
+        limiter = RateLimiter(rate=0.5, burst=2)
+
+        with patch("at.utils.ratelimit.monotonic", return_value=100):
+            self.assertIsNone(limiter.take("ci"))
+            self.assertIsNone(limiter.take("ci"))
+            self.assertEqual(limiter.take("ci"), 2)
+            # other clients have their own buckets
+            self.assertIsNone(limiter.take("user"))
+
+        with patch("at.utils.ratelimit.monotonic", return_value=102):
+            self.assertIsNone(limiter.take("ci"))
+            self.assertEqual(limiter.take("ci"), 2)
+
+            stats = limiter.stats()
+
+        self.assertEqual(stats["allowed"], 4)
+        self.assertEqual(stats["throttled"], 2)
+        self.assertEqual(stats["clients"]["ci"]["throttled"], 2)
+        self.assertEqual(stats["clients"]["user"]["tokens"], 2)
+
+    def test_rate_limit(self):
+        config = {
+            "UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR),
+            "DT_APPAUTH_URL": DT_APPAUTH_URL,
+            "REQUIRE_AUTH": True,
+            "RATE_LIMIT": 0.5,
+            "RATE_LIMIT_BURST": 1,
+        }
+        app = create_app(config)
+
+        with patch("at.utils.authentication.validate_apikey", return_value=True):
+            with app.test_client() as client:
+                with app.app_context():
+                    headers = {"X-API-KEY": VALID_API_KEY}
+                    result = client.get("/api/abnf/extract", headers=headers)
+
+                    self.assertEqual(result.status_code, 400)
+
+                    result = client.get("/api/abnf/extract", headers=headers)
+
+                    self.assertEqual(result.status_code, 429)
+                    self.assertEqual(result.headers["Retry-After"], "2")
+
+                    rate_limits = get_stats()
+
+                    self.assertEqual(rate_limits["throttled"], 1)
+                    self.assertEqual(
+                        rate_limits["clients"][get_client_id(VALID_API_KEY)]["allowed"],
+                        1,
+                    )
+
+    def test_rate_limit_disabled(self):
+        config = {
+            "UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR),
+            "DT_APPAUTH_URL": DT_APPAUTH_URL,
+            "REQUIRE_AUTH": True,
+        }
+        app = create_app(config)
+
+        with patch("at.utils.authentication.validate_apikey", return_value=True):
+            with app.test_client() as client:
+                with app.app_context():
+                    headers = {"X-API-KEY": VALID_API_KEY}
+                    for _ in range(3):
+                        result = client.get("/api/abnf/extract", headers=headers)
+
+                        self.assertEqual(result.status_code, 400)
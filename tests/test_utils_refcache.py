@@ -0,0 +1,158 @@
+from logging import disable as set_logger, INFO, CRITICAL
+from os import utime
+from os.path import abspath
+from pathlib import Path
+from shutil import rmtree
+from tarfile import open as open_tarfile
+from time import time
+from unittest import TestCase
+
+from at import create_app
+from at.utils.bibxml import build
+from at.utils.refcache import (
+    create_snapshot,
+    get_entry_names,
+    get_stats,
+    get_url,
+    prefetch_refcache,
+    prewarm,
+    REFCACHE_TTL,
+)
+
+TEST_DATA_DIR = "./tests/data/"
+TEST_REFERENCE = "reference.RFC.2119.xml"
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+REFCACHE_DIR = "./tests/tmp/refcache/"
+BIBXML_DIR = "./tests/tmp/bibxml/"
+TEST_MD = """---
+title: Test
+normative:
+  RFC2119:
+informative:
+  BCP14:
+---
+
+--- abstract
+
+Key words are from {{RFC2119}} and {{!BCP14}}, not RFC 8174.
+"""
+
+
+class TestUtilsRefcache(TestCase):
+    """Tests for at.utils.refcache"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(TEMPORARY_DATA_DIR).mkdir(parents=True, exist_ok=True)
+        self.filename = "".join([TEMPORARY_DATA_DIR, "draft.md"])
+        with open(self.filename, "w") as file:
+            file.write(TEST_MD)
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def test_get_entry_names(self):
+        self.assertEqual(
+            get_entry_names(self.filename),
+            ["reference.RFC.2119.xml", "reference.BCP.0014.xml"],
+        )
+
+    def test_get_url(self):
+        self.assertEqual(
+            get_url("reference.RFC.2119.xml"),
+            "https://bib.ietf.org/public/rfc/bibxml/reference.RFC.2119.xml",
+        )
+        self.assertEqual(
+            get_url("reference.BCP.0014.xml"),
+            "https://bib.ietf.org/public/rfc/bibxml-rfcsubseries/"
+            "reference.BCP.0014.xml",
+        )
+
+    def test_prefetch_refcache(self):
+        archive = "".join([TEMPORARY_DATA_DIR, "bibxml.tgz"])
+        with open_tarfile(archive, "w:gz") as tar:
+            tar.add("".join([TEST_DATA_DIR, TEST_REFERENCE]), arcname=TEST_REFERENCE)
+        build(archive, bibxml_dir=BIBXML_DIR)
+        Path(REFCACHE_DIR).mkdir()
+        # fresh entry is a hit
+        Path(REFCACHE_DIR, "reference.BCP.0014.xml").write_text("<reference/>")
+
+        stats = prefetch_refcache(
+            self.filename, refcache_dir=REFCACHE_DIR, bibxml_dir=BIBXML_DIR
+        )
+
+        self.assertEqual(stats["references"], 2)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["fetched"], 1)
+        self.assertTrue(Path(REFCACHE_DIR, TEST_REFERENCE).exists())
+
+        stats = prefetch_refcache(
+            self.filename, refcache_dir=REFCACHE_DIR, bibxml_dir=BIBXML_DIR
+        )
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["fetched"], 0)
+
+        stats = get_stats(REFCACHE_DIR)
+        self.assertGreaterEqual(stats["hits"], 3)
+        self.assertEqual(stats["entries"], 2)
+        self.assertIsNotNone(stats["hit_ratio"])
+
+    def test_prefetch_refcache_app_config(self):
+        archive = "".join([TEMPORARY_DATA_DIR, "bibxml.tgz"])
+        with open_tarfile(archive, "w:gz") as tar:
+            tar.add("".join([TEST_DATA_DIR, TEST_REFERENCE]), arcname=TEST_REFERENCE)
+        build(archive, bibxml_dir=BIBXML_DIR)
+        Path(REFCACHE_DIR).mkdir()
+        Path(REFCACHE_DIR, "reference.BCP.0014.xml").write_text("<reference/>")
+        # expired with the configured TTL
+        entry = Path(REFCACHE_DIR, TEST_REFERENCE)
+        entry.write_text("<reference/>")
+        old = time() - 120
+        utime(entry, (old, old))
+        app = create_app(
+            {
+                "UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR),
+                "BIBXML_DIR": BIBXML_DIR,
+                "KRAMDOWN_REFCACHEDIR": REFCACHE_DIR,
+                "KRAMDOWN_REFCACHETTL": 60,
+            }
+        )
+
+        with app.app_context():
+            stats = prefetch_refcache(self.filename)
+            self.assertEqual(get_stats()["entries"], 2)
+
+        self.assertEqual(stats["references"], 2)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["fetched"], 1)
+
+    def test_prefetch_refcache_disabled(self):
+        stats = prefetch_refcache(self.filename, refcache_dir=None)
+
+        self.assertEqual(stats["references"], 0)
+
+    def test_snapshot_prewarm(self):
+        Path(REFCACHE_DIR).mkdir()
+        Path(REFCACHE_DIR, TEST_REFERENCE).write_bytes(
+            Path(TEST_DATA_DIR, TEST_REFERENCE).read_bytes()
+        )
+        snapshot = "".join([TEMPORARY_DATA_DIR, "refcache.tgz"])
+
+        self.assertEqual(create_snapshot(snapshot, REFCACHE_DIR), 1)
+
+        cache_dir = "".join([TEMPORARY_DATA_DIR, "pod/"])
+        self.assertEqual(prewarm(snapshot, cache_dir), 1)
+        self.assertTrue(Path(cache_dir, TEST_REFERENCE).exists())
+        # fresh entries are kept
+        self.assertEqual(prewarm(snapshot, cache_dir), 0)
+        # expired entries are replaced
+        expired = time() - REFCACHE_TTL - 1
+        utime(Path(cache_dir, TEST_REFERENCE), (expired, expired))
+        self.assertEqual(prewarm(snapshot, cache_dir), 1)
@@ -0,0 +1,163 @@
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from logging import disable as set_logger, INFO, CRITICAL
+from os.path import abspath
+from pathlib import Path
+from shutil import rmtree
+from tarfile import open as open_tarfile
+from threading import Thread
+from unittest import TestCase
+
+from lxml import etree
+from xml2rfc.parser import CachingResolver
+
+from at import create_app
+from at.utils.bibxml import build
+from at.utils.references import (
+    get_cache_filename,
+    get_reference_urls,
+    prefetch_references,
+)
+
+TEST_DATA_DIR = "./tests/data/"
+TEST_REFERENCE = "reference.RFC.2119.xml"
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+CACHE_DIR = "./tests/tmp/cache/"
+BIBXML_DIR = "./tests/tmp/bibxml/"
+TEST_XML = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE rfc [
+  <!ENTITY RFC8174 SYSTEM "{url}/reference.RFC.8174.xml">
+]>
+<rfc xmlns:xi="http://www.w3.org/2001/XInclude" version="3">
+  <back>
+    <references>
+      <xi:include href="{url}/reference.RFC.2119.xml"/>
+      <xi:include href="{url}/reference.RFC.2119.xml"/>
+      <xi:include href="{url}/reference.RFC.0000"/>
+      <xi:include href="reference.RFC.8446.xml"/>
+    </references>
+  </back>
+</rfc>
+"""
+
+
+class HTTPRequestHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class TestUtilsReferences(TestCase):
+    """Tests for at.utils.references"""
+
+    @classmethod
+    def setUpClass(cls):
+        # local stand-in for bibxml server
+        handler = partial(HTTPRequestHandler, directory=abspath(TEST_DATA_DIR))
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        cls.url = "http://127.0.0.1:{}".format(cls.server.server_address[1])
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(CACHE_DIR).mkdir(parents=True, exist_ok=True)
+        self.filename = "".join([TEMPORARY_DATA_DIR, "draft.xml"])
+        with open(self.filename, "w") as file:
+            file.write(TEST_XML.format(url=self.url))
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def test_get_reference_urls(self):
+        urls = get_reference_urls(self.filename)
+
+        self.assertEqual(
+            urls,
+            [
+                "/".join([self.url, "reference.RFC.2119.xml"]),
+                "/".join([self.url, "reference.RFC.0000.xml"]),
+                "/".join([self.url, "reference.RFC.8174.xml"]),
+            ],
+        )
+
+    def test_get_cache_filename(self):
+        self.assertEqual(
+            get_cache_filename("/foo", "https://example.org/bar/reference.RFC.1.xml"),
+            "/foo/reference.RFC.1.xml",
+        )
+        self.assertNotEqual(
+            get_cache_filename("/foo", "https://example.org/ref.xml?anchor=a"),
+            get_cache_filename("/foo", "https://example.org/ref.xml?anchor=b"),
+        )
+
+    def test_prefetch_references(self):
+        stats = prefetch_references(self.filename, cache_dir=CACHE_DIR)
+
+        self.assertEqual(stats["references"], 3)
+        self.assertEqual(stats["fetched"], 1)
+        self.assertEqual(stats["failed"], 2)
+
+        url = "/".join([self.url, TEST_REFERENCE])
+        cached = get_cache_filename(CACHE_DIR, url)
+        self.assertTrue(Path(cached).exists())
+        xml = etree.parse(cached).getroot()
+        self.assertEqual(xml.get("{http://www.w3.org/XML/1998/namespace}base"), url)
+
+        # xml2rfc finds the reference from the cache
+        resolver = CachingResolver(cache_path=abspath(CACHE_DIR))
+        resolver.no_network = True
+        self.assertEqual(resolver.cache(url), abspath(cached))
+
+        # second run uses the cache
+        stats = prefetch_references(self.filename, cache_dir=CACHE_DIR)
+        self.assertEqual(stats["cached"], 1)
+        self.assertEqual(stats["fetched"], 0)
+
+    def test_prefetch_references_mirror(self):
+        archive = "".join([TEMPORARY_DATA_DIR, "bibxml.tgz"])
+        with open_tarfile(archive, "w:gz") as tar:
+            tar.add("".join([TEST_DATA_DIR, TEST_REFERENCE]), arcname=TEST_REFERENCE)
+        build(archive, bibxml_dir=BIBXML_DIR)
+
+        stats = prefetch_references(
+            self.filename, cache_dir=CACHE_DIR, workers=0, bibxml_dir=BIBXML_DIR
+        )
+
+        self.assertEqual(stats["references"], 3)
+        self.assertEqual(stats["mirrored"], 1)
+        self.assertEqual(stats["fetched"], 0)
+
+        url = "/".join([self.url, TEST_REFERENCE])
+        xml = etree.parse(get_cache_filename(CACHE_DIR, url)).getroot()
+        self.assertEqual(xml.get("{http://www.w3.org/XML/1998/namespace}base"), url)
+
+    def test_prefetch_references_mirror_app_config(self):
+        archive = "".join([TEMPORARY_DATA_DIR, "bibxml.tgz"])
+        with open_tarfile(archive, "w:gz") as tar:
+            tar.add("".join([TEST_DATA_DIR, TEST_REFERENCE]), arcname=TEST_REFERENCE)
+        build(archive, bibxml_dir=BIBXML_DIR)
+        app = create_app(
+            {"UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR), "BIBXML_DIR": BIBXML_DIR}
+        )
+
+        with app.app_context():
+            stats = prefetch_references(self.filename, cache_dir=CACHE_DIR, workers=0)
+
+        self.assertEqual(stats["mirrored"], 1)
+
+    def test_prefetch_references_invalid_xml(self):
+        stats = prefetch_references(
+            "".join([TEST_DATA_DIR, "draft-smoke-signals-00.error.xml"]),
+            cache_dir=CACHE_DIR,
+        )
+
+        self.assertEqual(stats["references"], 0)
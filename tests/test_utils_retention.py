@@ -0,0 +1,144 @@
+from logging import disable as set_logger, INFO, CRITICAL
+from os import utime
+from pathlib import Path
+from shutil import rmtree
+from time import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from at.utils.retention import (
+    collect,
+    EXPORT_TTL,
+    get_stats,
+    INTERMEDIATE_TTL,
+    main,
+    mark_exported,
+    mark_in_use,
+    release,
+)
+
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+UPLOAD_DIR = "./tests/tmp/upload/"
+
+
+def create_workspace(name, age, exported=False, in_use=None):
+    """Create workspace last modified age seconds ago, in use for in_use
+    seconds"""
+    workspace = Path(UPLOAD_DIR, name)
+    workspace.mkdir(parents=True)
+    filename = workspace / "draft.xml"
+    filename.write_text("<rfc/>")
+    if in_use is not None:
+        mark_in_use(str(filename), ttl=in_use)
+    if exported:
+        mark_exported(str(filename))
+        utime(workspace / ".exported", (time() - age, time() - age))
+    utime(workspace, (time() - age, time() - age))
+    return workspace
+
+
+class TestUtilsRetention(TestCase):
+    """Tests for at.utils.retention"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def test_collect(self):
+        Path(UPLOAD_DIR, "jobs.db").write_text("")
+        new = create_workspace("new", 10)
+        intermediate = create_workspace("intermediate", INTERMEDIATE_TTL + 10)
+        exported = create_workspace("exported", INTERMEDIATE_TTL + 10, True)
+        expired = create_workspace("expired", EXPORT_TTL + 10, True)
+
+        stats = collect(UPLOAD_DIR)
+
+        self.assertEqual(stats["removed"], 1)
+        self.assertEqual(stats["expired"], 1)
+        self.assertEqual(stats["evicted"], 0)
+        self.assertEqual(stats["workspaces"], 2)
+        self.assertTrue(new.exists())
+        self.assertFalse(intermediate.exists())
+        self.assertTrue(exported.exists())
+        self.assertFalse(expired.exists())
+        self.assertTrue(Path(UPLOAD_DIR, "jobs.db").exists())
+
+    def test_collect_in_use(self):
+        queued = create_workspace("queued", EXPORT_TTL + 10, in_use=60)
+        expired = create_workspace("expired", INTERMEDIATE_TTL + 10, in_use=-1)
+        usage = {"usage": 0.9, "inodes_usage": 0.1}
+
+        with patch("at.utils.retention.get_disk_usage", return_value=usage):
+            stats = collect(UPLOAD_DIR)
+
+        # lease of the other workspace has expired
+        self.assertEqual(stats["in_use"], 1)
+        self.assertEqual(stats["removed"], 1)
+        self.assertEqual(stats["evicted"], 0)
+        self.assertEqual(stats["workspaces"], 1)
+        self.assertTrue(queued.exists())
+        self.assertFalse(expired.exists())
+
+        release(str(queued / "draft.xml"))
+        utime(queued, (time() - EXPORT_TTL, time() - EXPORT_TTL))
+        stats = collect(UPLOAD_DIR)
+
+        self.assertEqual(stats["in_use"], 0)
+        self.assertFalse(queued.exists())
+
+    def test_collect_disk_pressure(self):
+        new = create_workspace("new", 10, True)
+        oldest = create_workspace("oldest", 300, True)
+        older = create_workspace("older", 200, True)
+        usage = {"usage": 0.9, "inodes_usage": 0.1}
+
+        with patch("at.utils.retention.get_disk_usage", return_value=usage):
+            stats = collect(UPLOAD_DIR)
+
+        # young workspaces are kept even under disk pressure
+        self.assertEqual(stats["evicted"], 2)
+        self.assertTrue(new.exists())
+        self.assertFalse(oldest.exists())
+        self.assertFalse(older.exists())
+
+        older = create_workspace("older", 200, True)
+        oldest = create_workspace("oldest", 300, True)
+        usages = [
+            {"usage": 0.9, "inodes_usage": 0.1},
+            usage,
+            {"usage": 0.5, "inodes_usage": 0.1},
+        ]
+
+        with patch("at.utils.retention.get_disk_usage", side_effect=usages):
+            stats = collect(UPLOAD_DIR)
+
+        # oldest first, until usage is below the target
+        self.assertEqual(stats["evicted"], 1)
+        self.assertFalse(oldest.exists())
+        self.assertTrue(older.exists())
+
+    def test_main(self):
+        create_workspace("intermediate", INTERMEDIATE_TTL + 10)
+
+        self.assertEqual(main(["--dir", UPLOAD_DIR, "run", "--interval", "0"]), 0)
+
+        stats = get_stats(UPLOAD_DIR)
+        self.assertGreater(stats["total"], 0)
+        self.assertIn("inodes_usage", stats)
+        self.assertEqual(stats["last_run"]["uploads"]["removed"], 1)
+
+    def test_main_settings(self):
+        workspace = create_workspace("intermediate", 120)
+
+        with patch.dict("os.environ", {"INTERMEDIATE_TTL": "60"}):
+            self.assertEqual(main(["--dir", UPLOAD_DIR, "run", "--interval", "0"]), 0)
+
+        self.assertFalse(workspace.exists())
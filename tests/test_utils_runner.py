@@ -1,6 +1,18 @@
+from subprocess import run
+from threading import Thread
+from time import sleep
 from unittest import TestCase
+from unittest.mock import patch
 
-from at.utils.runner import proc_run, RunnerError
+from at.utils.runner import (
+    check_fork_server,
+    fork_run,
+    get_stats,
+    get_tool_class,
+    proc_run,
+    ProcessLimiter,
+    RunnerError,
+)
 
 
 class TestUtilsRunner(TestCase):
@@ -15,3 +27,139 @@ class TestUtilsRunner(TestCase):
         with self.assertRaises(RunnerError):
             output = proc_run(args=["sleep", "100"], timeout=1)
             output.check_returncode()
+
+    def test_fork_run(self):
+        for args in (
+            ["xml2rfc", "--version"],
+            ["xml2rfc", "--foobar"],
+            ["iddiff", "./tests/data/draft-smoke-signals-00.txt"],
+        ):
+            expected = run(args, capture_output=True)
+            output = fork_run(args)
+
+            self.assertEqual(output.returncode, expected.returncode)
+            self.assertEqual(output.stdout, expected.stdout)
+            self.assertEqual(output.stderr, expected.stderr)
+
+    def test_fork_run_timeout(self):
+        with self.assertRaises(RunnerError):
+            fork_run(["xml2rfc", "--version"], timeout=0)
+
+    def test_fork_run_unknown_tool(self):
+        with self.assertRaises(FileNotFoundError):
+            fork_run(["foobar"])
+
+    @patch("at.utils.runner._fork_server", False)
+    def test_proc_run_without_fork_server(self):
+        output = proc_run(args=["xml2rfc", "--version"])
+        output.check_returncode()
+        self.assertTrue(output.stdout.decode("utf-8").startswith("xml2rfc"))
+
+    @patch("at.utils.runner._fork_server", None)
+    @patch("at.utils.runner.FORK_SERVER", True)
+    def test_check_fork_server(self):
+        self.assertTrue(check_fork_server())
+
+        with patch("at.utils.runner._fork_server", None):
+            with patch(
+                "at.utils.runner.get_fork_context", side_effect=ValueError
+            ) as get_fork_context:
+                self.assertFalse(check_fork_server())
+                self.assertFalse(check_fork_server())
+                # checked once
+                self.assertEqual(get_fork_context.call_count, 1)
+
+        with patch("at.utils.runner._fork_server", None):
+            with patch("at.utils.runner.is_monkey_patched", return_value=True):
+                with patch("at.utils.runner.get_fork_context") as get_fork_context:
+                    self.assertFalse(check_fork_server())
+                    get_fork_context.assert_not_called()
+
+        with patch("at.utils.runner._fork_server", None):
+            with patch("at.utils.runner.FORK_SERVER", False):
+                self.assertFalse(check_fork_server())
+
+    def test_get_tool_class(self):
+        self.assertEqual(get_tool_class(["xml2rfc", "--pdf", "draft.xml"]), "pdf")
+        self.assertEqual(get_tool_class(["xml2rfc", "--html", "draft.xml"]), "xml2rfc")
+        self.assertEqual(get_tool_class(["/usr/bin/bap", "abnf.txt"]), "bap")
+
+    def test_process_limiter(self):
+        limiter = ProcessLimiter(max_processes=2, limits={"pdf": 1})
+        order = []
+
+        def run(tool_class, priority):
+            limiter.acquire(tool_class, priority)
+            order.append(tool_class)
+            sleep(0.1)
+            limiter.release(tool_class)
+
+        limiter.acquire("pdf")
+        limiter.acquire("xml2rfc")
+        threads = [
+            Thread(target=run, args=("pdf", 2)),
+            Thread(target=run, args=("xml2rfc", 1)),
+            Thread(target=run, args=("bap", 0)),
+        ]
+        for thread in threads:
+            thread.start()
+            sleep(0.05)  # arrival order
+
+        stats = limiter.stats()
+        self.assertEqual(stats["running"], 2)
+        self.assertEqual(stats["waiting"], 3)
+        self.assertEqual(stats["tools"]["pdf"]["waiting"], 1)
+
+        limiter.release("xml2rfc")
+        limiter.release("pdf")
+        for thread in threads:
+            thread.join()
+
+        # higher priority first, PDF only after the other PDF render
+        self.assertEqual(order, ["bap", "xml2rfc", "pdf"])
+        stats = limiter.stats()
+        self.assertEqual(stats["running"], 0)
+        self.assertEqual(stats["tools"]["pdf"]["started"], 2)
+        self.assertGreater(stats["tools"]["bap"]["wait_time"], 0)
+
+    def test_process_limiter_fair_share(self):
+        limiter = ProcessLimiter(max_processes=1)
+        order = []
+
+        def run(client):
+            limiter.acquire("xml2rfc", client=client)
+            order.append(client)
+            limiter.release("xml2rfc")
+
+        limiter.acquire("xml2rfc")
+        threads = [Thread(target=run, args=(client,)) for client in ["ci"] * 3]
+        threads.append(Thread(target=run, args=("user",)))
+        for thread in threads:
+            thread.start()
+            sleep(0.05)  # arrival order
+
+        limiter.release("xml2rfc")
+        for thread in threads:
+            thread.join()
+
+        # user does not wait behind all calls of the busy client
+        self.assertEqual(order, ["ci", "user", "ci", "ci"])
+        stats = limiter.stats()
+        self.assertEqual(stats["clients"]["ci"]["started"], 3)
+        self.assertEqual(stats["clients"]["user"]["cost"], 1)
+
+    def test_process_limiter_timeout(self):
+        limiter = ProcessLimiter(max_processes=1)
+        limiter.acquire("xml2rfc")
+
+        with self.assertRaises(RunnerError):
+            limiter.acquire("bap", timeout=0.1)
+
+        stats = limiter.stats()
+        self.assertEqual(stats["tools"]["bap"]["timeouts"], 1)
+        self.assertEqual(stats["waiting"], 0)
+
+    def test_proc_run_stats(self):
+        proc_run(args=["echo", "foobar"])
+
+        self.assertGreaterEqual(get_stats()["tools"]["echo"]["started"], 1)
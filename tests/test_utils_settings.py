@@ -0,0 +1,62 @@
+from logging import disable as set_logger, INFO, CRITICAL
+from os.path import abspath
+from pathlib import Path
+from shutil import rmtree
+from unittest import TestCase
+from unittest.mock import patch
+
+from at import create_app
+from at.utils.net import get_ttl, LATEST_TTL
+from at.utils.settings import get_env_settings, get_setting
+
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+
+
+class TestUtilsSettings(TestCase):
+    """Tests for at.utils.settings"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(TEMPORARY_DATA_DIR).mkdir(exist_ok=True)
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def test_get_env_settings(self):
+        with patch.dict(
+            "os.environ",
+            {
+                "EXPORT_TTL": "60",
+                "MAX_DISK_USAGE": "0.5",
+                "SINGLE_FLIGHT": "0",
+                "FOO": "bar",
+            },
+        ):
+            settings = get_env_settings()
+
+        self.assertEqual(settings["EXPORT_TTL"], 60)
+        self.assertEqual(settings["MAX_DISK_USAGE"], 0.5)
+        self.assertFalse(settings["SINGLE_FLIGHT"])
+        self.assertNotIn("FOO", settings)
+
+    def test_get_setting(self):
+        self.assertEqual(get_setting("METADATA_LATEST_TTL", LATEST_TTL), LATEST_TTL)
+        self.assertEqual(get_ttl("draft-foo-bar", {}), LATEST_TTL)
+
+        with patch.dict("os.environ", {"METADATA_LATEST_TTL": "10"}):
+            app = create_app({"UPLOAD_DIR": abspath(TEMPORARY_DATA_DIR)})
+
+        with app.app_context():
+            self.assertEqual(app.config["METADATA_LATEST_TTL"], 10)
+            self.assertEqual(get_ttl("draft-foo-bar", {}), 10)
+
+    def test_get_setting_env(self):
+        # outside of application context
+        with patch.dict("os.environ", {"METADATA_LATEST_TTL": "10", "FOO": "bar"}):
+            self.assertEqual(get_setting("METADATA_LATEST_TTL", LATEST_TTL), 10)
+            self.assertEqual(get_setting("FOO", "baz"), "baz")
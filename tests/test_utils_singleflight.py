@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from logging import disable as set_logger, INFO, CRITICAL
+from pathlib import Path
+from shutil import rmtree
+from threading import Lock
+from time import sleep, time
+from unittest import TestCase
+
+from at.utils.singleflight import get_key, get_stats, single_flight
+
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+SINGLE_FLIGHT_DIR = "./tests/tmp/single-flight/"
+
+
+class TestUtilsSingleflight(TestCase):
+    """Tests for at.utils.singleflight"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(TEMPORARY_DATA_DIR).mkdir(exist_ok=True)
+        self.calls = 0
+        self.lock = Lock()
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def work(self):
+        with self.lock:
+            self.calls += 1
+        sleep(0.5)
+        return {"status": 200}, b"result"
+
+    def fail(self):
+        with self.lock:
+            self.calls += 1
+            first = self.calls == 1
+        sleep(0.5)
+        if first:
+            raise ValueError("foobar")
+        return {"status": 200}, b"result"
+
+    def test_get_key(self):
+        key = get_key("POST /api/iddiff", [("a", "1"), ("b", "2")], [("f", "x", "h")])
+
+        self.assertEqual(
+            key,
+            get_key("POST /api/iddiff", [("b", "2"), ("a", "1")], [("f", "x", "h")]),
+        )
+        self.assertNotEqual(
+            key,
+            get_key("POST /api/iddiff", [("a", "1"), ("b", "2")], [("f", "x", "i")]),
+        )
+        self.assertNotEqual(
+            key,
+            get_key("POST /api/idnits", [("a", "1"), ("b", "2")], [("f", "x", "h")]),
+        )
+
+    def test_single_flight(self):
+        before = get_stats()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(
+                executor.map(
+                    lambda _: single_flight("key", self.work, SINGLE_FLIGHT_DIR),
+                    range(4),
+                )
+            )
+
+        self.assertEqual(self.calls, 1)
+        for result in results:
+            self.assertEqual(result, ({"status": 200}, b"result"))
+        stats = get_stats()
+        self.assertEqual(stats["leaders"] - before["leaders"], 1)
+        self.assertEqual(stats["followers"] - before["followers"], 3)
+
+    def test_single_flight_sequential(self):
+        single_flight("key", self.work, SINGLE_FLIGHT_DIR)
+        single_flight("key", self.work, SINGLE_FLIGHT_DIR)
+
+        # results are not shared with later callers
+        self.assertEqual(self.calls, 2)
+
+    def test_single_flight_leader_failure(self):
+        before = get_stats()
+
+        def call(_):
+            try:
+                return single_flight("key", self.fail, SINGLE_FLIGHT_DIR)
+            except ValueError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            started = time()
+            results = list(executor.map(call, range(4)))
+            elapsed = time() - started
+
+        self.assertEqual(self.calls, 4)
+        self.assertEqual(results.count(None), 1)
+        # waiting callers run concurrently once the leader has failed
+        self.assertLess(elapsed, 1.5)
+        stats = get_stats()
+        self.assertEqual(stats["leaders"] - before["leaders"], 1)
+        self.assertEqual(stats["released"] - before["released"], 3)
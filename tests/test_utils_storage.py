@@ -0,0 +1,137 @@
+from logging import disable as set_logger, INFO, CRITICAL
+from os.path import abspath
+from pathlib import Path
+from shutil import rmtree
+from unittest import TestCase
+
+from at import create_app
+from at.api import export_file, is_exported
+from at.utils.storage import get_storage, iter_chunks, LocalStorage, StorageError
+
+TEMPORARY_DATA_DIR = "./tests/tmp/"
+UPLOAD_DIR = "./tests/tmp/upload/"
+ARTIFACT_DIR = "./tests/tmp/artifacts/"
+
+
+class UnavailableStorage:
+    """Artifact storage that is not reachable"""
+
+    def save(self, name, filename):
+        raise StorageError("foobar")
+
+    def exists(self, name):
+        raise StorageError("foobar")
+
+    def open(self, name):
+        raise StorageError("foobar")
+
+
+class TestUtilsStorage(TestCase):
+    """Tests for at.utils.storage"""
+
+    def setUp(self):
+        # susspress logging messages
+        set_logger(CRITICAL)
+        # create temporary data dir
+        Path(UPLOAD_DIR, "foo").mkdir(parents=True, exist_ok=True)
+        self.filename = Path(UPLOAD_DIR, "foo", "bar.txt")
+        self.filename.write_text("rendered")
+
+    def tearDown(self):
+        # set logging to INFO
+        set_logger(INFO)
+        # remove temporary data dir
+        rmtree(TEMPORARY_DATA_DIR, ignore_errors=True)
+
+    def test_get_storage(self):
+        storage = get_storage(None, UPLOAD_DIR)
+        self.assertIsInstance(storage, LocalStorage)
+        self.assertEqual(storage.directory, abspath(UPLOAD_DIR))
+
+        storage = get_storage(ARTIFACT_DIR, UPLOAD_DIR)
+        self.assertIsInstance(storage, LocalStorage)
+        self.assertEqual(storage.directory, abspath(ARTIFACT_DIR))
+
+    def test_local_storage(self):
+        storage = LocalStorage(ARTIFACT_DIR)
+
+        self.assertFalse(storage.exists("foo/bar.txt"))
+        storage.save("foo/bar.txt", self.filename)
+        self.assertTrue(storage.exists("foo/bar.txt"))
+        self.assertEqual(
+            b"".join(iter_chunks(storage.open("foo/bar.txt"), 2)), b"rendered"
+        )
+        storage.delete("foo/bar.txt")
+        self.assertFalse(storage.exists("foo/bar.txt"))
+
+    def test_local_storage_same_directory(self):
+        storage = LocalStorage(UPLOAD_DIR)
+
+        storage.save("foo/bar.txt", self.filename)
+
+        self.assertEqual(self.filename.read_text(), "rendered")
+
+    def test_local_storage_invalid_name(self):
+        storage = LocalStorage(ARTIFACT_DIR)
+
+        with self.assertRaises(StorageError):
+            storage.exists("../upload/foo/bar.txt")
+
+    def test_export_from_storage(self):
+        # file rendered by another replica
+        LocalStorage(ARTIFACT_DIR).save("foo/bar.txt", self.filename)
+        self.filename.unlink()
+
+        config = {
+            "UPLOAD_DIR": abspath(UPLOAD_DIR),
+            "ARTIFACT_STORAGE": abspath(ARTIFACT_DIR),
+            "REQUIRE_AUTH": False,
+        }
+        app = create_app(config)
+
+        with app.test_client() as client:
+            with app.app_context():
+                result = client.get("/api/export/foo/bar.txt")
+                self.assertEqual(result.status_code, 200)
+                self.assertEqual(result.data, b"rendered")
+
+                result = client.get("/api/export/foo/baz.txt")
+                self.assertEqual(result.status_code, 404)
+
+                app.config["EXPORT_ACCEL_REDIRECT_ARTIFACTS"] = "/internal/artifacts/"
+                result = client.get("/api/export/foo/bar.txt?download=1")
+                self.assertEqual(result.status_code, 200)
+                self.assertEqual(
+                    result.headers["X-Accel-Redirect"],
+                    "/internal/artifacts/foo/bar.txt",
+                )
+                self.assertEqual(
+                    result.headers["Content-Disposition"],
+                    "attachment; filename=bar.txt",
+                )
+                self.assertEqual(result.data, b"")
+
+    def test_storage_unavailable(self):
+        config = {
+            "UPLOAD_DIR": abspath(UPLOAD_DIR),
+            "REQUIRE_AUTH": False,
+            "SITE_URL": "https://example.com",
+        }
+        app = create_app(config)
+        app.extensions["storage"] = UnavailableStorage()
+
+        with app.test_client() as client:
+            with app.app_context():
+                # falls back to the upload directory
+                self.assertEqual(
+                    export_file("foo/bar.txt"),
+                    "https://example.com/api/export/foo/bar.txt",
+                )
+                self.assertTrue(is_exported("foo/bar.txt"))
+                self.assertFalse(is_exported("foo/baz.txt"))
+
+                result = client.get("/api/export/foo/bar.txt")
+                self.assertEqual(result.status_code, 200)
+
+                result = client.get("/api/export/foo/baz.txt")
+                self.assertEqual(result.status_code, 404)